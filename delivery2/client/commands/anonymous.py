@@ -7,10 +7,16 @@ from typing import Annotated
 
 import typer
 
+from utils.blob_cache import cache_blob, read_cached_blob
 from utils.consts import ORGANIZATION_URL, SUBJECT_URL, DOCUMENT_URL, REPOSITORY_URL
 from utils.encryption.loaders import load_private_key
+from utils.integrity import HashingWriter, hash_file
 from utils.output import print_organizations_list
-from utils.request import request_without_session_repo, request_without_encryption
+from utils.request import (
+    request_without_session_repo,
+    request_without_encryption,
+    download_without_session_repo,
+)
 from utils.storage import get_storage_dir
 from utils.types import RepPublicKey, RepAddress
 
@@ -123,27 +129,68 @@ def get_file(
     repository_address: RepAddress,
     file: Annotated[Path | None, typer.Argument()] = None,
 ):
-    body, _ = request_without_session_repo(
-        "GET",
-        repository_address,
-        f"{DOCUMENT_URL}/handle/{file_handle}",
-        None,
-        None,
-        repository_public_key,
-    )
-
-    content = base64.decodebytes(body.encode().replace(b"\\n", b"\n").strip(b'"'))
+    url = f"{DOCUMENT_URL}/handle/{file_handle}/content"
 
     if file is None:
-        sys.stdout.buffer.write(content)
+        try:
+            if read_cached_blob(file_handle, sys.stdout.buffer):
+                return
+        except ValueError:
+            # Already printed, like a download, so it can only be reported
+            print("File integrity check failed", file=sys.stderr)
+            raise typer.Exit(code=1)
+
+        # Already printed, so a corrupted file can only be reported afterwards
+        writer = HashingWriter(sys.stdout.buffer)
+        download_without_session_repo(
+            repository_address, url, repository_public_key, writer  # type: ignore[arg-type]
+        )
+        if writer.hasher.finalize() != file_handle:
+            print("File integrity check failed", file=sys.stderr)
+            raise typer.Exit(code=1)
         return
 
     if not file.parent.exists():
         file.parent.mkdir(parents=True)
 
-    with file.open("wb+") as f:
-        f.write(content)
-        print(f"File saved as {file}")
+    # Interrupted downloads are resumed from the partial file
+    part_file = file.with_name(file.name + ".part")
+    offset = part_file.stat().st_size if part_file.exists() else 0
+
+    part_file.touch()
+    try:
+        with part_file.open("r+b") as f:
+            try:
+                cached = read_cached_blob(file_handle, f)
+            except ValueError:
+                # Written over the partial file, so it is downloaded from the start
+                cached, offset = False, 0
+                f.seek(0)
+                f.truncate()
+            if cached:
+                f.truncate()
+            else:
+                download_without_session_repo(
+                    repository_address, url, repository_public_key, f, offset
+                )
+
+        if cached:
+            part_file.replace(file)
+            print(f"File saved as {file}")
+            return
+
+        # Hashed once complete, as a resumed download only streams the missing part
+        if hash_file(part_file) != file_handle:
+            print("File integrity check failed")
+            raise typer.Exit(code=1)
+    except typer.Exit:
+        # Failed to decrypt or verify, so resuming it would fail again
+        part_file.unlink(missing_ok=True)
+        raise
+
+    cache_blob(file_handle, part_file)
+    part_file.replace(file)
+    print(f"File saved as {file}")
 
 
 @app.command("rep_get_pub_key")
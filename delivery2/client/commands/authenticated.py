@@ -1,5 +1,5 @@
 import json
-from typing import Annotated
+from typing import Annotated, Any, Iterator
 
 import typer
 
@@ -12,11 +12,37 @@ from utils.output import (
 )
 from utils.permission import Permission
 from utils.request import request_with_session
+from utils.storage import write_session
 from utils.types import RepPublicKey, RepAddress, PathWithCheck
 
 app = typer.Typer()
 
 
+def iter_documents(
+    repository_public_key: RepPublicKey,
+    repository_address: RepAddress,
+    session_file: PathWithCheck,
+    params: dict[str, Any],
+) -> Iterator[dict[str, Any]]:
+    cursor = None
+    while True:
+        body, _ = request_with_session(
+            "GET",
+            repository_address,
+            f"{DOCUMENT_URL}",
+            None,
+            session_file.read_bytes(),
+            repository_public_key,
+            params={**params, "cursor": cursor},
+        )
+        page = json.loads(body)
+        yield from page["items"]
+
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return
+
+
 # rep_list_subjects <session file> [username]
 @app.command("rep_list_subjects")
 def list_subjects(
@@ -65,17 +91,9 @@ def list_documents(
         "date_order": date[0] if date is not None else None,
     }
 
-    body, _ = request_with_session(
-        "GET",
-        repository_address,
-        f"{DOCUMENT_URL}",
-        None,
-        session_file.read_bytes(),
-        repository_public_key,
-        params=params,
-    )
-    body = json.loads(body)
-    for doc in body:
+    for doc in iter_documents(
+        repository_public_key, repository_address, session_file, params
+    ):
         print_doc_metadata(doc)
         print(f"\n{'-'*64}\n")
 
@@ -101,9 +119,7 @@ def assume_role(
         params={"role": role},
     )
 
-    token = body.strip('"')
-    with session_file.open("w") as f:
-        f.write(token)
+    write_session(session_file, body.strip('"'))
 
     print(f"Added role {role} to session file {session_file}.")
 
@@ -126,9 +142,7 @@ def drop_role(
         params={"role": role},
     )
 
-    token = body.strip('"')
-    with session_file.open("w") as f:
-        f.write(token)
+    write_session(session_file, body.strip('"'))
 
     print(f"Removed role {role} to session file {session_file}.")
 
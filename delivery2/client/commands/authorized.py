@@ -1,17 +1,25 @@
 import base64
 import json
 import os
-from hashlib import sha256
+import tempfile
 from pathlib import Path
-from typing import Annotated
+from typing import Annotated, Any
 
 import click
 import typer
 
-from commands.anonymous import get_file
-from commands.local import decrypt_file
-from utils.consts import DOCUMENT_URL, SUBJECT_URL, ROLE_URL
-from utils.encryption.encryptors import encrypt_symmetric
+from commands.local import decrypt_document, decrypt_file
+from utils.blob_cache import cache_blob, is_blob_cached, link_cached_blob
+from utils.compression import DEFLATE, compress_file, resolve_compression
+from utils.consts import (
+    COMPRESSION,
+    DOCUMENT_URL,
+    SUBJECT_URL,
+    ROLE_URL,
+    UPLOAD_CHUNKED_THRESHOLD,
+)
+from utils.encryption.files import crypt_file
+from utils.integrity import HashingWriter, hash_file
 from utils.output import (
     print_subject,
     print_doc_metadata,
@@ -19,12 +27,60 @@ from utils.output import (
     print_roles_list,
 )
 from utils.permission import DocumentPermission, Permission
-from utils.request import request_with_session
+from utils.request import (
+    download_with_session,
+    get_session_organization,
+    request_with_session,
+)
+from utils.storage import get_doc_metadata, get_doc_metadata_file, set_doc_metadata
 from utils.types import RepPublicKey, RepAddress, PathWithCheck, PermissionOrStr
 
 app = typer.Typer()
 
 
+def upload_document_chunked(
+    repository_public_key: RepPublicKey,
+    repository_address: RepAddress,
+    session_file: PathWithCheck,
+    meta: dict[str, Any],
+    enc_file: Path,
+) -> str:
+    size = enc_file.stat().st_size
+    body, _ = request_with_session(
+        "POST",
+        repository_address,
+        f"{DOCUMENT_URL}/upload",
+        {**meta, "size": size},
+        session_file.read_bytes(),
+        repository_public_key,
+    )
+    upload = json.loads(body)
+
+    chunk_size = upload["chunk_size"]
+    with enc_file.open("rb") as f:
+        for offset in range(0, size, chunk_size):
+            request_with_session(
+                "PUT",
+                repository_address,
+                f"{DOCUMENT_URL}/upload/{upload['upload_id']}",
+                f.read(chunk_size),
+                session_file.read_bytes(),
+                repository_public_key,
+                content_type="application/octet-stream",
+                params={"offset": str(offset)},
+            )
+
+    body, _ = request_with_session(
+        "POST",
+        repository_address,
+        f"{DOCUMENT_URL}/upload/{upload['upload_id']}/complete",
+        None,
+        session_file.read_bytes(),
+        repository_public_key,
+    )
+    return body
+
+
 # rep_add_doc <session file> <document name> <file>
 @app.command("rep_add_doc")
 def add_document(
@@ -33,44 +89,63 @@ def add_document(
     session_file: PathWithCheck,
     doc_name: str,
     file: Path,
+    compressed: Annotated[
+        bool,
+        typer.Option("-c", "--compress", help="Compress the file before encrypting it"),
+    ] = False,
 ):
     # check if existes
     # enc doc with alg and key
 
-    f = open(file, "rb")
-    file_readed = f.read()
-
     # encrypt file
     alg = "AES"  # TODO OVERRIDE THIS IN THE FUTURE
     key = os.urandom(32)
     iv = os.urandom(16)
-    enc_file = encrypt_symmetric(file_readed, key, iv)
-    enc_file = base64.encodebytes(enc_file)
-    file_handle = sha256(enc_file).hexdigest()
-
-    enc_file = enc_file.decode()
-    f.close()
-
-    meta = {
-        "name": doc_name,
-        "file_handle": file_handle,
-        "acl": {},
-        "organization_name": "",
-        "creator_username": "",
-        "alg": alg,
-        "key": base64.encodebytes(key).decode(),
-        "iv": base64.encodebytes(iv).decode(),
-        "file_content": enc_file,
-    }
 
-    body, _ = request_with_session(
-        "POST",
-        repository_address,
-        f"{DOCUMENT_URL}",
-        meta,
-        session_file.read_bytes(),
-        repository_public_key,
-    )
+    with tempfile.TemporaryDirectory() as tmp:
+        file_readed = file
+        if compressed:
+            # The codec is kept in the algorithm, e.g. "AES+deflate"
+            compression = resolve_compression(COMPRESSION) or DEFLATE
+            alg = f"{alg}+{compression}"
+            file_readed = Path(tmp) / "compressed"
+            with file.open("rb") as src, file_readed.open("wb") as dst:
+                compress_file(src, dst, compression)
+
+        enc_file = Path(tmp) / "encrypted"
+        crypt_file(file_readed, enc_file, key, iv)
+        file_handle = hash_file(enc_file)
+
+        meta = {
+            "name": doc_name,
+            "file_handle": file_handle,
+            "acl": {},
+            "organization_name": "",
+            "creator_username": "",
+            "alg": alg,
+            "key": base64.encodebytes(key).decode(),
+            "iv": base64.encodebytes(iv).decode(),
+        }
+
+        if enc_file.stat().st_size > UPLOAD_CHUNKED_THRESHOLD:
+            body = upload_document_chunked(
+                repository_public_key, repository_address, session_file, meta, enc_file
+            )
+        else:
+            body, _ = request_with_session(
+                "POST",
+                repository_address,
+                f"{DOCUMENT_URL}",
+                {
+                    **meta,
+                    "file_content": base64.encodebytes(enc_file.read_bytes()).decode(),
+                },
+                session_file.read_bytes(),
+                repository_public_key,
+            )
+
+        # So fetching the document back doesn't download it again
+        cache_blob(file_handle, enc_file, link=True)
 
     body = json.loads(body)
     print_doc_metadata(body, include_encryption=True)
@@ -84,33 +159,108 @@ def get_document_metadata(
     session_file: PathWithCheck,
     doc_name: str,
 ) -> tuple[str, Path, str]:
-    body, _ = request_with_session(
+    session = session_file.read_bytes()
+    organization = get_session_organization(session)
+
+    # Revalidated, so an unchanged document is answered with an empty 304
+    cached = get_doc_metadata(organization, doc_name)
+    body, response = request_with_session(
         "GET",
         repository_address,
         f"{DOCUMENT_URL}/{doc_name}",
         None,
-        session_file.read_bytes(),
+        session,
         repository_public_key,
+        headers={"If-None-Match": cached[1]} if cached is not None else None,
     )
-    body = json.loads(body)
 
-    path = f"storage/docs/{body['organization_name']}"
-    if not os.path.exists(path):
-        os.makedirs(path)
-
-    f = open(f"{path}/{doc_name}.json", "w+")
-    f.write(json.dumps(body))
-    f.close()
+    if not body and cached is not None:
+        body = cached[0]
+    else:
+        body = json.loads(body)
+        set_doc_metadata(
+            body["organization_name"], doc_name, body, response.headers.get("ETag")
+        )
 
     print_doc_metadata(body, include_encryption=True)
 
     return (
         body["file_handle"],
-        Path(f"{path}/{doc_name}.json"),
+        get_doc_metadata_file(body["organization_name"], doc_name),
         body["organization_name"],
     )
 
 
+def fetch_document(
+    repository_public_key: RepPublicKey,
+    repository_address: RepAddress,
+    session_file: PathWithCheck,
+    doc_name: str,
+    revalidate: bool = True,
+) -> tuple[dict[str, Any], Path]:
+    """
+    Fetches the metadata and the encrypted file of a document in one request. The
+    cached ones are used instead if the document didn't change.
+
+    :return: The metadata and the path of the encrypted file
+    :rtype: tuple[dict[str, Any], Path]
+    """
+    session = session_file.read_bytes()
+    organization = get_session_organization(session)
+    metadata_file = get_doc_metadata_file(organization, doc_name)
+    metadata_file.parent.mkdir(parents=True, exist_ok=True)
+    part_file = metadata_file.with_suffix(".part")
+
+    # A 304 has no file, so it is only asked for if the file is cached too
+    cached = get_doc_metadata(organization, doc_name) if revalidate else None
+    headers = None
+    if cached is not None and is_blob_cached(cached[0]["file_handle"]):
+        headers = {"If-None-Match": cached[1]}
+
+    # The part file goes away on any exit, it only survives renamed
+    try:
+        with part_file.open("wb") as f:
+            # Hashed as it is written, so the file isn't read back to be checked
+            writer = HashingWriter(f)
+            body, response = download_with_session(
+                repository_address,
+                f"{DOCUMENT_URL}/{doc_name}/content",
+                session,
+                repository_public_key,
+                writer,  # type: ignore[arg-type]
+                headers,
+            )
+
+        if not body:
+            # Linked from the cache, so an unchanged file is neither copied nor sent
+            if cached is not None:
+                enc_file_path = metadata_file.parent / cached[0]["file_handle"]
+                if link_cached_blob(cached[0]["file_handle"], enc_file_path):
+                    return cached[0], enc_file_path
+
+            # Evicted since it was checked, so the file has to be sent after all
+            return fetch_document(
+                repository_public_key,
+                repository_address,
+                session_file,
+                doc_name,
+                revalidate=False,
+            )
+
+        metadata = json.loads(body)
+        if writer.hasher.finalize() != metadata["file_handle"]:
+            print("File integrity check failed")
+            raise typer.Exit(code=1)
+        set_doc_metadata(organization, doc_name, metadata, response.headers.get("ETag"))
+        cache_blob(metadata["file_handle"], part_file, link=True)
+
+        enc_file_path = metadata_file.parent / metadata["file_handle"]
+        part_file.replace(enc_file_path)
+    finally:
+        part_file.unlink(missing_ok=True)
+    return metadata, enc_file_path
+
+
 # rep_get_doc_file <session file> <document name> [file]
 @app.command("rep_get_doc_file")
 def get_document_file(
@@ -120,22 +270,22 @@ def get_document_file(
     doc_name: str,
     file: Annotated[Path | None, typer.Argument()] = None,
 ):
-    file_handle, enc_meta_file_path, organization = get_document_metadata(
+    metadata, enc_file_path = fetch_document(
         repository_public_key, repository_address, session_file, doc_name
     )
-
-    enc_file_path = Path(f"storage/docs/{organization}/{file_handle}")
-
-    get_file(file_handle, repository_public_key, repository_address, enc_file_path)
-    dec_file = decrypt_file(enc_file_path, enc_meta_file_path)
+    print_doc_metadata(metadata, include_encryption=True)
 
     if file:
-        with file.open("wb+") as f:
-            f.write(dec_file)
-            print(f"File saved at {file}")
+        # fetch_document() already checked the integrity of the file
+        decrypt_document(enc_file_path, metadata, file, verify=False)
+        print(f"File saved at {file}")
         return
 
-    print(dec_file.decode())
+    dec_file = decrypt_file(
+        enc_file_path,
+        get_doc_metadata_file(metadata["organization_name"], doc_name),
+    )
+    print(dec_file.read_bytes().decode())
 
 
 # rep_delete_doc <session file> <document name>
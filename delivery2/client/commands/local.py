@@ -1,13 +1,16 @@
 import base64
 import json
-from hashlib import sha256
+import tempfile
 from pathlib import Path
+from typing import Any
 
 import typer
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import rsa
 
-from utils.encryption.encryptors import decrypt_symmetric
+from utils.compression import COMPRESSIONS, decompress_file
+from utils.encryption.files import crypt_file
+from utils.integrity import hash_file
 
 app = typer.Typer()
 
@@ -40,36 +43,53 @@ def generate_credentials(password: str, credentials_file: Path) -> None:
     # return typer.Exit(code=0)
 
 
-# rep_decrypt_file <encrypted file> <encryption metadata>
-@app.command("rep_decrypt_file")
-def decrypt_file(encrypted_file: Path, encryption_metadata: Path) -> bytes:
-    with encrypted_file.open("rb") as f:
-        encrypted_data = f.read()
-
-    with encryption_metadata.open("r") as f:
-        metadata = json.load(f)
-
+def decrypt_document(
+    encrypted_file: Path,
+    metadata: dict[str, Any],
+    output: Path,
+    verify: bool = True,
+) -> None:
+    """
+    :param verify: Whether to check the integrity of the file, which can be skipped
+        if it was just checked while downloading it
+    """
     # check integrity of  file
-    mic = sha256(base64.encodebytes(encrypted_data)).hexdigest()
-    # print(mic)
-
-    if metadata["file_handle"] != mic:
+    if verify and metadata["file_handle"] != hash_file(encrypted_file):
         print("File integrity check failed")
         raise typer.Exit(code=1)
 
     # TODO
-    if metadata["alg"] != "AES":
+    alg, _, compression = metadata["alg"].partition("+")
+    if alg != "AES":
         print("Unsupported algorithm")
         raise typer.Exit(code=1)
+    if compression and compression not in COMPRESSIONS:
+        print("Unsupported compression")
+        raise typer.Exit(code=1)
 
     key = base64.decodebytes(metadata["key"].encode())
     iv = base64.decodebytes(metadata["iv"].encode())
 
-    data = decrypt_symmetric(encrypted_data, key, iv)
+    if not compression:
+        crypt_file(encrypted_file, output, key, iv)
+        return
+
+    with tempfile.TemporaryDirectory(dir=output.parent) as tmp:
+        compressed_file = Path(tmp) / "compressed"
+        crypt_file(encrypted_file, compressed_file, key, iv)
+        with compressed_file.open("rb") as src, output.open("wb") as dst:
+            decompress_file(src, dst, compression)
+
+
+# rep_decrypt_file <encrypted file> <encryption metadata>
+@app.command("rep_decrypt_file")
+def decrypt_file(encrypted_file: Path, encryption_metadata: Path) -> Path:
+    with encryption_metadata.open("r") as f:
+        metadata = json.load(f)
 
-    with encrypted_file.with_suffix(".dec").open("wb+") as f:
-        f.write(data)
+    output = encrypted_file.with_suffix(".dec")
+    decrypt_document(encrypted_file, metadata, output)
 
-    print(f"File saved as {encrypted_file.with_suffix('.dec')}")
+    print(f"File saved as {output}")
 
-    return data
+    return output
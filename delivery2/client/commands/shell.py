@@ -0,0 +1,104 @@
+import shlex
+import signal
+import time
+from typing import Annotated
+
+import typer
+
+from utils.batch import read_script, run_batch
+from utils.consts import BATCH_JOBS
+from utils.daemon import CommandServer, is_daemon_running, run_command
+from utils.output import print_batch_summary
+from utils.storage import get_daemon_socket_path
+from utils.types import PathWithCheck
+
+app = typer.Typer()
+
+
+# rep_shell
+@app.command("rep_shell")
+def shell(ctx: typer.Context) -> None:
+    """
+    Runs commands interactively in a single process, keeping keys, sessions and
+    HTTP connections loaded between them.
+    """
+    try:
+        import readline  # noqa: F401 (line editing and history for input())
+    except ImportError:
+        pass
+
+    command = ctx.find_root().command
+    while True:
+        try:
+            line = input("rep> ")
+        except EOFError:
+            print()
+            break
+        except KeyboardInterrupt:
+            print()
+            continue
+
+        try:
+            args = shlex.split(line)
+        except ValueError as e:
+            print(e)
+            continue
+
+        if not args:
+            continue
+        if args[0] in ("exit", "quit"):
+            break
+        run_command(command, args)
+
+
+# rep_daemon
+@app.command("rep_daemon")
+def daemon(ctx: typer.Context) -> None:
+    """
+    Serves commands on a Unix socket, so the exec_commands scripts don't start a
+    new client process each time. Runs until interrupted.
+    """
+    path = get_daemon_socket_path()
+    if is_daemon_running(path):
+        print(f"A daemon is already listening on {path}")
+        raise typer.Exit(code=1)
+    # Left behind by a daemon that was killed
+    path.unlink(missing_ok=True)
+
+    # Stopping the daemon with kill also removes the socket
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    with CommandServer(path, ctx.find_root().command) as server:
+        print(f"Listening on {path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+# rep_batch <file>
+@app.command("rep_batch")
+def batch(
+    ctx: typer.Context,
+    file: PathWithCheck,
+    jobs: Annotated[
+        int,
+        typer.Option("-j", "--jobs", min=1, help="Commands to run at the same time"),
+    ] = BATCH_JOBS,
+) -> None:
+    """
+    Runs the commands of a JSON, YAML or line by line script in a single process,
+    then prints the result and time of each one.
+    """
+    try:
+        lines = read_script(file)
+    except ValueError as e:
+        print(e)
+        raise typer.Exit(code=1)
+
+    start = time.perf_counter()
+    run_batch(ctx.find_root().command, lines, jobs)
+    print_batch_summary(lines, time.perf_counter() - start)
+
+    if any(line.code != 0 for line in lines):
+        raise typer.Exit(code=1)
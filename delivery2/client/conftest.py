@@ -0,0 +1,2 @@
+# Marks the client directory as pytest's root, so the tests import utils the same
+# way main.py does
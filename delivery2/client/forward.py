@@ -0,0 +1,57 @@
+"""
+Runs a client command through the daemon started with rep_daemon, or in a new
+process if the daemon is not running.
+
+Only the standard library is imported, so forwarding a command skips loading the
+client dependencies.
+"""
+
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+
+from utils.storage import get_daemon_socket_path
+
+
+def forward(args: list[str]) -> int | None:
+    """
+    Sends a command to the daemon and prints its output.
+
+    :return: The exit code of the command, or None if the daemon is not running or
+        was started with other options than the caller's
+    """
+    request = {
+        "args": args,
+        "cwd": os.getcwd(),
+        "env": {k: v for k, v in os.environ.items() if k.startswith("REP_")},
+    }
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(get_daemon_socket_path()))
+        except (FileNotFoundError, ConnectionRefusedError):
+            return None
+
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        line = sock.makefile("rb").readline()
+
+    if not line:
+        print("The daemon stopped before the command finished", file=sys.stderr)
+        return 1
+
+    response = json.loads(line)
+    if response["code"] is None:
+        return None
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return response["code"]
+
+
+if __name__ == "__main__":
+    code = forward(sys.argv[1:])
+    if code is None:
+        main = Path(__file__).parent / "main.py"
+        os.execv(sys.executable, [sys.executable, str(main), *sys.argv[1:]])
+    sys.exit(code)
@@ -1,12 +1,13 @@
 import typer
 
-from commands import anonymous, authenticated, local, authorized
+from commands import anonymous, authenticated, local, authorized, shell
 
 app = typer.Typer(name="SIO Project - Client")
 app.registered_commands.extend(anonymous.app.registered_commands)
 app.registered_commands.extend(authenticated.app.registered_commands)
 app.registered_commands.extend(local.app.registered_commands)
 app.registered_commands.extend(authorized.app.registered_commands)
+app.registered_commands.extend(shell.app.registered_commands)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,83 @@
+import io
+import os
+
+import pytest
+
+from utils import blob_cache
+from utils.integrity import hash_chunks
+
+DATA = os.urandom(10_000)
+FILE_HANDLE = hash_chunks([DATA])
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr(blob_cache, "get_blob_cache_dir", lambda: cache_dir)
+    monkeypatch.setattr(blob_cache, "BLOB_CACHE_SIZE", 1024 * 1024)
+    return cache_dir
+
+
+@pytest.fixture
+def cached(tmp_path, cache_dir):
+    src = tmp_path / "downloaded"
+    src.write_bytes(DATA)
+    blob_cache.cache_blob(FILE_HANDLE, src)
+    return src
+
+
+def test_link_cached_blob(tmp_path, cache_dir, cached):
+    dst = tmp_path / "docs" / FILE_HANDLE
+    dst.parent.mkdir()
+
+    # Placed twice, the second time over a link to the same file
+    for _ in range(2):
+        assert blob_cache.link_cached_blob(FILE_HANDLE, dst)
+
+    assert dst.read_bytes() == DATA
+    assert dst.stat().st_ino == (cache_dir / FILE_HANDLE).stat().st_ino
+    assert os.listdir(dst.parent) == [FILE_HANDLE]
+    assert os.listdir(cache_dir) == [FILE_HANDLE]
+
+
+@pytest.mark.parametrize("link", [True, False])
+def test_cache_blob(tmp_path, cache_dir, link):
+    src = tmp_path / "downloaded"
+    src.write_bytes(DATA)
+
+    blob_cache.cache_blob(FILE_HANDLE, src, link=link)
+
+    assert (cache_dir / FILE_HANDLE).read_bytes() == DATA
+    assert ((cache_dir / FILE_HANDLE).stat().st_ino == src.stat().st_ino) == link
+    assert os.listdir(cache_dir) == [FILE_HANDLE]
+
+
+def test_link_missing_blob(tmp_path, cache_dir):
+    dst = tmp_path / "file"
+
+    assert not blob_cache.link_cached_blob(FILE_HANDLE, dst)
+    assert not dst.exists()
+
+
+def test_link_corrupt_blob(tmp_path, cache_dir, cached):
+    (cache_dir / FILE_HANDLE).write_bytes(b"corrupt")
+    dst = tmp_path / "file"
+
+    assert not blob_cache.link_cached_blob(FILE_HANDLE, dst)
+    assert not dst.exists()
+    assert not blob_cache.is_blob_cached(FILE_HANDLE)
+
+
+def test_read_cached_blob(cache_dir, cached):
+    out = io.BytesIO()
+
+    assert blob_cache.read_cached_blob(FILE_HANDLE, out)
+    assert out.getvalue() == DATA
+
+
+def test_read_corrupt_blob(cache_dir, cached):
+    (cache_dir / FILE_HANDLE).write_bytes(b"corrupt")
+
+    with pytest.raises(ValueError):
+        blob_cache.read_cached_blob(FILE_HANDLE, io.BytesIO())
+    assert not blob_cache.is_blob_cached(FILE_HANDLE)
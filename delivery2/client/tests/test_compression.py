@@ -0,0 +1,58 @@
+import io
+import os
+
+import pytest
+
+from utils.compression import (
+    COMPRESSIONS,
+    DEFLATE,
+    ZSTD,
+    compress,
+    compress_file,
+    decompress,
+    decompress_file,
+)
+
+DATA = os.urandom(1000) * 50
+
+# zstd is reported as skipped, not silently dropped, when zstandard is missing
+CODECS = [
+    pytest.param(
+        ZSTD,
+        marks=pytest.mark.skipif(
+            ZSTD not in COMPRESSIONS, reason="zstandard is not installed"
+        ),
+    ),
+    DEFLATE,
+]
+
+
+@pytest.mark.parametrize("compression", CODECS)
+def test_round_trip(compression):
+    assert decompress(compress(DATA, compression), compression) == DATA
+
+
+@pytest.mark.parametrize("compression", CODECS)
+def test_max_size(compression):
+    data = compress(DATA, compression)
+
+    assert decompress(data, compression, max_size=len(DATA)) == DATA
+    with pytest.raises(ValueError):
+        decompress(data, compression, max_size=len(DATA) - 1)
+
+
+@pytest.mark.parametrize("compression", CODECS)
+def test_corrupt_data(compression):
+    with pytest.raises(ValueError):
+        decompress(b"not compressed", compression)
+
+
+@pytest.mark.parametrize("compression", CODECS)
+def test_file_round_trip(compression):
+    compressed, decompressed = io.BytesIO(), io.BytesIO()
+    compress_file(io.BytesIO(DATA), compressed, compression, chunk_size=1000)
+    compressed.seek(0)
+    decompress_file(compressed, decompressed, compression, chunk_size=1000)
+
+    assert decompress(compressed.getvalue(), compression) == DATA
+    assert decompressed.getvalue() == DATA
@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+from utils.encryption.encryptors import encrypt_symmetric
+from utils.encryption.files import AES_BLOCK_SIZE, counter_iv, crypt_file
+
+KEY = bytes(range(32))
+
+
+@pytest.mark.parametrize(
+    "iv",
+    [
+        bytes(16),
+        os.urandom(16),
+        # The counter carries into the upper half, then wraps around the block
+        bytes(8) + b"\xff" * 8,
+        b"\xff" * 15 + b"\xfe",
+    ],
+)
+@pytest.mark.parametrize("jobs", [1, 4])
+@pytest.mark.parametrize("size", [0, 1, 100, 1000])
+def test_crypt_file_matches_encrypt_symmetric(tmp_path, iv, jobs, size):
+    data = os.urandom(size)
+    src, dst, back = tmp_path / "src", tmp_path / "dst", tmp_path / "back"
+    src.write_bytes(data)
+
+    crypt_file(src, dst, KEY, iv, jobs=jobs, segment_size=AES_BLOCK_SIZE * 2)
+    assert dst.read_bytes() == encrypt_symmetric(data, KEY, iv)
+
+    crypt_file(dst, back, KEY, iv, jobs=jobs, segment_size=AES_BLOCK_SIZE * 2)
+    assert back.read_bytes() == data
+
+
+def test_counter_iv_wraps_around():
+    assert counter_iv(b"\xff" * 16, AES_BLOCK_SIZE) == bytes(16)
+    assert counter_iv(bytes(8) + b"\xff" * 8, AES_BLOCK_SIZE) == (
+        bytes(7) + b"\x01" + bytes(8)
+    )
+
+
+def test_segment_size_must_be_whole_blocks(tmp_path):
+    src = tmp_path / "src"
+    src.write_bytes(b"data")
+    with pytest.raises(ValueError):
+        crypt_file(src, tmp_path / "dst", KEY, bytes(16), segment_size=10)
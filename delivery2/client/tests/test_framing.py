@@ -0,0 +1,50 @@
+import io
+import random
+
+import pytest
+
+from utils.framing import HEADER_LENGTH_SIZE, FrameReader, pack_frame, unpack_frame
+
+HEADER = {"content_type": "application/json", "code": 200}
+PAYLOAD = bytes(range(256)) * 40
+
+
+@pytest.mark.parametrize("payload", [b"", b"payload", PAYLOAD])
+def test_frame_round_trip(payload):
+    assert unpack_frame(pack_frame(HEADER, payload)) == (HEADER, payload)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_frame_reader(seed):
+    data = pack_frame(HEADER, PAYLOAD)
+    rng = random.Random(seed)
+    out = io.BytesIO()
+    reader = FrameReader(out)
+    while data:
+        size = rng.randint(0, 50)
+        reader.update(data[:size])
+        data = data[size:]
+
+    assert reader.finalize() == HEADER
+    assert out.getvalue() == PAYLOAD
+
+
+def test_frame_reader_truncated_header():
+    reader = FrameReader(io.BytesIO())
+    reader.update(pack_frame(HEADER, b"")[:-1])
+    with pytest.raises(ValueError):
+        reader.finalize()
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"",
+        (10).to_bytes(HEADER_LENGTH_SIZE, "big") + b"{}",
+        (3).to_bytes(HEADER_LENGTH_SIZE, "big") + b"{x}",
+        (2).to_bytes(HEADER_LENGTH_SIZE, "big") + b"[]",
+    ],
+)
+def test_malformed_frame(data):
+    with pytest.raises(ValueError):
+        unpack_frame(data)
@@ -0,0 +1,54 @@
+import base64
+import io
+import os
+import random
+from hashlib import sha256
+
+import pytest
+
+from utils.integrity import FileHandleHasher, HashingWriter, hash_file, hash_stream
+
+
+def file_handle(data: bytes) -> str:
+    return sha256(base64.encodebytes(data)).hexdigest()
+
+
+def split(data: bytes, rng: random.Random) -> list[bytes]:
+    chunks = []
+    while data:
+        size = rng.randint(0, 200)
+        chunks.append(data[:size])
+        data = data[size:]
+    return chunks
+
+
+@pytest.mark.parametrize("size", [0, 1, 56, 57, 58, 57 * 3, 1000, 10_007])
+def test_hasher_matches_whole_content(size):
+    data = os.urandom(size)
+    rng = random.Random(size)
+
+    for _ in range(20):
+        hasher = FileHandleHasher()
+        for chunk in split(data, rng):
+            hasher.update(chunk)
+        assert hasher.finalize() == file_handle(data)
+
+
+def test_hashing_writer():
+    data = os.urandom(10_000)
+    out = io.BytesIO()
+    writer = HashingWriter(out)
+    for chunk in split(data, random.Random(0)):
+        writer.write(chunk)
+
+    assert out.getvalue() == data
+    assert writer.hasher.finalize() == file_handle(data)
+
+
+def test_hash_stream_and_file(tmp_path):
+    data = os.urandom(100_000)
+    path = tmp_path / "file"
+    path.write_bytes(data)
+
+    assert hash_stream(io.BytesIO(data), chunk_size=1000) == file_handle(data)
+    assert hash_file(path) == file_handle(data)
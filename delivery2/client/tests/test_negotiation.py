@@ -0,0 +1,80 @@
+import pytest
+import requests
+
+import utils.negotiation as negotiation
+from utils.compression import COMPRESSIONS, DEFLATE
+from utils.encryption.encryptors import AES_GCM, CTR_HMAC
+from utils.framing import BINARY_FRAMING, TEXT_FRAMING
+
+
+@pytest.fixture(autouse=True)
+def storage(monkeypatch):
+    stored = {}
+    monkeypatch.setattr(negotiation, "_capabilities", {})
+    monkeypatch.setattr(
+        negotiation, "get_repository_capabilities", lambda a: stored.get(a, {})
+    )
+    monkeypatch.setattr(negotiation, "set_repository_capabilities", stored.__setitem__)
+    monkeypatch.setattr(negotiation, "ENVELOPE", "auto")
+    monkeypatch.setattr(negotiation, "FRAMING", "auto")
+    monkeypatch.setattr(negotiation, "COMPRESSION", "auto")
+    return stored
+
+
+def response(headers):
+    r = requests.Response()
+    r.headers.update(headers)
+    return r
+
+
+def test_ctr_hmac_until_advertised(storage):
+    assert negotiation.negotiate_envelope("repo") == CTR_HMAC
+
+    negotiation.remember_capabilities(
+        "repo", response({"Accept-Envelope": f"{CTR_HMAC}, {AES_GCM}"})
+    )
+    assert negotiation.negotiate_envelope("repo") == AES_GCM
+    assert storage["repo"] == {"envelopes": [CTR_HMAC, AES_GCM]}
+
+
+def test_text_framing_until_advertised():
+    assert negotiation.negotiate_framing("repo") == TEXT_FRAMING
+
+    negotiation.remember_capabilities(
+        "repo", response({"Accept-Framing": f"{TEXT_FRAMING}, {BINARY_FRAMING}"})
+    )
+    assert negotiation.negotiate_framing("repo") == BINARY_FRAMING
+    assert negotiation.negotiate_envelope("repo") == CTR_HMAC
+
+
+def test_no_compression_until_advertised():
+    assert negotiation.negotiate_compression("repo") is None
+
+    negotiation.remember_capabilities("repo", response({"Accept-Compression": DEFLATE}))
+    assert negotiation.negotiate_compression("repo") == DEFLATE
+
+    negotiation.remember_capabilities(
+        "repo", response({"Accept-Compression": ", ".join(COMPRESSIONS)})
+    )
+    assert negotiation.negotiate_compression("repo") == COMPRESSIONS[0]
+
+
+def test_forgets_on_older_repository():
+    negotiation.remember_capabilities(
+        "repo", response({"Accept-Envelope": AES_GCM, "Accept-Framing": BINARY_FRAMING})
+    )
+    negotiation.remember_capabilities("repo", response({}))
+    assert negotiation.negotiate_envelope("repo") == CTR_HMAC
+    assert negotiation.negotiate_framing("repo") == TEXT_FRAMING
+    assert negotiation.negotiate_compression("repo") is None
+
+
+def test_setting_overrides_negotiation(monkeypatch):
+    monkeypatch.setattr(negotiation, "ENVELOPE", AES_GCM)
+    monkeypatch.setattr(negotiation, "COMPRESSION", DEFLATE)
+    assert negotiation.negotiate_envelope("repo") == AES_GCM
+    assert negotiation.negotiate_compression("repo") == DEFLATE
+
+    monkeypatch.setattr(negotiation, "COMPRESSION", "none")
+    negotiation.remember_capabilities("repo", response({"Accept-Compression": DEFLATE}))
+    assert negotiation.negotiate_compression("repo") is None
@@ -0,0 +1,169 @@
+import io
+import json
+import shlex
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import groupby
+from pathlib import Path
+from typing import Any, TextIO
+
+from utils.daemon import run_command
+
+# Commands that replace the token in their session file
+SESSION_WRITING_COMMANDS = ("rep_assume_role", "rep_drop_role")
+
+
+@dataclass
+class BatchLine:
+    number: int
+    args: list[str]
+    code: int | None = None
+    output: str = ""
+    elapsed: float = 0
+    # Lines with the same key may depend on each other, so they run in order
+    key: tuple[str, ...] = field(init=False)
+
+    def __post_init__(self) -> None:
+        if self.args[0] in SESSION_WRITING_COMMANDS and len(self.args) > 1:
+            # Each line rewrites its session file, so they run one at a time
+            self.key = (self.args[0], str(Path(self.args[1]).resolve()))
+        else:
+            # The command and its target (the argument after the session file)
+            self.key = tuple(self.args[:1] + self.args[2:3])
+
+
+def _parse_entry(entry: Any) -> list[str]:
+    if isinstance(entry, str):
+        return shlex.split(entry)
+    if isinstance(entry, list):
+        return [str(arg) for arg in entry]
+    raise ValueError(f"Invalid command: {entry!r}")
+
+
+def read_script(path: Path) -> list[BatchLine]:
+    """
+    Reads a batch script, either a JSON or YAML list of commands (each one a string
+    or a list of arguments), or a text file with one command per line. Empty lines
+    and lines starting with # are skipped.
+
+    :param path: Path of the script
+    :type path: Path
+
+    :return: The commands, numbered as in the script
+    :rtype: list[BatchLine]
+    """
+    text = path.read_text()
+
+    if path.suffix in (".yaml", ".yml", ".json"):
+        if path.suffix == ".json":
+            entries = json.loads(text)
+        else:
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("YAML scripts need PyYAML to be installed")
+            entries = yaml.safe_load(text) or []
+
+        if not isinstance(entries, list):
+            raise ValueError("The script must be a list of commands")
+        lines = [
+            BatchLine(number, _parse_entry(entry))
+            for number, entry in enumerate(entries, start=1)
+        ]
+    else:
+        lines = [
+            BatchLine(number, shlex.split(line))
+            for number, line in enumerate(text.splitlines(), start=1)
+            if not line.lstrip().startswith("#")
+        ]
+
+    lines = [line for line in lines if line.args]
+    if any(line.args[0] == "rep_batch" for line in lines):
+        raise ValueError("rep_batch can't be run from a batch script")
+    return lines
+
+
+class _ThreadOutput(io.TextIOBase):
+    """
+    Stands in for sys.stdout and sys.stderr, sending what each worker thread prints
+    to that thread's buffer.
+    """
+
+    def __init__(self, fallback: TextIO) -> None:
+        self._fallback = fallback
+        self._local = threading.local()
+
+    def capture(self, buffer: io.StringIO | None) -> None:
+        self._local.buffer = buffer
+
+    def write(self, s: str) -> int:
+        buffer = getattr(self._local, "buffer", None)
+        return (buffer if buffer is not None else self._fallback).write(s)
+
+    def flush(self) -> None:
+        if getattr(self._local, "buffer", None) is None:
+            self._fallback.flush()
+
+
+def _run_group(command: Any, lines: list[BatchLine], *streams: _ThreadOutput) -> None:
+    for line in lines:
+        # Errors are kept next to the output of the line that printed them
+        buffer = io.StringIO()
+        for stream in streams:
+            stream.capture(buffer)
+
+        start = time.perf_counter()
+        try:
+            line.code = run_command(command, line.args)
+        finally:
+            line.elapsed = time.perf_counter() - start
+            line.output = buffer.getvalue()
+            for stream in streams:
+                stream.capture(None)
+
+
+def run_batch(command: Any, lines: list[BatchLine], jobs: int) -> None:
+    """
+    Runs the commands of a batch script in this process.
+
+    Consecutive lines with the same command make up a stage, and stages run one
+    after the other. Within a stage, lines on different targets run concurrently,
+    while lines on the same target run in script order. The output of each line is
+    printed in script order once its stage is done.
+
+    :param command: The root click command of the client
+    :type command: click.Command
+    :param lines: The commands to run
+    :type lines: list[BatchLine]
+    :param jobs: Maximum number of commands running at the same time
+    :type jobs: int
+    """
+    out = _ThreadOutput(sys.stdout)
+    err = _ThreadOutput(sys.stderr)
+    old_stdout, old_stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = out, err  # type: ignore[assignment]
+
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            for _, stage in groupby(lines, key=lambda line: line.args[0]):
+                groups: dict[tuple[str, ...], list[BatchLine]] = {}
+                stage_lines = list(stage)
+                for line in stage_lines:
+                    groups.setdefault(line.key, []).append(line)
+
+                futures = [
+                    executor.submit(_run_group, command, group, out, err)
+                    for group in groups.values()
+                ]
+                for future in futures:
+                    future.result()
+
+                for line in stage_lines:
+                    old_stdout.write(f"[{line.number}] {shlex.join(line.args)}\n")
+                    old_stdout.write(line.output)
+                old_stdout.flush()
+    finally:
+        sys.stdout, sys.stderr = old_stdout, old_stderr
@@ -0,0 +1,160 @@
+import os
+import re
+import shutil
+import uuid
+from pathlib import Path
+from typing import BinaryIO
+
+from utils.consts import BLOB_CACHE_SIZE
+from utils.integrity import HASH_CHUNK_SIZE, HashingWriter, hash_stream
+from utils.storage import get_blob_cache_dir
+
+FILE_HANDLE_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# The cache holds encrypted files named by their handle. The modification time of a
+# file is the last time it was used, so no index has to be shared between processes.
+
+
+def _cache_path(file_handle: str) -> Path | None:
+    if BLOB_CACHE_SIZE <= 0 or not FILE_HANDLE_PATTERN.match(file_handle):
+        return None
+    return get_blob_cache_dir() / file_handle
+
+
+def is_blob_cached(file_handle: str) -> bool:
+    return (path := _cache_path(file_handle)) is not None and path.exists()
+
+
+def read_cached_blob(file_handle: str, dst: BinaryIO) -> bool:
+    """
+    Copies a cached file into dst, checking on the way that it still matches its
+    handle, so it is read only once.
+
+    :param file_handle: The handle of the file
+    :type file_handle: str
+    :param dst: Where to copy the file
+    :type dst: BinaryIO
+
+    :return: Whether the file was cached, if not nothing is written to dst
+    :rtype: bool
+
+    :raises ValueError: If the cached file no longer matches its handle. It is
+        evicted, but dst already received it
+    """
+    if (path := _cache_path(file_handle)) is None:
+        return False
+
+    try:
+        f = path.open("rb")
+    except FileNotFoundError:
+        return False
+
+    with f:
+        # Once open, the file can be read even if it is evicted in the meantime
+        writer = HashingWriter(dst)
+        shutil.copyfileobj(f, writer, HASH_CHUNK_SIZE)
+
+    if writer.hasher.finalize() != file_handle:
+        path.unlink(missing_ok=True)
+        raise ValueError("The cached file does not match its handle")
+
+    _touch(path)
+    return True
+
+
+def link_cached_blob(file_handle: str, dst: Path) -> bool:
+    """
+    Places a cached file at dst, after checking it still matches its handle. The
+    file is hard linked where possible, so it is read once and never written again,
+    which is why dst must be a file of the client that is only ever replaced.
+
+    :param file_handle: The handle of the file
+    :type file_handle: str
+    :param dst: Where to place the file, replaced if it exists
+    :type dst: Path
+
+    :return: Whether the file was cached, if not dst is left untouched
+    :rtype: bool
+    """
+    if (path := _cache_path(file_handle)) is None:
+        return False
+
+    try:
+        with path.open("rb") as f:
+            if hash_stream(f) != file_handle:
+                path.unlink(missing_ok=True)
+                return False
+        _place(path, dst, link=True)
+    except FileNotFoundError:
+        # Evicted before it could be placed
+        return False
+
+    _touch(path)
+    return True
+
+
+def cache_blob(file_handle: str, src: Path, link: bool = False) -> None:
+    """
+    Adds a file, already checked against its handle, to the cache, and evicts the
+    least recently used files if the cache is over its size.
+
+    :param link: Whether the file can be hard linked instead of copied, only for
+        files of the client that are replaced rather than modified in place
+    :type link: bool
+    """
+    if (path := _cache_path(file_handle)) is None:
+        return
+    if src.stat().st_size > BLOB_CACHE_SIZE:
+        return
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _place(src, path, link)
+
+    _evict(path.parent, BLOB_CACHE_SIZE)
+
+
+def _place(src: Path, dst: Path, link: bool) -> None:
+    # A hard link shares the data of src instead of writing it again. Where links are
+    # not supported, e.g. across file systems, the file is copied.
+    tmp_path = dst.with_name(f".tmp-{uuid.uuid4().hex}")
+    try:
+        if not (link and _link(src, tmp_path)):
+            shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+    finally:
+        # Left in place if dst already was a link to the same file
+        tmp_path.unlink(missing_ok=True)
+
+
+def _link(src: Path, dst: Path) -> bool:
+    try:
+        os.link(src, dst)
+    except OSError:
+        return False
+    return True
+
+
+def _touch(path: Path) -> None:
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def _evict(cache_dir: Path, max_size: int) -> None:
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if not FILE_HANDLE_PATTERN.match(entry.name):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    size = sum(entry_size for _, entry_size, _ in entries)
+    for _, entry_size, entry_path in sorted(entries):
+        if size <= max_size:
+            break
+        Path(entry_path).unlink(missing_ok=True)
+        size -= entry_size
@@ -0,0 +1,132 @@
+import io
+import zlib
+from typing import BinaryIO
+
+try:
+    import zstandard
+except ImportError:  # zlib is always available as a fallback
+    zstandard = None  # type: ignore[assignment]
+
+ZSTD = "zstd"
+DEFLATE = "deflate"
+
+# Supported codecs, in order of preference
+COMPRESSIONS = (ZSTD, DEFLATE) if zstandard is not None else (DEFLATE,)
+
+# Errors raised by the codecs on corrupted data
+DECOMPRESSION_ERRORS: tuple[type[Exception], ...] = (zlib.error,)
+if zstandard is not None:
+    DECOMPRESSION_ERRORS += (zstandard.ZstdError,)
+
+ZSTD_LEVEL = 3
+DEFLATE_LEVEL = 6
+
+# Read size of the file functions
+CHUNK_SIZE = 1024 * 1024
+
+
+def compress(data: bytes, compression: str) -> bytes:
+    if compression == ZSTD and zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if compression == DEFLATE:
+        return zlib.compress(data, DEFLATE_LEVEL)
+    raise ValueError("Unsupported compression")
+
+
+def decompress(data: bytes, compression: str, max_size: int | None = None) -> bytes:
+    """
+    Decompresses data, refusing to inflate it past a maximum size.
+
+    :param data: The compressed data
+    :type data: bytes
+    :param compression: The codec the data was compressed with
+    :type compression: str
+    :param max_size: Maximum size of the decompressed data, or None for no limit
+    :type max_size: int | None
+
+    :return: The decompressed data
+    :rtype: bytes
+    """
+    limit = -1 if max_size is None else max_size + 1
+
+    try:
+        if compression == ZSTD and zstandard is not None:
+            reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data))
+            result = reader.read(limit)
+        elif compression == DEFLATE:
+            decompressor = zlib.decompressobj()
+            result = decompressor.decompress(data, max(limit, 0))
+        else:
+            raise ValueError("Unsupported compression")
+    except DECOMPRESSION_ERRORS as e:
+        raise ValueError("Could not decompress data") from e
+
+    if max_size is not None and len(result) > max_size:
+        raise ValueError("Decompressed data is too large")
+    return result
+
+
+def compress_file(
+    src: BinaryIO, dst: BinaryIO, compression: str, chunk_size: int = CHUNK_SIZE
+) -> None:
+    """
+    Streaming version of compress(), from one file to another.
+    """
+    if compression == ZSTD and zstandard is not None:
+        zstandard.ZstdCompressor(level=ZSTD_LEVEL).copy_stream(
+            src, dst, read_size=chunk_size, write_size=chunk_size
+        )
+        return
+    if compression != DEFLATE:
+        raise ValueError("Unsupported compression")
+
+    compressor = zlib.compressobj(DEFLATE_LEVEL)
+    while chunk := src.read(chunk_size):
+        dst.write(compressor.compress(chunk))
+    dst.write(compressor.flush())
+
+
+def decompress_file(
+    src: BinaryIO, dst: BinaryIO, compression: str, chunk_size: int = CHUNK_SIZE
+) -> None:
+    """
+    Streaming version of decompress(), from one file to another. Only a chunk of
+    the decompressed data is held in memory at a time.
+    """
+    try:
+        if compression == ZSTD and zstandard is not None:
+            zstandard.ZstdDecompressor().copy_stream(
+                src, dst, read_size=chunk_size, write_size=chunk_size
+            )
+            return
+        if compression != DEFLATE:
+            raise ValueError("Unsupported compression")
+
+        decompressor = zlib.decompressobj()
+        while chunk := src.read(chunk_size):
+            while chunk:
+                dst.write(decompressor.decompress(chunk, chunk_size))
+                chunk = decompressor.unconsumed_tail
+        dst.write(decompressor.flush())
+    except DECOMPRESSION_ERRORS as e:
+        raise ValueError("Could not decompress data") from e
+
+
+def resolve_compression(setting: str) -> str | None:
+    """
+    Resolves a compression setting to a codec.
+
+    :param setting: "auto", "none" to disable compression, or the name of a codec
+    :type setting: str
+
+    :return: The codec, or None if compression is disabled
+    :rtype: str | None
+    """
+    if setting == "none":
+        return None
+    if setting == "auto":
+        # Every client can decompress deflate, zstd depends on its install
+        return DEFLATE
+    if setting not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression: {setting}")
+    return setting
@@ -1,5 +1,63 @@
+import os
+
 DOCUMENT_URL = "/document"
 ORGANIZATION_URL = "/organization"
 SUBJECT_URL = "/subject"
 REPOSITORY_URL = "/repository"
 ROLE_URL = "/role"
+
+# Files bigger than this are sent through a chunked upload session
+UPLOAD_CHUNKED_THRESHOLD = 4 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Envelope of encrypted requests: "aes-gcm", "ctr-hmac", or "auto" for AES-GCM once
+# the repository advertised it (older repositories only have CTR+HMAC)
+ENVELOPE = os.getenv("REP_ENVELOPE", "auto")
+
+# Framing of encrypted bodies: "binary", "text", or "auto" for binary once the
+# repository advertised it (older repositories only have text)
+FRAMING = os.getenv("REP_FRAMING", "auto")
+
+# Compression before encryption: a codec ("zstd" or "deflate"), "none", or "auto" for
+# the best codec both sides have installed, once the repository advertised them
+# (older repositories can't decompress). Smaller bodies are sent uncompressed.
+COMPRESSION = os.getenv("REP_COMPRESSION", "auto")
+COMPRESSION_THRESHOLD = 1024
+
+# HTTP connections to the repository are pooled and kept alive
+HTTP_POOL_SIZE = 10
+HTTP_CONNECT_TIMEOUT = float(os.getenv("REP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("REP_READ_TIMEOUT", "60"))
+# Failed connections and gateway errors are retried, waiting backoff * 2^n seconds
+HTTP_RETRIES = int(os.getenv("REP_RETRIES", "3"))
+HTTP_RETRY_BACKOFF = float(os.getenv("REP_RETRY_BACKOFF", "0.5"))
+# HTTP/2 needs an https repository and the h2 package
+HTTP2 = os.getenv("REP_HTTP2", "0") == "1"
+
+# Large documents are encrypted and decrypted in segments by a pool of "thread"
+# (AES releases the GIL) or "process" workers
+FILE_CRYPTO_EXECUTOR = os.getenv("REP_FILE_CRYPTO_EXECUTOR", "thread")
+FILE_CRYPTO_JOBS = int(os.getenv("REP_FILE_CRYPTO_JOBS", os.cpu_count() or 1))
+
+# Encrypted files are cached by file handle, evicting the least recently used ones
+# past this size in bytes (0 disables the cache)
+BLOB_CACHE_SIZE = int(os.getenv("REP_CACHE_SIZE", str(1024**3)))
+
+# Environment variables of the options above, which are read once when the client
+# starts, so the daemon can't run commands of a caller who set them differently
+STARTUP_ENV = (
+    "REP_ENVELOPE",
+    "REP_FRAMING",
+    "REP_COMPRESSION",
+    "REP_CONNECT_TIMEOUT",
+    "REP_READ_TIMEOUT",
+    "REP_RETRIES",
+    "REP_RETRY_BACKOFF",
+    "REP_HTTP2",
+    "REP_FILE_CRYPTO_EXECUTOR",
+    "REP_FILE_CRYPTO_JOBS",
+    "REP_CACHE_SIZE",
+)
+
+# Commands of a batch script that may run at the same time
+BATCH_JOBS = 8
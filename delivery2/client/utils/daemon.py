@@ -0,0 +1,133 @@
+import contextlib
+import io
+import json
+import os
+import socket
+import socketserver
+from pathlib import Path
+from typing import Any, Iterator
+
+from utils.consts import STARTUP_ENV
+
+# Commands that would start another shell or daemon
+NESTED_COMMANDS = ("rep_shell", "rep_daemon")
+
+
+def run_command(command: Any, args: list[str]) -> int:
+    """
+    Runs a client command in this process, as if it was run from the command line.
+
+    :param command: The root click command of the client
+    :type command: click.Command
+    :param args: The command line arguments, starting with the command name
+    :type args: list[str]
+
+    :return: The exit code
+    :rtype: int
+    """
+    if args and args[0] in NESTED_COMMANDS:
+        print(f"{args[0]} can't be run from the shell or the daemon")
+        return 1
+
+    try:
+        # Standalone mode reports usage errors and typer.Exit as a SystemExit
+        command.main(args, prog_name="main.py")
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code)
+        return 1
+    except Exception as e:
+        # Same as main.py
+        print(e)
+        return 1
+    return 0
+
+
+@contextlib.contextmanager
+def _caller_context(cwd: str, env: dict[str, str]) -> Iterator[None]:
+    # Paths and REP_* options are resolved as in the process that sent the command
+    old_cwd = os.getcwd()
+    old_env = {k: v for k, v in os.environ.items() if k.startswith("REP_")}
+    os.chdir(cwd)
+    for k in old_env:
+        del os.environ[k]
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        os.chdir(old_cwd)
+        for k in env:
+            del os.environ[k]
+        os.environ.update(old_env)
+
+
+class _CommandHandler(socketserver.StreamRequestHandler):
+    server: "CommandServer"
+
+    def handle(self) -> None:
+        if not (line := self.rfile.readline()):
+            # is_daemon_running() connects without sending a command
+            return
+
+        request = json.loads(line)
+        if any(
+            request["env"].get(k) != self.server.startup_env.get(k) for k in STARTUP_ENV
+        ):
+            # The options were read when the daemon started, so the command has to
+            # run in a new process
+            self.wfile.write(json.dumps({"code": None}).encode() + b"\n")
+            return
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+
+        with (
+            _caller_context(request["cwd"], request["env"]),
+            contextlib.redirect_stdout(stdout),
+            contextlib.redirect_stderr(stderr),
+        ):
+            code = run_command(self.server.command, request["args"])
+
+        response = {
+            "code": code,
+            "stdout": stdout.getvalue(),
+            "stderr": stderr.getvalue(),
+        }
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class CommandServer(socketserver.UnixStreamServer):
+    """
+    Runs the commands sent by forward.py, one at a time, in this process. Keys,
+    sessions and HTTP connections stay loaded between commands.
+
+    Each request is a JSON line with the command line arguments, working directory
+    and REP_* environment variables of the caller. The response is a JSON line with
+    the exit code and the output of the command, or a null code if the caller set
+    options read at startup (see STARTUP_ENV) differently from the daemon.
+    """
+
+    def __init__(self, path: Path, command: Any) -> None:
+        self.command = command
+        self.startup_env = {k: os.environ[k] for k in STARTUP_ENV if k in os.environ}
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Anyone who can connect runs commands with this user's keys and sessions
+        old_umask = os.umask(0o177)
+        try:
+            super().__init__(str(path), _CommandHandler)
+        finally:
+            os.umask(old_umask)
+
+    def server_close(self) -> None:
+        super().server_close()
+        Path(self.server_address).unlink(missing_ok=True)  # type: ignore[arg-type]
+
+
+def is_daemon_running(path: Path) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(path))
+        except (FileNotFoundError, ConnectionRefusedError):
+            return False
+    return True
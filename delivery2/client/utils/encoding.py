@@ -6,6 +6,32 @@ def b64_encode_and_escape(data: bytes) -> bytes:
 
 
 def b64_decode_and_unescape(data: bytes) -> bytes:
-    return base64.decodebytes(
-        data.replace(b"\\n", b"\n").replace(b"\\r", b"\r")
-    )
+    return base64.decodebytes(data.replace(b"\\n", b"\n").replace(b"\\r", b"\r"))
+
+
+class B64DecodeStream:
+    """
+    Incremental version of b64_decode_and_unescape().
+
+    Escaped line breaks split between two chunks and base64 characters that don't
+    yet make up a full quantum are kept for the next chunk.
+    """
+
+    def __init__(self) -> None:
+        self._pending = b""
+
+    def update(self, data: bytes) -> bytes:
+        data = self._pending + data
+        held = b"\\" if data.endswith(b"\\") else b""
+        data = data[: len(data) - len(held)]
+
+        for line_break in (b"\\n", b"\\r", b"\n", b"\r"):
+            data = data.replace(line_break, b"")
+
+        cut = len(data) - len(data) % 4
+        self._pending = data[cut:] + held
+        return base64.b64decode(data[:cut])
+
+    def finalize(self) -> bytes:
+        data, self._pending = self._pending, b""
+        return base64.decodebytes(data)
@@ -5,11 +5,24 @@ import urllib
 from enum import Enum
 from typing import Any
 
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey, RSAPublicKey
 from cryptography.hazmat.primitives.ciphers import algorithms, modes, Cipher
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
+from utils.compression import compress
+from utils.consts import COMPRESSION_THRESHOLD
 from utils.encoding import b64_encode_and_escape, b64_decode_and_unescape
+from utils.framing import BINARY_FRAMING, TEXT_FRAMING, pack_frame
+
+# Wire envelopes, sent in the Envelope header. CTR_HMAC is AES-CTR followed by an
+# HMAC-SHA256 of the ciphertext, AES_GCM encrypts and authenticates in one pass.
+CTR_HMAC = "ctr-hmac"
+AES_GCM = "aes-gcm"
+
+IV_SIZES = {CTR_HMAC: 16, AES_GCM: 12}
+TAG_SIZES = {CTR_HMAC: 32, AES_GCM: 16}
 
 
 def encrypt_symmetric(data: bytes, key: bytes, iv: bytes) -> bytes:
@@ -23,21 +36,68 @@ def encrypt_asymmetric(data: bytes, public_key: RSAPublicKey) -> bytes:
     return public_key.encrypt(data, padding.PKCS1v15())
 
 
+def _nonce(iv: bytes, part: int) -> bytes:
+    # The URL and the body of a request share the key and the IV, so each part gets
+    # its own GCM nonce
+    return iv[:-1] + bytes([iv[-1] ^ part])
+
+
+def seal(data: bytes, key: bytes, iv: bytes, envelope: str, part: int = 0) -> bytes:
+    """
+    Encrypts and authenticates data in the given envelope.
+
+    :param part: The index of the part of the message (0 for the URL, 1 for the
+        body). CTR_HMAC ignores it and uses the IV as is.
+    :return: The ciphertext followed by its HMAC or tag
+    """
+    if envelope == AES_GCM:
+        return AESGCM(key).encrypt(_nonce(iv, part), data, None)
+
+    data_enc = encrypt_symmetric(data, key, iv)
+    return data_enc + hmac.digest(key, data_enc, "sha256")
+
+
+def unseal(
+    data: bytes, key: bytes, iv: bytes, envelope: str, part: int = 0
+) -> bytes | None:
+    """
+    Verifies and decrypts data sealed by seal().
+
+    :return: The plaintext, or None if the data was not authenticated
+    """
+    if envelope == AES_GCM:
+        try:
+            return AESGCM(key).decrypt(_nonce(iv, part), data, None)
+        except InvalidTag:
+            return None
+
+    data, hmac_bytes = data[:-32], data[-32:]
+    if not hmac.compare_digest(hmac.digest(key, data, "sha256"), hmac_bytes):
+        return None
+    return decrypt_symmetric(data, key, iv)
+
+
 def encrypt_key(
     public_key: RSAPublicKey,
-    key: bytes = os.urandom(32),
+    key: bytes | None = None,
 ) -> str:
+    if key is None:
+        key = os.urandom(32)
     return b64_encode_and_escape(encrypt_asymmetric(key, public_key)).decode()
 
 
 def encrypt_request(
     url: str,
-    data: dict[str, Any] | None,
+    data: dict[str, Any] | bytes | None,
     public_key: RSAPublicKey,
-    key: bytes = os.urandom(32),
+    key: bytes | None = None,
     jwt: bytes | None = None,
     params: dict[str, str] | None = None,
-) -> tuple[str, str, str | None, str, bytes]:
+    envelope: str = CTR_HMAC,
+    framing: str = TEXT_FRAMING,
+    content_type: str = "application/json",
+    compression: str | None = None,
+) -> tuple[str, str, bytes | None, str, bytes, str | None]:
     """
     Encrypts a request using hybrid encryption.
 
@@ -45,23 +105,35 @@ def encrypt_request(
     :type url: str
     :param params: Unencrypted URL parameters
     :type params: dict[str, str] | None
-    :param data: The dictionary to be encrypted
-    :type data: dict[str, Any] | None
+    :param data: The dictionary (or raw bytes) to be encrypted
+    :type data: dict[str, Any] | bytes | None
     :param key: The symmetric key to encrypt the data, which can be a session key or an autogenerated one.
-    :type key: bytes
+    :type key: bytes | None
     :param public_key: The public key to encrypt the symmetric key
     :type public_key: RSAPublicKey
     :param jwt: The JWT to be encrypted.
     :type jwt: bytes | None
+    :param envelope: The envelope to seal the URL and the data in
+    :type envelope: str
+    :param framing: Whether the data is sent as a binary frame or as escaped base64
+    :type framing: str
+    :param content_type: The content type of the unencrypted data, sent in the frame
+    :type content_type: str
+    :param compression: The codec to compress the data with before encrypting it
+    :type compression: str | None
 
-    :return: The encrypted URL with params, encrypted symmetric key, the encrypted data, the IV and the unencrypted key
-    :rtype: tuple[str, str | None, str, bytes]
+    :return: The encrypted URL with params, encrypted symmetric key, the encrypted data, the IV, the unencrypted key and the codec the data was compressed with, if any
+    :rtype: tuple[str, str, bytes | None, str, bytes, str | None]
     """
     # data: dict[str, Any] | None,          -> body
-    # key: bytes = os.urandom(32),          -> jwt session key or key random
+    # key: bytes | None = None,             -> jwt session key or key random
     # jwt: bytes | None,                    -> jwt or None
 
-    iv = os.urandom(16)
+    # Generated on every call, the daemon and rep_batch send many requests from
+    # the same process
+    if key is None:
+        key = os.urandom(32)
+    iv = os.urandom(IV_SIZES[envelope])
 
     url = url.lstrip("/")
     if params is not None:
@@ -77,19 +149,34 @@ def encrypt_request(
             )
         )
 
-    url_enc = encrypt_symmetric(url.encode(), key, iv)
-    url_enc = url_enc + hmac.digest(key, url_enc, "sha256")
+    url_enc = seal(url.encode(), key, iv, envelope, part=0)
     url = b64_encode_and_escape(url_enc).decode()
 
     data_bytes: bytes | None = None
+    data_compression: str | None = None
     if data is not None:
-        data_bytes = json.dumps(data).encode()
-        data_bytes = encrypt_symmetric(data_bytes, key, iv)
-        data_bytes = data_bytes + hmac.digest(key, data_bytes, "sha256")
-        data_bytes = b64_encode_and_escape(data_bytes)
+        data_bytes = data if isinstance(data, bytes) else json.dumps(data).encode()
+        if framing == BINARY_FRAMING:
+            data_bytes = pack_frame({"content_type": content_type}, data_bytes)
+
+        # Small bodies don't compress enough to be worth it
+        if compression is not None and len(data_bytes) >= COMPRESSION_THRESHOLD:
+            data_bytes = compress(data_bytes, compression)
+            data_compression = compression
+
+        data_bytes = seal(data_bytes, key, iv, envelope, part=1)
+        if framing != BINARY_FRAMING:
+            data_bytes = b64_encode_and_escape(data_bytes)
 
     key_b64 = encrypt_key(public_key, jwt if jwt is not None else key)
-    return url, key_b64, data_bytes, b64_encode_and_escape(iv).decode(), key
+    return (
+        url,
+        key_b64,
+        data_bytes,
+        b64_encode_and_escape(iv).decode(),
+        key,
+        data_compression,
+    )
 
 
 def decrypt_symmetric(data: bytes, key: bytes, iv: bytes) -> bytes:
@@ -104,6 +191,61 @@ def decrypt_asymmetric(data: bytes, private_key: RSAPrivateKey) -> bytes:
     return private_key.decrypt(data, padding.PKCS1v15())
 
 
+class StreamDecryptor:
+    """
+    AES-CTR decryptor for a response streamed in chunks, verifying the HMAC that is
+    appended to the ciphertext once the last chunk is received.
+    """
+
+    def __init__(self, key: bytes, iv: bytes) -> None:
+        self._decryptor = Cipher(algorithms.AES(key), modes.CTR(iv)).decryptor()
+        self._hmac = hmac.new(key, digestmod="sha256")
+        self._tail = b""
+
+    def update(self, data: bytes) -> bytes:
+        # The last 32 bytes seen so far may be the HMAC
+        data = self._tail + data
+        data, self._tail = data[:-32], data[-32:]
+        self._hmac.update(data)
+        return self._decryptor.update(data)
+
+    def finalize(self) -> bytes:
+        if not hmac.compare_digest(self._hmac.digest(), self._tail):
+            raise ValueError("HMAC verification failed.")
+        return self._decryptor.finalize()
+
+
+class GCMStreamDecryptor:
+    """
+    AES-GCM decryptor for a response streamed in chunks, verifying the tag that is
+    appended to the ciphertext once the last chunk is received.
+    """
+
+    def __init__(self, key: bytes, iv: bytes) -> None:
+        self._decryptor = Cipher(algorithms.AES(key), modes.GCM(iv)).decryptor()
+        self._tail = b""
+
+    def update(self, data: bytes) -> bytes:
+        # The last 16 bytes seen so far may be the tag
+        data = self._tail + data
+        data, self._tail = data[:-16], data[-16:]
+        return self._decryptor.update(data)
+
+    def finalize(self) -> bytes:
+        try:
+            return self._decryptor.finalize_with_tag(self._tail)
+        except InvalidTag:
+            raise ValueError("Tag verification failed.")
+
+
+def get_stream_decryptor(
+    key: bytes, iv: bytes, envelope: str
+) -> StreamDecryptor | GCMStreamDecryptor:
+    if envelope == AES_GCM:
+        return GCMStreamDecryptor(key, iv)
+    return StreamDecryptor(key, iv)
+
+
 def decrypt_dict(
     key: str, data: str, iv: str, private_key: RSAPrivateKey
 ) -> dict[str, Any]:
@@ -0,0 +1,103 @@
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from utils.consts import FILE_CRYPTO_EXECUTOR, FILE_CRYPTO_JOBS
+
+AES_BLOCK_SIZE = 16
+
+# Segments start on a whole AES block, so each one has its own counter
+SEGMENT_SIZE = 4 * 1024 * 1024
+
+
+def counter_iv(iv: bytes, offset: int) -> bytes:
+    """
+    Computes the AES-CTR counter block at a given offset of the data.
+
+    :param iv: The initial counter block
+    :type iv: bytes
+    :param offset: Offset in the data, a multiple of the AES block size
+    :type offset: int
+
+    :return: The counter block of the data starting at that offset
+    :rtype: bytes
+    """
+    # Same as the cipher, the whole 128 bit block is a big endian counter
+    counter = int.from_bytes(iv, "big") + offset // AES_BLOCK_SIZE
+    return (counter % 2 ** (8 * AES_BLOCK_SIZE)).to_bytes(AES_BLOCK_SIZE, "big")
+
+
+def _crypt_segment(
+    src: str, dst: str, key: bytes, iv: bytes, offset: int, size: int
+) -> None:
+    cipher = Cipher(algorithms.AES(key), modes.CTR(counter_iv(iv, offset)))
+    encryptor = cipher.encryptor()
+
+    with open(src, "rb") as f:
+        f.seek(offset)
+        data = encryptor.update(f.read(size)) + encryptor.finalize()
+
+    # CTR keeps the length, so the segment goes at the same offset
+    fd = os.open(dst, os.O_WRONLY)
+    try:
+        os.pwrite(fd, data, offset)
+    finally:
+        os.close(fd)
+
+
+def _executor(jobs: int) -> Executor:
+    if FILE_CRYPTO_EXECUTOR == "process":
+        return ProcessPoolExecutor(max_workers=jobs)
+    return ThreadPoolExecutor(max_workers=jobs)
+
+
+def crypt_file(
+    src: Path,
+    dst: Path,
+    key: bytes,
+    iv: bytes,
+    jobs: int = FILE_CRYPTO_JOBS,
+    segment_size: int = SEGMENT_SIZE,
+) -> None:
+    """
+    Encrypts or decrypts (the same operation in CTR mode) a file with AES-CTR.
+
+    The file is split into segments, processed in parallel, each one starting at its
+    own counter. Workers read their segment from src and write it to dst, so memory
+    use doesn't grow with the size of the file.
+
+    :param src: The file to encrypt or decrypt
+    :type src: Path
+    :param dst: Where to write the result
+    :type dst: Path
+    :param key: The AES key
+    :type key: bytes
+    :param iv: The initial counter block
+    :type iv: bytes
+    :param jobs: Maximum number of segments processed at the same time
+    :type jobs: int
+    :param segment_size: Size of the segments, a multiple of the AES block size
+    :type segment_size: int
+    """
+    if segment_size % AES_BLOCK_SIZE:
+        raise ValueError("Segment size must be a multiple of the AES block size")
+
+    size = src.stat().st_size
+    with dst.open("wb") as f:
+        f.truncate(size)
+
+    segments = [
+        (str(src), str(dst), key, iv, offset, segment_size)
+        for offset in range(0, size, segment_size)
+    ]
+    if jobs <= 1 or len(segments) <= 1:
+        for segment in segments:
+            _crypt_segment(*segment)
+        return
+
+    with _executor(min(jobs, len(segments))) as executor:
+        # Raises the first error of the workers
+        for _ in executor.map(_crypt_segment, *zip(*segments)):
+            pass
@@ -0,0 +1,95 @@
+import json
+from typing import Any, BinaryIO
+
+TEXT_FRAMING = "text"
+BINARY_FRAMING = "binary"
+
+FRAME_MEDIA_TYPE = "application/octet-stream"
+
+# A document's metadata followed by its file, sent as a frame without a status code
+DOCUMENT_MEDIA_TYPE = "application/vnd.rep.document"
+
+# Size of the big endian length that precedes the frame header
+HEADER_LENGTH_SIZE = 4
+
+
+def pack_frame(header: dict[str, Any], payload: bytes) -> bytes:
+    """
+    Builds a binary frame, to be sealed as the body of a request.
+
+    On the wire a frame is the ciphertext of ``length | header | payload`` followed
+    by the envelope tag. The header is a JSON object with the metadata that the text
+    framing sends next to the payload, e.g. the content type of a request.
+
+    :param header: Frame metadata
+    :type header: dict[str, Any]
+    :param payload: The frame payload
+    :type payload: bytes
+
+    :return: The frame
+    :rtype: bytes
+    """
+    data = json.dumps(header, separators=(",", ":")).encode()
+    return len(data).to_bytes(HEADER_LENGTH_SIZE, "big") + data + payload
+
+
+def unpack_frame(data: bytes) -> tuple[dict[str, Any], bytes]:
+    """
+    Splits an unsealed binary frame into its header and payload.
+
+    :param data: The unsealed frame
+    :type data: bytes
+
+    :return: The header and the payload
+    :rtype: tuple[dict[str, Any], bytes]
+    """
+    length = int.from_bytes(data[:HEADER_LENGTH_SIZE], "big")
+    end = HEADER_LENGTH_SIZE + length
+    if len(data) < end:
+        raise ValueError("Malformed frame")
+
+    try:
+        header = json.loads(data[HEADER_LENGTH_SIZE:end])
+    except ValueError:
+        raise ValueError("Malformed frame")
+    if not isinstance(header, dict):
+        raise ValueError("Malformed frame")
+
+    return header, data[end:]
+
+
+class FrameReader:
+    """
+    Incremental version of unpack_frame(), for frames too large to keep in memory.
+    The header is buffered, and the payload written to a file as it arrives.
+    """
+
+    def __init__(self, file: BinaryIO) -> None:
+        self._file = file
+        self._buffer = b""
+        self._header: dict[str, Any] | None = None
+
+    def update(self, data: bytes) -> None:
+        if self._header is not None:
+            self._file.write(data)
+            return
+
+        self._buffer += data
+        if len(self._buffer) < HEADER_LENGTH_SIZE:
+            return
+        length = int.from_bytes(self._buffer[:HEADER_LENGTH_SIZE], "big")
+        if len(self._buffer) < HEADER_LENGTH_SIZE + length:
+            return
+
+        self._header, payload = unpack_frame(self._buffer)
+        self._buffer = b""
+        self._file.write(payload)
+
+    def finalize(self) -> dict[str, Any]:
+        """
+        :return: The header of the frame
+        :raises ValueError: If the frame ended before its header did
+        """
+        if self._header is None:
+            raise ValueError("Malformed frame")
+        return self._header
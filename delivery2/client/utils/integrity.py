@@ -0,0 +1,64 @@
+import base64
+from hashlib import sha256
+from pathlib import Path
+from typing import BinaryIO, Iterable
+
+# base64.encodebytes() emits one 76 character line per 57 bytes of input
+B64_LINE_SIZE = 57
+
+# Multiple of a base64 line, so full reads are encoded without being buffered
+HASH_CHUNK_SIZE = B64_LINE_SIZE * 16 * 1024
+
+
+class FileHandleHasher:
+    """
+    Incremental version of sha256(base64.encodebytes(content)), the file handle of
+    a document. Chunks may have any size, the handle is the same as hashing the
+    base64 of the whole content at once.
+    """
+
+    def __init__(self) -> None:
+        self._hash = sha256()
+        self._buffer = b""
+
+    def update(self, data: bytes) -> None:
+        if self._buffer:
+            data = self._buffer + data
+        cut = len(data) - len(data) % B64_LINE_SIZE
+        self._buffer = data[cut:]
+        self._hash.update(base64.encodebytes(data[:cut]))
+
+    def finalize(self) -> str:
+        self._hash.update(base64.encodebytes(self._buffer))
+        self._buffer = b""
+        return self._hash.hexdigest()
+
+
+class HashingWriter:
+    """
+    Writes to a file object, hashing what is written on the way.
+    """
+
+    def __init__(self, file: BinaryIO) -> None:
+        self.file = file
+        self.hasher = FileHandleHasher()
+
+    def write(self, data: bytes) -> int:
+        self.hasher.update(data)
+        return self.file.write(data)
+
+
+def hash_chunks(chunks: Iterable[bytes]) -> str:
+    hasher = FileHandleHasher()
+    for chunk in chunks:
+        hasher.update(chunk)
+    return hasher.finalize()
+
+
+def hash_stream(file: BinaryIO, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    return hash_chunks(iter(lambda: file.read(chunk_size), b""))
+
+
+def hash_file(path: Path, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    with path.open("rb") as f:
+        return hash_stream(f, chunk_size)
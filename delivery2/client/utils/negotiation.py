@@ -0,0 +1,77 @@
+import requests
+
+from utils.compression import COMPRESSIONS, resolve_compression
+from utils.consts import COMPRESSION, ENVELOPE, FRAMING
+from utils.encryption.encryptors import AES_GCM, CTR_HMAC
+from utils.framing import BINARY_FRAMING, TEXT_FRAMING
+from utils.storage import get_repository_capabilities, set_repository_capabilities
+
+# Response headers in which the repository advertises what it supports. Older
+# repositories send none of them, and only understand CTR+HMAC and text framing,
+# without compression.
+CAPABILITY_HEADERS = {
+    "envelopes": "Accept-Envelope",
+    "framings": "Accept-Framing",
+    "compressions": "Accept-Compression",
+}
+
+# Repository address -> capabilities, read from the storage once per process
+_capabilities: dict[str, dict[str, list[str]]] = {}
+
+
+def get_capabilities(repository_address: str) -> dict[str, list[str]]:
+    if repository_address not in _capabilities:
+        _capabilities[repository_address] = get_repository_capabilities(
+            repository_address
+        )
+    return _capabilities[repository_address]
+
+
+def remember_capabilities(repository_address: str, response: requests.Response) -> None:
+    """
+    Stores what the repository advertised in a response, so the next requests use
+    it. A response without them (e.g. after a downgrade) forgets them again.
+    """
+    capabilities = {
+        name: [value.strip() for value in response.headers[header].split(",")]
+        for name, header in CAPABILITY_HEADERS.items()
+        if header in response.headers
+    }
+    if capabilities != get_capabilities(repository_address):
+        _capabilities[repository_address] = capabilities
+        set_repository_capabilities(repository_address, capabilities)
+
+
+def negotiate_envelope(repository_address: str) -> str:
+    """
+    :return: The REP_ENVELOPE setting, or if it is "auto", AES-GCM when the
+        repository supports it and CTR+HMAC otherwise
+    """
+    if ENVELOPE != "auto":
+        return ENVELOPE
+    if AES_GCM in get_capabilities(repository_address).get("envelopes", ()):
+        return AES_GCM
+    return CTR_HMAC
+
+
+def negotiate_framing(repository_address: str) -> str:
+    """
+    :return: The REP_FRAMING setting, or if it is "auto", binary framing when the
+        repository supports it and text framing otherwise
+    """
+    if FRAMING != "auto":
+        return FRAMING
+    if BINARY_FRAMING in get_capabilities(repository_address).get("framings", ()):
+        return BINARY_FRAMING
+    return TEXT_FRAMING
+
+
+def negotiate_compression(repository_address: str) -> str | None:
+    """
+    :return: The codec of the REP_COMPRESSION setting, or if it is "auto", the
+        best codec the repository advertised, or None to send bodies uncompressed
+    """
+    if COMPRESSION != "auto":
+        return resolve_compression(COMPRESSION)
+    advertised = get_capabilities(repository_address).get("compressions", ())
+    return next((codec for codec in COMPRESSIONS if codec in advertised), None)
@@ -1,7 +1,10 @@
+from collections import defaultdict
 from typing import Any
 
 from tabulate import tabulate
 
+from utils.batch import BatchLine
+
 
 def print_subject(
     body: dict[str, Any] | list[dict[str, Any]],
@@ -112,3 +115,58 @@ def print_permissions_list(body: list[str]):
 
 def print_organizations_list(body: list[str]):
     _print_list(body, "Organizations", "No organizations available.")
+
+
+def print_batch_summary(lines: list[BatchLine], elapsed: float) -> None:
+    print(
+        tabulate(
+            [
+                {
+                    "line": line.number,
+                    "command": " ".join(line.args[:1] + line.args[2:]),
+                    "result": "OK" if line.code == 0 else f"Exit {line.code}",
+                    "time": round(line.elapsed * 1000),
+                }
+                for line in lines
+            ],
+            headers={
+                "line": "Line",
+                "command": "Command",
+                "result": "Result",
+                "time": "Time (ms)",
+            },
+            tablefmt="rounded_outline",
+        )
+    )
+
+    by_command: dict[str, list[BatchLine]] = defaultdict(list)
+    for line in lines:
+        by_command[line.args[0]].append(line)
+
+    print(
+        tabulate(
+            [
+                {
+                    "command": command,
+                    "count": len(runs),
+                    "failed": sum(1 for line in runs if line.code != 0),
+                    "total": round(sum(line.elapsed for line in runs) * 1000),
+                    "average": round(
+                        sum(line.elapsed for line in runs) * 1000 / len(runs)
+                    ),
+                }
+                for command, runs in by_command.items()
+            ],
+            headers={
+                "command": "Command",
+                "count": "Count",
+                "failed": "Failed",
+                "total": "Total (ms)",
+                "average": "Average (ms)",
+            },
+            tablefmt="rounded_outline",
+        )
+    )
+
+    rate = len(lines) / elapsed if elapsed > 0 else 0
+    print(f"{len(lines)} commands in {elapsed:.2f} s ({rate:.1f} commands/s)")
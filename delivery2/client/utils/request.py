@@ -1,19 +1,38 @@
-import hmac
 import json
 import time
-from typing import Literal, Any
+from typing import Literal, Any, BinaryIO
 
 import jwt
 import requests
 import typer
 from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey, RSAPublicKey
 
-from utils.encoding import b64_decode_and_unescape
+from utils.compression import COMPRESSIONS, decompress, resolve_compression
+from utils.consts import COMPRESSION, DOWNLOAD_CHUNK_SIZE
+from utils.encoding import b64_decode_and_unescape, B64DecodeStream
 from utils.encryption.encryptors import (
+    CTR_HMAC,
+    TAG_SIZES,
     encrypt_request,
     decrypt_asymmetric,
-    decrypt_symmetric,
+    get_stream_decryptor,
+    unseal,
 )
+from utils.framing import (
+    BINARY_FRAMING,
+    DOCUMENT_MEDIA_TYPE,
+    FRAME_MEDIA_TYPE,
+    FrameReader,
+    unpack_frame,
+)
+from utils import transport
+from utils.negotiation import (
+    negotiate_compression,
+    negotiate_envelope,
+    negotiate_framing,
+    remember_capabilities,
+)
+from utils.storage import get_key_id, set_key_id
 
 
 def request_without_encryption(
@@ -25,13 +44,14 @@ def request_without_encryption(
     params: dict[str, str] | None = None,
 ) -> tuple[str, requests.Response]:
 
-    response = requests.request(
+    response = transport.request(
         method,
         repository_address + "/" + url,
         json=obj,
         headers={"Content-Type": content_type},
         params=params,
     )
+    remember_capabilities(repository_address, response)
 
     body = response.content.decode()
     body_dict = json.loads(body)
@@ -59,46 +79,130 @@ def request_without_session_repo(
     content_type: str = "application/json",
     params: dict[str, str] | None = None,
 ) -> tuple[str, requests.Response]:
-    (url, req_key, req_data, req_iv, key) = encrypt_request(
-        url, obj, repository_public_key, params=params
+    envelope = negotiate_envelope(repository_address)
+    framing = negotiate_framing(repository_address)
+    (url, req_key, req_data, req_iv, key, compression) = encrypt_request(
+        url,
+        obj,
+        repository_public_key,
+        params=params,
+        envelope=envelope,
+        framing=framing,
+        content_type=content_type,
+        compression=negotiate_compression(repository_address),
     )
 
-    response = requests.request(
+    response = transport.request(
         method,
         repository_address + "/" + url,
         data=req_data,
         headers={
-            "Content-Type": content_type,
+            **_content_headers(content_type, framing, compression),
             "Encryption": "repository",
+            "Envelope": envelope,
             "IV": req_iv,
             "Authorization": req_key,
         },
     )
+    remember_capabilities(repository_address, response)
 
-    body = b64_decode_and_unescape(response.content)
+    return _read_repository_response(response, key, private_key)
 
-    if len(body) < 32:
-        return response.content.decode(), response
 
-    data, hmac_bytes = body[:-32], body[-32:]
+def _content_headers(
+    content_type: str, framing: str, compression: str | None
+) -> dict[str, str]:
+    if framing == BINARY_FRAMING:
+        # The content type of the payload is sent inside the frame
+        headers = {"Content-Type": FRAME_MEDIA_TYPE, "Framing": BINARY_FRAMING}
+    else:
+        headers = {"Content-Type": content_type}
 
-    if not hmac.compare_digest(hmac.digest(key, data, "sha256"), hmac_bytes):
-        print("HMAC verification failed.")
+    if resolve_compression(COMPRESSION) is not None:
+        headers["Accept-Compression"] = ", ".join(COMPRESSIONS)
+    if compression is not None:
+        headers["Compression"] = compression
+    return headers
+
+
+def _response_body(response: requests.Response) -> bytes:
+    if response.headers.get("Framing") == BINARY_FRAMING:
+        return response.content
+    return b64_decode_and_unescape(response.content)
+
+
+def _response_envelope(response: requests.Response) -> str:
+    envelope = response.headers.get("Envelope", CTR_HMAC)
+    if envelope not in TAG_SIZES:
+        print(f"Unsupported envelope: {envelope}")
         raise typer.Exit(code=-1)
+    return envelope
 
-    if "IV" in response.headers:
-        res_iv = b64_decode_and_unescape(response.headers["IV"].encode())
-        res_key = key
-        if "Authorization" in response.headers and private_key is not None:
-            res_key = decrypt_asymmetric(
-                b64_decode_and_unescape(response.headers["Authorization"].encode()),
-                private_key,
-            )
-        body = decrypt_symmetric(data, res_key, res_iv).decode()
 
-    body_dict = json.loads(body)
-    code = body_dict.get("code")
-    data = body_dict.get("data")
+def _unseal_response(body: bytes, key: bytes, response: requests.Response) -> bytes:
+    envelope = _response_envelope(response)
+    iv = b64_decode_and_unescape(response.headers.get("IV", "").encode())
+
+    data = unseal(body, key, iv, envelope)
+    if data is None:
+        print(
+            "HMAC verification failed."
+            if envelope == CTR_HMAC
+            else "Tag verification failed."
+        )
+        raise typer.Exit(code=-1)
+    return data
+
+
+def _open_response(
+    body: bytes, key: bytes, response: requests.Response
+) -> tuple[int, str]:
+    """
+    Unseals and decompresses a response body into the status code and the data it
+    wraps, sent either as a binary frame or as {"code": ..., "data": ...}.
+    """
+    data = _unseal_response(body, key, response)
+
+    if (compression := response.headers.get("Compression")) is not None:
+        try:
+            data = decompress(data, compression)
+        except ValueError as e:
+            print(e)
+            raise typer.Exit(code=-1)
+
+    if response.headers.get("Framing") != BINARY_FRAMING:
+        body_dict = json.loads(data)
+        return body_dict.get("code"), body_dict.get("data")
+
+    try:
+        header, payload = unpack_frame(data)
+    except ValueError as e:
+        print(e)
+        raise typer.Exit(code=-1)
+    return header.get("code"), payload.decode()
+
+
+def _read_repository_response(
+    response: requests.Response,
+    key: bytes,
+    private_key: RSAPrivateKey | None,
+) -> tuple[str, requests.Response]:
+    body = _response_body(response)
+
+    if len(body) < TAG_SIZES[_response_envelope(response)]:
+        return response.content.decode(), response
+
+    if "IV" not in response.headers:
+        print("HMAC verification failed.")
+        raise typer.Exit(code=-1)
+
+    res_key = key
+    if "Authorization" in response.headers and private_key is not None:
+        res_key = decrypt_asymmetric(
+            b64_decode_and_unescape(response.headers["Authorization"].encode()),
+            private_key,
+        )
+    code, data = _open_response(body, res_key, response)
 
     if code != 200 and code != 201:
         try:
@@ -111,16 +215,96 @@ def request_without_session_repo(
     return data, response
 
 
-def request_with_session(
+def download_without_session_repo(
+    repository_address: str,
+    url: str,
+    repository_public_key: RSAPublicKey,
+    file: BinaryIO,
+    offset: int = 0,
+) -> requests.Response:
+    """
+    Streams a raw file from the repository into the given file object, decrypting it
+    chunk by chunk.
+
+    :param offset: Byte offset to resume from. If the repository doesn't honour the
+        Range request, the file is rewritten from the beginning.
+    """
+    url_unenc = url
+    envelope = negotiate_envelope(repository_address)
+    (url, req_key, _, req_iv, key, _) = encrypt_request(
+        url, None, repository_public_key, envelope=envelope
+    )
+
+    headers = {
+        "Encryption": "repository",
+        "Envelope": envelope,
+        "IV": req_iv,
+        "Authorization": req_key,
+    }
+    if offset > 0:
+        headers["Range"] = f"bytes={offset}-"
+
+    with transport.request(
+        "GET", repository_address + "/" + url, headers=headers, stream=True
+    ) as response:
+        remember_capabilities(repository_address, response)
+        # The range starts past the end of the file, e.g. the partial file was
+        # complete but not verified, so it is fetched again from the beginning.
+        # The status is wrapped in the envelope, but Content-Range is not.
+        if offset > 0 and (
+            response.status_code == 416
+            or response.headers.get("Content-Range", "").startswith("*/")
+        ):
+            file.seek(0)
+            file.truncate()
+            return download_without_session_repo(
+                repository_address, url_unenc, repository_public_key, file
+            )
+
+        if response.headers.get("Content-Type") != "application/octet-stream":
+            # Errors are still sent as JSON
+            _read_repository_response(response, key, None)
+            return response
+
+        if offset > 0:
+            file.seek(offset if response.status_code == 206 else 0)
+            file.truncate()
+
+        res_iv = b64_decode_and_unescape(response.headers["IV"].encode())
+        decoder = B64DecodeStream()
+        decryptor = get_stream_decryptor(key, res_iv, _response_envelope(response))
+
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            file.write(decryptor.update(decoder.update(chunk)))
+
+        try:
+            file.write(decryptor.update(decoder.finalize()) + decryptor.finalize())
+        except ValueError as e:
+            print(e)
+            raise typer.Exit(code=-1)
+
+    return response
+
+
+def get_session_organization(session: bytes) -> str:
+    payload = jwt.decode(
+        session, algorithms=["HS256"], options={"verify_signature": False}
+    )
+    return payload["organization"]
+
+
+def _send_with_session(
     method: Literal["GET", "POST", "PUT", "DELETE", "PATCH"],
     repository_address: str,
     url: str,
-    obj: dict[str, Any] | None,
+    obj: dict[str, Any] | bytes | None,
     session: bytes,
     repository_public_key: RSAPublicKey,
-    content_type: str = "application/json",
-    params: dict[str, str | bool] | None = None,
-) -> tuple[str, requests.Response]:
+    content_type: str,
+    params: dict[str, str | bool] | None,
+    headers: dict[str, str] | None,
+    stream: bool = False,
+) -> tuple[requests.Response, bytes]:
     payload = jwt.decode(
         session, algorithms=["HS256"], options={"verify_signature": False}
     )
@@ -128,26 +312,67 @@ def request_with_session(
         print("Session expired, please create a new one.")
         raise typer.Exit(code=1)
 
-    (url, req_key, req_data, req_iv, key) = encrypt_request(
+    envelope = negotiate_envelope(repository_address)
+    framing = negotiate_framing(repository_address)
+    (url_enc, req_key, req_data, req_iv, key, compression) = encrypt_request(
         url,
         obj,
         repository_public_key,
         key=payload["keys"][0].encode(),
         jwt=session,
         params=params,
+        envelope=envelope,
+        framing=framing,
+        content_type=content_type,
+        compression=negotiate_compression(repository_address),
     )
-    response = requests.request(
+
+    request_headers = {
+        **(headers or {}),
+        **_content_headers(content_type, framing, compression),
+        "Encryption": "session",
+        "Envelope": envelope,
+        "IV": req_iv,
+    }
+    if (key_id := get_key_id(session)) is not None:
+        request_headers["Key-Id"] = key_id
+    else:
+        request_headers["Authorization"] = req_key
+
+    response = transport.request(
         method,
-        repository_address + "/" + url,
+        repository_address + "/" + url_enc,
         data=req_data,
-        headers={
-            "Content-Type": content_type,
-            "Encryption": "session",
-            "IV": req_iv,
-            "Authorization": req_key,
-        },
+        headers=request_headers,
+        stream=stream,
     )
-
+    remember_capabilities(repository_address, response)
+
+    if response.headers.get("Key-Id") == "invalid":
+        # The repository forgot the key ID, so the session is sent again
+        response.close()
+        set_key_id(session, None)
+        return _send_with_session(
+            method,
+            repository_address,
+            url,
+            obj,
+            session,
+            repository_public_key,
+            content_type,
+            params,
+            headers,
+            stream,
+        )
+    if "Key-Id" in response.headers:
+        set_key_id(session, response.headers["Key-Id"])
+
+    return response, key
+
+
+def _read_session_response(
+    response: requests.Response, key: bytes
+) -> tuple[str, requests.Response]:
     if response.status_code == 500:
         msg = json.loads(response.content)
         print(msg["detail"])
@@ -156,25 +381,17 @@ def request_with_session(
     if "IV" not in response.headers:
         return response.content.decode(), response
 
-    res_iv = b64_decode_and_unescape(response.headers["IV"].encode())
-
-    data = b64_decode_and_unescape(response.content)
+    body = _response_body(response)
 
-    if len(data) < 32:
+    if len(body) < TAG_SIZES[_response_envelope(response)]:
         return response.content.decode(), response
 
-    data, hmac_bytes = data[:-32], data[-32:]
+    code, data = _open_response(body, key, response)
 
-    if not hmac.compare_digest(hmac.digest(key, data, "sha256"), hmac_bytes):
-        print("HMAC verification failed.")
-        raise typer.Exit(code=-1)
-
-    dec_body = decrypt_symmetric(data, payload["keys"][0].encode(), res_iv).decode()
-
-    body_dict = json.loads(dec_body)
-    data = body_dict.get("data")
+    if code == 304:
+        return "", response
 
-    if 400 <= body_dict["code"] < 500:
+    if 400 <= code < 500:
         try:
             msg = json.loads(data)
             if "detail" not in msg:
@@ -185,3 +402,98 @@ def request_with_session(
         raise typer.Exit(code=-1)
 
     return data, response
+
+
+def request_with_session(
+    method: Literal["GET", "POST", "PUT", "DELETE", "PATCH"],
+    repository_address: str,
+    url: str,
+    obj: dict[str, Any] | bytes | None,
+    session: bytes,
+    repository_public_key: RSAPublicKey,
+    content_type: str = "application/json",
+    params: dict[str, str | bool] | None = None,
+    headers: dict[str, str] | None = None,
+) -> tuple[str, requests.Response]:
+    """
+    Sends a request on behalf of a session.
+
+    :param headers: Extra headers, e.g. If-None-Match. A 304 Not Modified answer
+        is returned as an empty body.
+    :type headers: dict[str, str] | None
+    """
+    response, key = _send_with_session(
+        method,
+        repository_address,
+        url,
+        obj,
+        session,
+        repository_public_key,
+        content_type,
+        params,
+        headers,
+    )
+    return _read_session_response(response, key)
+
+
+def download_with_session(
+    repository_address: str,
+    url: str,
+    session: bytes,
+    repository_public_key: RSAPublicKey,
+    file: BinaryIO,
+    headers: dict[str, str] | None = None,
+) -> tuple[str, requests.Response]:
+    """
+    Fetches a document on behalf of a session, as a binary frame whose header is
+    the metadata and whose payload is the raw file, streamed into the given file
+    object while it is decrypted.
+
+    :param headers: Extra headers, e.g. If-None-Match
+    :type headers: dict[str, str] | None
+
+    :return: The metadata, or an empty string if the repository answered 304 Not
+        Modified (nothing is written to the file then), and the response
+    :rtype: tuple[str, requests.Response]
+    """
+    response, key = _send_with_session(
+        "GET",
+        repository_address,
+        url,
+        None,
+        session,
+        repository_public_key,
+        "application/json",
+        None,
+        headers,
+        stream=True,
+    )
+
+    with response:
+        if response.headers.get("Content-Type") != DOCUMENT_MEDIA_TYPE:
+            # Errors and 304 are sent as any other response
+            return _read_session_response(response, key)
+
+        res_iv = b64_decode_and_unescape(response.headers["IV"].encode())
+        decryptor = get_stream_decryptor(key, res_iv, _response_envelope(response))
+        reader = FrameReader(file)
+
+        # Binary framing sends the ciphertext as is, instead of base64
+        if response.headers.get("Framing") == BINARY_FRAMING:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                reader.update(decryptor.update(chunk))
+            tail = b""
+        else:
+            decoder = B64DecodeStream()
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                reader.update(decryptor.update(decoder.update(chunk)))
+            tail = decoder.finalize()
+
+        try:
+            reader.update(decryptor.update(tail) + decryptor.finalize())
+            header = reader.finalize()
+        except ValueError as e:
+            print(e)
+            raise typer.Exit(code=-1)
+
+    return json.dumps(header), response
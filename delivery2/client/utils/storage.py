@@ -1,4 +1,9 @@
+import json
+import os
+import tempfile
+from hashlib import sha256
 from pathlib import Path
+from typing import Any
 
 
 def get_root_dir() -> Path:
@@ -7,3 +12,125 @@ def get_root_dir() -> Path:
 
 def get_storage_dir() -> Path:
     return get_root_dir() / "storage"
+
+
+def get_daemon_socket_path() -> Path:
+    """
+    Gets the path of the Unix socket the client daemon listens on.
+    """
+    if (path := os.getenv("REP_DAEMON_SOCKET")) is not None:
+        return Path(path)
+    return get_storage_dir() / "daemon.sock"
+
+
+def _replace_file(path: Path, content: str) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+def write_session(session_file: Path, token: str) -> None:
+    """
+    Replaces the token of a session file atomically, so commands reading it at the
+    same time never see it truncated.
+    """
+    _replace_file(session_file, token)
+
+
+def get_blob_cache_dir() -> Path:
+    """
+    Gets the directory of the downloaded files cache, see utils.blob_cache.
+    """
+    return get_storage_dir() / "cache" / "blobs"
+
+
+def get_doc_metadata_file(organization: str, doc_name: str) -> Path:
+    return Path("storage/docs") / organization / f"{doc_name}.json"
+
+
+def get_doc_metadata(organization: str, doc_name: str) -> tuple[Any, str] | None:
+    """
+    Gets the last metadata of a document fetched from the repository.
+
+    :return: The metadata and its entity tag, or None if it is not cached or was
+        sent without a tag
+    """
+    metadata_file = get_doc_metadata_file(organization, doc_name)
+    etag_file = metadata_file.with_suffix(".etag")
+    if not (metadata_file.exists() and etag_file.exists()):
+        return None
+    return json.loads(metadata_file.read_text()), etag_file.read_text()
+
+
+def set_doc_metadata(
+    organization: str, doc_name: str, metadata: Any, etag: str | None
+) -> Path:
+    """
+    Caches the metadata of a document, to be revalidated with its entity tag.
+
+    :return: The path of the metadata file
+    """
+    metadata_file = get_doc_metadata_file(organization, doc_name)
+    etag_file = metadata_file.with_suffix(".etag")
+    metadata_file.parent.mkdir(parents=True, exist_ok=True)
+
+    # The tag is written last, so it never stands for older metadata
+    etag_file.unlink(missing_ok=True)
+    metadata_file.write_text(json.dumps(metadata))
+    if etag is not None:
+        etag_file.write_text(etag)
+    return metadata_file
+
+
+def _get_key_id_file(session: bytes) -> Path:
+    return get_storage_dir() / "sessions" / ".key_ids" / sha256(session).hexdigest()
+
+
+def get_key_id(session: bytes) -> str | None:
+    """
+    Gets the key ID the repository issued for a session, which can be sent instead
+    of the RSA encrypted session.
+    """
+    key_id_file = _get_key_id_file(session)
+    return key_id_file.read_text() if key_id_file.exists() else None
+
+
+def set_key_id(session: bytes, key_id: str | None) -> None:
+    key_id_file = _get_key_id_file(session)
+    if key_id is None:
+        key_id_file.unlink(missing_ok=True)
+        return
+
+    key_id_file.parent.mkdir(parents=True, exist_ok=True)
+    key_id_file.write_text(key_id)
+
+
+def _get_capabilities_file(repository_address: str) -> Path:
+    digest = sha256(repository_address.encode()).hexdigest()
+    return get_storage_dir() / "repositories" / digest
+
+
+def get_repository_capabilities(repository_address: str) -> dict[str, list[str]]:
+    """
+    Gets what a repository advertised it supports in its last response, e.g. its
+    envelopes, or nothing if it never did.
+    """
+    capabilities_file = _get_capabilities_file(repository_address)
+    try:
+        return json.loads(capabilities_file.read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def set_repository_capabilities(
+    repository_address: str, capabilities: dict[str, list[str]]
+) -> None:
+    capabilities_file = _get_capabilities_file(repository_address)
+    capabilities_file.parent.mkdir(parents=True, exist_ok=True)
+    # Written atomically, as commands of a batch may answer at the same time
+    _replace_file(capabilities_file, json.dumps(capabilities))
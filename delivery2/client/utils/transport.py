@@ -0,0 +1,66 @@
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.consts import (
+    HTTP2,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_POOL_SIZE,
+    HTTP_READ_TIMEOUT,
+    HTTP_RETRIES,
+    HTTP_RETRY_BACKOFF,
+)
+
+_session: requests.Session | None = None
+
+
+def _enable_http2() -> None:
+    try:
+        from urllib3.http2 import inject_into_urllib3
+
+        inject_into_urllib3()
+    except ImportError:
+        # Needs urllib3 2.3+ and h2, otherwise HTTP/1.1 with keep-alive is used
+        pass
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the HTTP session shared by every request to the repository, so its
+    connections are kept alive and reused instead of opening one per request.
+
+    :return: The shared session
+    :rtype: requests.Session
+    """
+    global _session
+    if _session is not None:
+        return _session
+
+    if HTTP2:
+        _enable_http2()
+
+    # Only idempotent methods are retried once the request was sent
+    retry = Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=HTTP_RETRY_BACKOFF,
+        status_forcelist=(502, 503, 504),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+
+    _session = requests.Session()
+    _session.mount("http://", adapter)
+    _session.mount("https://", adapter)
+    return _session
+
+
+def request(method: str, url: str, **kwargs: Any) -> requests.Response:
+    """
+    Sends a request through the shared session, with the configured timeouts.
+
+    Takes the same arguments as requests.request().
+    """
+    kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    return get_session().request(method, url, **kwargs)
@@ -1,4 +1,5 @@
 import re
+from functools import lru_cache
 from pathlib import Path
 from typing import Annotated
 
@@ -10,6 +11,12 @@ from utils.encryption.loaders import load_public_key
 from utils.permission import Permission
 
 
+@lru_cache(maxsize=16)
+def _load_public_key_file(path: Path, mtime_ns: int) -> RSAPublicKey:
+    # Keyed by modification time, so a long-lived shell sees replaced keys
+    return load_public_key(path.read_text())
+
+
 class PublicKeyParser(click.ParamType):
     name = "PUBLIC KEY"
 
@@ -21,7 +28,7 @@ class PublicKeyParser(click.ParamType):
         if p.is_dir():
             print("Given public key path is a directory")
             raise typer.Exit(code=1)
-        return load_public_key(p.read_text())
+        return _load_public_key_file(p.resolve(), p.stat().st_mtime_ns)
 
 
 class PermissionOrStrParser(click.ParamType):
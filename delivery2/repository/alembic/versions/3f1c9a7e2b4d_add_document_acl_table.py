@@ -0,0 +1,52 @@
+"""Add document ACL table
+
+Revision ID: 3f1c9a7e2b4d
+Revises: 6b7ef6fc4fd8
+Create Date: 2026-10-18 10:12:41.503217
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1c9a7e2b4d"
+down_revision: Union[str, None] = "6b7ef6fc4fd8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "documentacl",
+        sa.Column("document_handle", sa.Uuid(), nullable=False),
+        sa.Column("role", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column(
+            "permission",
+            sa.Enum("DOC_ACL", "DOC_READ", "DOC_DELETE", name="documentpermission"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ["document_handle"],
+            ["document.document_handle"],
+        ),
+        sa.PrimaryKeyConstraint("document_handle", "role", "permission"),
+    )
+    op.create_index(
+        "ix_documentacl_permission_document_handle",
+        "documentacl",
+        ["permission", "document_handle"],
+        unique=False,
+    )
+    op.execute(
+        "INSERT INTO public.documentacl (document_handle, role, permission) SELECT document.document_handle, acl.key, permission.name::documentpermission FROM public.document, jsonb_each(document.acl) AS acl, jsonb_array_elements_text(acl.value) AS permission(name) ON CONFLICT DO NOTHING"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_documentacl_permission_document_handle", table_name="documentacl")
+    op.drop_table("documentacl")
+    op.execute("DROP TYPE public.documentpermission;")
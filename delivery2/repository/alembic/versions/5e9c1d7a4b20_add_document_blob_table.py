@@ -0,0 +1,44 @@
+"""Add document blob table
+
+Revision ID: 5e9c1d7a4b20
+Revises: 8d2e4b6a1c3f
+Create Date: 2026-10-18 15:21:09.418276
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5e9c1d7a4b20"
+down_revision: Union[str, None] = "8d2e4b6a1c3f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "documentblob",
+        sa.Column("file_handle", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False),
+        sa.Column("create_date", sa.DateTime(), nullable=False),
+        sa.Column("release_date", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("file_handle"),
+    )
+    op.create_index(
+        op.f("ix_documentblob_release_date"),
+        "documentblob",
+        ["release_date"],
+        unique=False,
+    )
+    op.execute(
+        "INSERT INTO public.documentblob (file_handle, ref_count, create_date) SELECT file_handle, count(*), min(create_date) FROM public.document WHERE file_handle IS NOT NULL GROUP BY file_handle"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_documentblob_release_date"), table_name="documentblob")
+    op.drop_table("documentblob")
@@ -0,0 +1,39 @@
+"""Add document listing indexes
+
+Revision ID: 8d2e4b6a1c3f
+Revises: 3f1c9a7e2b4d
+Create Date: 2026-10-18 11:02:17.284311
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8d2e4b6a1c3f"
+down_revision: Union[str, None] = "3f1c9a7e2b4d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_document_organization_name_create_date",
+        "document",
+        ["organization_name", "create_date"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_document_organization_name_creator_username",
+        "document",
+        ["organization_name", "creator_username"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_document_organization_name_creator_username", table_name="document"
+    )
+    op.drop_index("ix_document_organization_name_create_date", table_name="document")
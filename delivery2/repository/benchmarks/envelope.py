@@ -0,0 +1,97 @@
+"""
+Throughput of the wire envelopes (AES-CTR + HMAC-SHA256 vs. AES-GCM).
+
+Run from delivery2/repository:
+
+    poetry run python -m benchmarks.envelope --sizes 1M 16M 256M 1G
+
+"Stream" encrypts the payload in 1 MiB chunks, as the middleware does with
+responses, so memory doesn't grow with the payload. "One-shot" seals and unseals
+the whole payload, as done with request bodies, and is skipped above
+--max-one-shot.
+"""
+
+import argparse
+import os
+import time
+from typing import Callable
+
+from repository.utils.encryption.encryptors import (
+    AES_GCM,
+    ENVELOPES,
+    IV_SIZES,
+    GCMStreamEncryptor,
+    StreamEncryptor,
+    seal,
+    unseal,
+)
+
+CHUNK_SIZE = 1024 * 1024
+UNITS = {"K": 1024, "M": 1024**2, "G": 1024**3}
+
+
+def parse_size(size: str) -> int:
+    if size[-1].upper() in UNITS:
+        return int(size[:-1]) * UNITS[size[-1].upper()]
+    return int(size)
+
+
+def timed(func: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def stream(envelope: str, size: int, key: bytes, chunk: bytes) -> None:
+    iv = os.urandom(IV_SIZES[envelope])
+    encryptor = (
+        GCMStreamEncryptor(key, iv) if envelope == AES_GCM else StreamEncryptor(key, iv)
+    )
+    for offset in range(0, size, CHUNK_SIZE):
+        encryptor.update(chunk[: min(CHUNK_SIZE, size - offset)])
+    encryptor.finalize()
+
+
+def one_shot(envelope: str, key: bytes, data: bytes) -> None:
+    iv = os.urandom(IV_SIZES[envelope])
+    if unseal(seal(data, key, iv, envelope), key, iv, envelope) is None:
+        raise RuntimeError("Envelope round trip failed")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", nargs="+", default=["1M", "16M", "256M", "1G"])
+    parser.add_argument("--max-one-shot", default="256M")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    key = os.urandom(32)
+    chunk = os.urandom(CHUNK_SIZE)
+    max_one_shot = parse_size(args.max_one_shot)
+
+    print(f"{'size':>8} {'envelope':>10} {'stream MB/s':>12} {'one-shot MB/s':>14}")
+    for size_str in args.sizes:
+        size = parse_size(size_str)
+        data = os.urandom(size) if size <= max_one_shot else None
+
+        for envelope in ENVELOPES:
+            best = min(
+                timed(lambda: stream(envelope, size, key, chunk))
+                for _ in range(args.repeat)
+            )
+            stream_rate = f"{size / best / 1e6:.0f}"
+
+            one_shot_rate = "-"
+            if data is not None:
+                # Sealing and unsealing, so the payload is processed twice
+                best = min(
+                    timed(lambda: one_shot(envelope, key, data))
+                    for _ in range(args.repeat)
+                )
+                one_shot_rate = f"{2 * size / best / 1e6:.0f}"
+
+            print(f"{size_str:>8} {envelope:>10} {stream_rate:>12} {one_shot_rate:>14}")
+
+
+if __name__ == "__main__":
+    main()
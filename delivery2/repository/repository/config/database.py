@@ -1,29 +1,60 @@
+import asyncio
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Annotated
 
 from alembic import command, config
+from fastapi import Depends
 from orjson import orjson
-from sqlalchemy import Connection
-from sqlalchemy.ext.asyncio import AsyncEngine
-from sqlalchemy.orm import sessionmaker
-from sqlmodel import create_engine
+from sqlalchemy import Connection, QueuePool, event, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from repository.config.settings import settings
+from repository.utils.metrics import metrics
 from repository.utils.serializers import default
 
-engine = AsyncEngine(
-    create_engine(
-        settings.DATABASE_URI,
-        future=True,
-        json_serializer=lambda content: orjson.dumps(
-            content,
-            default=default,
-            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
-        ).decode(),
-    )
+engine = create_async_engine(
+    settings.DATABASE_URI,
+    json_serializer=lambda content: orjson.dumps(
+        content,
+        default=default,
+        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+    ).decode(),
+    pool_size=settings.DATABASE_POOL_SIZE,
+    max_overflow=settings.DATABASE_MAX_OVERFLOW,
+    pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+    pool_recycle=settings.DATABASE_POOL_RECYCLE,
+    pool_pre_ping=settings.DATABASE_POOL_PRE_PING,
+    connect_args={
+        "prepared_statement_cache_size": settings.DATABASE_STATEMENT_CACHE_SIZE
+    },
 )
 
+async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def _register_pool_metrics() -> None:
+    pool = engine.sync_engine.pool
+    assert isinstance(pool, QueuePool)
+    capacity = settings.DATABASE_POOL_SIZE + settings.DATABASE_MAX_OVERFLOW
+
+    metrics.gauge("db_pool_size", pool.size)
+    metrics.gauge("db_pool_checked_in", pool.checkedin)
+    metrics.gauge("db_pool_checked_out", pool.checkedout)
+    metrics.gauge("db_pool_overflow", lambda: max(pool.overflow(), 0))
+    metrics.gauge("db_pool_saturation", lambda: pool.checkedout() / capacity)
+
+    @event.listens_for(pool, "connect")
+    def on_connect(*_: object) -> None:
+        metrics.increment("db_pool_connections_opened")
+
+    @event.listens_for(pool, "invalidate")
+    def on_invalidate(*_: object) -> None:
+        metrics.increment("db_pool_connections_invalidated")
+
+
+_register_pool_metrics()
+
 
 def run_upgrade(connection: Connection, cfg: config.Config) -> None:
     cfg.attributes["connection"] = connection
@@ -35,8 +66,37 @@ async def init_db() -> None:
         await conn.run_sync(run_upgrade, config.Config("alembic.ini"))
 
 
+async def warm_up_pool() -> None:
+    """
+    Opens the whole base pool at startup, so the first requests don't pay the
+    connection handshake.
+    """
+
+    async def ping() -> None:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(ping() for _ in range(settings.DATABASE_POOL_SIZE)))
+
+
+async def close_db() -> None:
+    await engine.dispose()
+
+
 @asynccontextmanager
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
-    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
     async with async_session() as session:
         yield session
+
+
+async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Request-scoped session, shared by every dependency and CRUD call of a request.
+    It is committed once, after the endpoint returns, and rolled back if it raises.
+    """
+    async with async_session() as session:
+        yield session
+        await session.commit()
+
+
+DatabaseSession = Annotated[AsyncSession, Depends(get_db_session)]
@@ -1,5 +1,6 @@
 import os
 from dataclasses import field
+from typing import Literal
 
 from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey, RSAPublicKey
 from pydantic import Field
@@ -24,6 +25,14 @@ class Settings(BaseSettings):
     DATABASE_PASSWORD: str = os.getenv("DATABASE_PASSWORD", "postgres")
     DATABASE_URI: str = f"postgresql+asyncpg://postgres:{DATABASE_PASSWORD}@db:5432/sio"
 
+    # Database pool, per worker process (size it as connections / workers)
+    DATABASE_POOL_SIZE: int = 10
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT: float = 30
+    DATABASE_POOL_RECYCLE: int = 30 * 60
+    DATABASE_POOL_PRE_PING: bool = True
+    DATABASE_STATEMENT_CACHE_SIZE: int = 500
+
     # Repository keys
     KEYS: tuple[RSAPrivateKey, RSAPublicKey] = Field(
         default_factory=lambda: load_private_key(
@@ -37,5 +46,63 @@ class Settings(BaseSettings):
     )
     AUTH_ALGORITHM: str = "HS256"
 
+    # Crypto executor (RSA, key derivation and bulk AES run out of the event loop)
+    CRYPTO_EXECUTOR: Literal["thread", "process"] = "thread"
+    CRYPTO_WORKERS: int = os.cpu_count() or 1
+    CRYPTO_INLINE_THRESHOLD: int = 64 * 1024
+
+    # Compression of encrypted bodies, negotiated with the Accept-Compression header
+    COMPRESSION_THRESHOLD: int = 1024
+    COMPRESSION_MAX_SIZE: int = 64 * 1024 * 1024
+
+    # Authenticated subjects, cached by session ID
+    AUTH_CACHE_SIZE: int = 10_000
+    AUTH_CACHE_TTL: int = 30
+
+    # Role permissions, indexed by organization
+    ROLE_INDEX_SIZE: int = 10_000
+    ROLE_INDEX_TTL: int = 10 * 60
+
+    # Cache invalidation listener, its connection is checked every
+    # INVALIDATION_HEALTH_CHECK_INTERVAL seconds and reopened when lost
+    INVALIDATION_HEALTH_CHECK_INTERVAL: float = 10
+    INVALIDATION_HEALTH_CHECK_TIMEOUT: float = 5
+    INVALIDATION_RECONNECT_DELAY: float = 1
+
+    # Session key resumption (skips the RSA decryption of known keys). Per worker,
+    # see session_key_cache
+    SESSION_KEY_CACHE_SIZE: int = 10_000
+    SESSION_KEY_CACHE_TTL: int = 30 * 60
+
+    # Documents
+    UPLOAD_CHUNK_SIZE: int = 4 * 1024 * 1024
+    # Uploads in progress. They hold the document key in the clear, so this must not
+    # be under the static directory
+    UPLOAD_LOCATION: str = "uploads"
+    # Chunked uploads reserve their whole size up front
+    UPLOAD_MAX_SIZE: int = 4 * 1024 * 1024 * 1024
+    DOCUMENT_PAGE_SIZE: int = 100
+    DOCUMENT_PAGE_SIZE_MAX: int = 1000
+
+    # Document blobs: "local", or another backend as "module:Class"
+    BLOB_BACKEND: str = "local"
+    BLOB_LOCATION: str = "static/docs"
+
+    # Garbage collection of unreferenced blobs, every BLOB_GC_INTERVAL seconds (0
+    # disables it), once they have been unreferenced for BLOB_GC_GRACE_PERIOD seconds
+    BLOB_GC_INTERVAL: int = 60 * 60
+    BLOB_GC_GRACE_PERIOD: int = 24 * 60 * 60
+    BLOB_GC_BATCH_SIZE: int = 100
+    BLOB_GC_MAX_DELETES_PER_SECOND: float = 100
+    BLOB_GC_DRY_RUN: bool = False
+    # Chunked uploads without a new chunk for this long are removed by the GC
+    UPLOAD_MAX_AGE: int = 24 * 60 * 60
+
+    # Pool saturation and internal counters at /repository/metrics, off by default
+    METRICS_ENABLED: bool = False
+
+    # Bulk requests
+    BULK_MAX_ITEMS: int = 1000
+
 
 settings = Settings()
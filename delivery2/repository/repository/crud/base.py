@@ -4,8 +4,6 @@ from typing import Type
 from sqlmodel import select, SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from repository.config.database import get_session
-
 
 class CRUDBase[
     ModelType: SQLModel,
@@ -19,62 +17,49 @@ class CRUDBase[
         """
         Default methods to Create, Read, Update & Delete (CRUD).
 
+        Every method runs in the session it is given, which is usually the
+        request's one (see get_db_session). Changes are only flushed, the session's
+        owner commits them.
+
         :param model: The SQLModel model to use.
         :type model: SQLModel
         """
         self.model = model
 
-    async def _add_to_db(
-        self, obj: ModelType, session: AsyncSession | None = None
-    ) -> ModelType:
-        if session is not None:
-            session.add(obj)
-            await session.commit()
-            await session.refresh(obj)
-            return obj
-
-        async with get_session() as session:
-            session.add(obj)
-            await session.commit()
-            await session.refresh(obj)
-            return obj
+    async def _add_to_db(self, session: AsyncSession, obj: ModelType) -> ModelType:
+        session.add(obj)
+        await session.flush()
+        await session.refresh(obj)
+        return obj
 
-    async def create(self, obj: CreateSchemaType) -> ModelType:
+    async def create(self, session: AsyncSession, obj: CreateSchemaType) -> ModelType:
 
         db_obj = self.model.model_validate(obj)
-        return await self._add_to_db(db_obj)
-
-    async def get(
-        self, id: PrimaryKeyType, session: AsyncSession | None = None
-    ) -> ModelType | None:
-        if session is not None:
-            return await session.get(self.model, id)
+        return await self._add_to_db(session, db_obj)
 
-        async with get_session() as session:
-            return await session.get(self.model, id)
+    async def get(self, session: AsyncSession, id: PrimaryKeyType) -> ModelType | None:
+        return await session.get(self.model, id)
 
-    async def get_all(self) -> list[ModelType]:
-        async with get_session() as session:
-            result = await session.exec(select(self.model))
-            return list(result.all())
+    async def get_all(self, session: AsyncSession) -> list[ModelType]:
+        result = await session.exec(select(self.model))
+        return list(result.all())
 
     async def update(
-        self, id: PrimaryKeyType, obj: CreateSchemaType
+        self, session: AsyncSession, id: PrimaryKeyType, obj: CreateSchemaType
     ) -> ModelType | None:
-        db_obj = await self.get(id)
+        db_obj = await self.get(session, id)
         if db_obj is None:
             return None
 
         db_obj.sqlmodel_update(obj)
 
-        return await self._add_to_db(db_obj)
+        return await self._add_to_db(session, db_obj)
 
-    async def delete(self, id: PrimaryKeyType) -> bool:
-        obj = await self.get(id)
+    async def delete(self, session: AsyncSession, id: PrimaryKeyType) -> bool:
+        obj = await self.get(session, id)
         if obj is None:
             return False
 
-        async with get_session() as session:
-            await session.delete(obj)
-            await session.commit()
-            return True
+        await session.delete(obj)
+        await session.flush()
+        return True
@@ -1,96 +1,325 @@
 import base64
 import os
+import shutil
 import uuid
 from datetime import datetime
-from hashlib import sha256
 from typing import Literal
 
-from sqlalchemy import func, literal_column, Grouping
+from sqlalchemy import func, tuple_
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm.attributes import flag_modified
 from sqlalchemy.sql.operators import ge, le, eq
-from sqlmodel import select
+from sqlmodel import col, select, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel.sql._expression_select_cls import SelectOfScalar
+from starlette.concurrency import run_in_threadpool
 
-from repository.config.database import get_session
+from repository.config.settings import settings
 from repository.crud.base import CRUDBase
+from repository.crud.document_blob import crud_document_blob
 from repository.crud.organization_role import crud_organization_role
+from repository.models.bulk import BulkResult
 from repository.models.document import (
     Document,
+    DocumentACL,
+    DocumentACLPatch,
     DocumentCreate,
+    DocumentPage,
     DocumentRolesByPermission,
+    DocumentUpload,
+    DocumentUploadCreate,
 )
+from repository.models.organization import OrganizationRole
 from repository.models.permission import DocumentPermission
+from repository.utils.blob_store import blob_store
+from repository.utils.integrity import hash_chunks, hash_file
+
+UPLOADS_PATH = settings.UPLOAD_LOCATION
+
+# Where older versions kept the uploads, served as static files
+LEGACY_UPLOADS_PATH = "static/uploads"
+
+
+def move_legacy_uploads() -> None:
+    """
+    Moves the uploads in progress out of the static directory, when the app starts.
+    """
+    try:
+        entries = list(os.scandir(LEGACY_UPLOADS_PATH))
+    except FileNotFoundError:
+        return
+
+    os.makedirs(UPLOADS_PATH, exist_ok=True)
+    for entry in entries:
+        try:
+            shutil.move(entry.path, os.path.join(UPLOADS_PATH, entry.name))
+        except FileNotFoundError:
+            # Moved by another worker
+            pass
+    try:
+        os.rmdir(LEGACY_UPLOADS_PATH)
+    except OSError:
+        pass
+
+
+def _create_upload_files(upload_id: uuid.UUID, upload: DocumentUploadCreate) -> None:
+    os.makedirs(UPLOADS_PATH, exist_ok=True)
+    with open(f"{UPLOADS_PATH}/{upload_id}.json", "w") as f:
+        f.write(upload.model_dump_json())
+    with open(f"{UPLOADS_PATH}/{upload_id}.part", "wb") as f:
+        f.truncate(upload.size)
+
+
+def _read_upload_file(upload_id: uuid.UUID) -> DocumentUploadCreate | None:
+    try:
+        with open(f"{UPLOADS_PATH}/{upload_id}.json", "r") as f:
+            return DocumentUploadCreate.model_validate_json(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def _write_upload_chunk(upload_id: uuid.UUID, offset: int, data: bytes) -> None:
+    fd = os.open(f"{UPLOADS_PATH}/{upload_id}.part", os.O_WRONLY)
+    try:
+        os.pwrite(fd, data, offset)
+    finally:
+        os.close(fd)
+
+
+def _finish_upload_files(upload_id: uuid.UUID, file_handle: str) -> None:
+    blob_store.write_file(file_handle, f"{UPLOADS_PATH}/{upload_id}.part")
+    os.remove(f"{UPLOADS_PATH}/{upload_id}.json")
+
+
+def _encode_cursor(document: Document) -> str:
+    cursor = f"{document.create_date.isoformat()}|{document.document_handle}"
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        create_date, document_handle = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        )
+        return datetime.fromisoformat(create_date), uuid.UUID(document_handle)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+
+def _apply_acl_patch(
+    acl: dict[str, set[DocumentPermission]], patch: DocumentACLPatch
+) -> None:
+    # Same rules as CRUDDocument.add_acl and CRUDDocument.remove_acl
+    if patch.add:
+        acl[patch.role] = set(acl.get(patch.role, ())) | {patch.permission}
+        return
+
+    if patch.role not in acl:
+        return
+    if (
+        patch.permission == DocumentPermission.DOC_ACL
+        and sum(1 for roles in acl.values() if patch.permission in roles) == 1
+    ):
+        raise ValueError("Cannot remove the last ACL permission from a role")
+    acl[patch.role] = set(acl[patch.role]) - {patch.permission}
+
+
+def _acl_rows(
+    acl: dict[str, set[DocumentPermission]],
+) -> set[tuple[str, DocumentPermission]]:
+    return {(role, permission) for role, perms in acl.items() for permission in perms}
 
 
 class CRUDDocument(CRUDBase[Document, DocumentCreate, uuid.UUID]):
     def __init__(self) -> None:
         super().__init__(Document)
 
-    async def add_new(self, document: DocumentCreate, file: str) -> Document:
+    async def create(self, session: AsyncSession, obj: DocumentCreate) -> Document:
+        db_obj = Document.model_validate(obj)
+
+        session.add(db_obj)
+        await session.flush()
+        session.add_all(
+            DocumentACL(
+                document_handle=db_obj.document_handle,
+                role=role,
+                permission=permission,
+            )
+            for role, permissions in db_obj.acl.items()
+            for permission in permissions
+        )
+        if db_obj.file_handle is not None:
+            await crud_document_blob.retain(session, db_obj.file_handle)
+        await session.flush()
+        await session.refresh(db_obj)
+        return db_obj
+
+    async def add_new(
+        self, session: AsyncSession, document: DocumentCreate, file: str
+    ) -> Document:
         file_content = base64.decodebytes(file.encode())
-        if (sha256(file.encode()).hexdigest()) != document.file_handle:
+        # Hashed from the content, so it doesn't depend on how the client wrapped
+        # the base64 lines
+        file_handle = await run_in_threadpool(hash_chunks, [file_content])
+        if file_handle != document.file_handle:
             raise ValueError("File handle does not match the file content")
 
         if await self.get_by_name_and_organization(
-            document.name, document.organization_name
+            session, document.name, document.organization_name
         ):
             raise ValueError("Document with this name already exists")
 
-        path = f"static/docs"
-        os.makedirs(path, exist_ok=True)
-        with open(f"{path}/{document.file_handle}", "wb") as f:
-            f.write(file_content)
+        # The blob is retained first, so the garbage collector can't remove an
+        # identical blob between the write and the commit
+        db_obj = await self.create(session, document)
+        await run_in_threadpool(blob_store.write, file_handle, file_content)
+        return db_obj
+
+    async def start_upload(
+        self, session: AsyncSession, upload: DocumentUploadCreate
+    ) -> DocumentUpload:
+        if await self.get_by_name_and_organization(
+            session, upload.name, upload.organization_name
+        ):
+            raise ValueError("Document with this name already exists")
+
+        upload_obj = DocumentUpload(
+            chunk_size=settings.UPLOAD_CHUNK_SIZE, size=upload.size
+        )
+        await run_in_threadpool(_create_upload_files, upload_obj.upload_id, upload)
+        return upload_obj
+
+    async def _get_upload(
+        self, upload_id: uuid.UUID, username: str, organization_name: str
+    ) -> DocumentUploadCreate:
+        upload = await run_in_threadpool(_read_upload_file, upload_id)
+        if (
+            upload is None
+            or upload.creator_username != username
+            or upload.organization_name != organization_name
+        ):
+            raise ValueError("Upload not found")
+        return upload
+
+    async def write_upload_chunk(
+        self,
+        upload_id: uuid.UUID,
+        offset: int,
+        data: bytes,
+        username: str,
+        organization_name: str,
+    ) -> int:
+        """
+        Writes a chunk of an upload session at the given offset.
+
+        Each chunk is sent in its own encrypted request, so it is authenticated by
+        that request's HMAC before reaching this method. Chunks may arrive in any
+        order.
+
+        :return: The number of bytes written
+        """
+        upload = await self._get_upload(upload_id, username, organization_name)
+        if len(data) > settings.UPLOAD_CHUNK_SIZE:
+            raise ValueError("Chunk is larger than the allowed chunk size")
+        if offset < 0 or offset + len(data) > upload.size:
+            raise ValueError("Chunk is out of the file bounds")
+
+        await run_in_threadpool(_write_upload_chunk, upload_id, offset, data)
+        return len(data)
+
+    async def complete_upload(
+        self,
+        session: AsyncSession,
+        upload_id: uuid.UUID,
+        username: str,
+        organization_name: str,
+    ) -> Document:
+        upload = await self._get_upload(upload_id, username, organization_name)
+
+        file_handle = await run_in_threadpool(
+            hash_file, f"{UPLOADS_PATH}/{upload_id}.part"
+        )
+        if file_handle != upload.file_handle:
+            raise ValueError("File handle does not match the file content")
 
-        return await self.create(document)
+        if await self.get_by_name_and_organization(
+            session, upload.name, upload.organization_name
+        ):
+            raise ValueError("Document with this name already exists")
+
+        # Same order as add_new
+        db_obj = await self.create(session, DocumentCreate.model_validate(upload))
+        await run_in_threadpool(_finish_upload_files, upload_id, file_handle)
+        return db_obj
 
     async def get_by_name_and_organization(
-        self, name: str, organization_name: str
+        self, session: AsyncSession, name: str, organization_name: str
     ) -> Document | None:
-        async with get_session() as session:
-            result = await session.exec(
-                select(Document)
-                .where(Document.name == name)
-                .where(Document.organization_name == organization_name)
-                .where(Document.file_handle != None)
-            )
+        result = await session.exec(
+            select(Document)
+            .where(Document.name == name)
+            .where(Document.organization_name == organization_name)
+            .where(Document.file_handle != None)
+        )
 
-            return result.first()
+        return result.first()
 
     async def get_all(
         self,
+        session: AsyncSession,
         username: str | None = None,
         date: datetime | None = None,
         date_order: Literal["nt", "ot", "et"] = "nt",
         organization_name: str | None = None,
-    ) -> list[Document]:
-        async with get_session() as session:
-            query: SelectOfScalar[Document] = select(Document)
+        cursor: str | None = None,
+        limit: int = settings.DOCUMENT_PAGE_SIZE,
+    ) -> DocumentPage:
+        query: SelectOfScalar[Document] = select(Document)
 
-            if username:
-                query = query.where(Document.creator_username == username)
+        if username:
+            query = query.where(Document.creator_username == username)
 
-            if organization_name:
-                query = query.where(Document.organization_name == organization_name)
+        if organization_name:
+            query = query.where(Document.organization_name == organization_name)
 
-            if date:
-                operators = {
-                    "nt": ge,
-                    "ot": le,
-                    "et": eq,
-                }
-                query = query.where(operators[date_order](Document.create_date, date))
+        if date:
+            operators = {
+                "nt": ge,
+                "ot": le,
+                "et": eq,
+            }
+            query = query.where(operators[date_order](Document.create_date, date))
+
+        if cursor:
+            query = query.where(
+                tuple_(Document.create_date, Document.document_handle)
+                < tuple_(*_decode_cursor(cursor))
+            )
 
-            result = await session.exec(query)
-            return list(result.all())
+        # Fetch one extra row to know whether there is a next page
+        query = query.order_by(
+            Document.create_date.desc(),  # type: ignore
+            Document.document_handle.desc(),  # type: ignore
+        ).limit(limit + 1)
+
+        result = await session.exec(query)
+        documents = list(result.all())
+
+        if len(documents) <= limit:
+            return DocumentPage(items=documents)
+
+        documents = documents[:limit]
+        return DocumentPage(items=documents, next_cursor=_encode_cursor(documents[-1]))
 
     async def add_acl(
         self,
+        session: AsyncSession,
         document: Document,
         role: str,
         permission: DocumentPermission,
         organization_name: str,
     ) -> Document:
-        if await crud_organization_role.get((organization_name, role)) is None:
+        if await crud_organization_role.get(session, (organization_name, role)) is None:
             raise ValueError("Role does not exist")
 
         if role not in document.acl:
@@ -99,16 +328,27 @@ class CRUDDocument(CRUDBase[Document, DocumentCreate, uuid.UUID]):
         acl.add(permission)
         document.acl[role] = acl
         flag_modified(document, "acl")
-        return await self._add_to_db(document)
+
+        await session.exec(
+            insert(DocumentACL)
+            .values(
+                document_handle=document.document_handle,
+                role=role,
+                permission=permission,
+            )
+            .on_conflict_do_nothing()
+        )
+        return await self._add_to_db(session, document)
 
     async def remove_acl(
         self,
+        session: AsyncSession,
         document: Document,
         role: str,
         permission: DocumentPermission,
         organization_name: str,
     ) -> Document:
-        if await crud_organization_role.get((organization_name, role)) is None:
+        if await crud_organization_role.get(session, (organization_name, role)) is None:
             raise ValueError("Role does not exist")
 
         if role not in document.acl:
@@ -122,54 +362,155 @@ class CRUDDocument(CRUDBase[Document, DocumentCreate, uuid.UUID]):
         acl.discard(permission)
         document.acl[role] = acl
         flag_modified(document, "acl")
-        return await self._add_to_db(document)
 
-    async def delete(self, document_handle: uuid.UUID, username: str) -> bool:
-        document = await self.get(document_handle)
-        if document is None:
-            return False
+        await session.exec(
+            delete(DocumentACL)
+            .where(DocumentACL.document_handle == document.document_handle)
+            .where(DocumentACL.role == role)
+            .where(DocumentACL.permission == permission)
+        )
+        return await self._add_to_db(session, document)
 
-        document.file_handle = None
-        document.deleter_username = username
-        await self._add_to_db(document)
-        return True
+    async def patch_acls(
+        self,
+        session: AsyncSession,
+        organization_name: str,
+        roles: set[str],
+        patches: list[DocumentACLPatch],
+    ) -> list[BulkResult]:
+        """
+        Applies many ACL changes, loading the documents and roles they refer to
+        once and writing the normalized ACL rows in one insert and one delete.
 
-    async def get_roles_by_permission(
-        self, organization_name: str, permission: DocumentPermission
-    ) -> list[DocumentRolesByPermission]:
-        async with get_session() as session:
-            jsonb_each = func.jsonb_each(Document.acl)
-
-            each_key = Grouping(
-                Grouping(jsonb_each).op(".")(literal_column("key"))
-            ).label("role")
-            each_value = Grouping(jsonb_each).op(".")(literal_column("value"))
-            value_set = Grouping(func.jsonb_array_elements_text(each_value)).label(
-                "permission"
-            )
+        Patches are applied in order, so a patch sees the changes of the previous
+        ones on the same document. A patch that fails does not stop the others.
+
+        :param roles: Roles of the session making the changes
+        :return: The result of each patch, in the given order
+        """
+        names = {patch.name for patch in patches}
+        result = await session.exec(
+            select(Document)
+            .where(Document.organization_name == organization_name)
+            .where(col(Document.name).in_(names))
+            .where(Document.file_handle != None)
+        )
+        documents = {doc.name: doc for doc in result.all()}
+
+        patch_roles = {patch.role for patch in patches}
+        result_roles = await session.exec(
+            select(OrganizationRole.role)
+            .where(OrganizationRole.organization_name == organization_name)
+            .where(col(OrganizationRole.role).in_(patch_roles))
+        )
+        existing_roles = set(result_roles.all())
 
-            subquery = (
-                select(Document.name.label("name"), each_key, value_set)  # type: ignore
-                .select_from(Document)
-                .where(Document.organization_name == organization_name)
+        acls = {
+            name: {role: set(perms) for role, perms in doc.acl.items()}
+            for name, doc in documents.items()
+        }
+        results = []
+        for patch in patches:
+            acl = acls.get(patch.name)
+            if acl is None:
+                results.append(
+                    BulkResult(key=patch.name, ok=False, detail="Document not found")
+                )
+                continue
+            # Checked against the ACL as it was before this request, as in rep_acl_doc
+            if not any(
+                DocumentPermission.DOC_ACL in perms
+                for role, perms in documents[patch.name].acl.items()
+                if role in roles
+            ):
+                results.append(
+                    BulkResult(
+                        key=patch.name, ok=False, detail="Not enough permissions"
+                    )
+                )
+                continue
+            if patch.role not in existing_roles:
+                results.append(
+                    BulkResult(key=patch.name, ok=False, detail="Role does not exist")
+                )
+                continue
+
+            try:
+                _apply_acl_patch(acl, patch)
+            except ValueError as e:
+                results.append(BulkResult(key=patch.name, ok=False, detail=str(e)))
+                continue
+            results.append(BulkResult(key=patch.name, ok=True))
+
+        added: list[dict[str, object]] = []
+        removed: list[tuple[uuid.UUID, str, DocumentPermission]] = []
+        for name, doc in documents.items():
+            old_rows, new_rows = _acl_rows(doc.acl), _acl_rows(acls[name])
+            if old_rows == new_rows:
+                continue
+            added.extend(
+                {
+                    "document_handle": doc.document_handle,
+                    "role": role,
+                    "permission": permission,
+                }
+                for role, permission in new_rows - old_rows
             )
+            removed.extend(
+                (doc.document_handle, role, permission)
+                for role, permission in old_rows - new_rows
+            )
+            doc.acl = acls[name]
+            flag_modified(doc, "acl")
+            session.add(doc)
 
-            query = (
-                select(
-                    subquery.c.name,
-                    func.array_agg(subquery.c.role).label("roles_with_permission"),
+        if added:
+            await session.exec(
+                insert(DocumentACL).values(added).on_conflict_do_nothing()
+            )
+        if removed:
+            await session.exec(
+                delete(DocumentACL).where(
+                    tuple_(
+                        DocumentACL.document_handle,
+                        DocumentACL.role,
+                        DocumentACL.permission,
+                    ).in_(removed)
                 )
-                .select_from(subquery)
-                .where(subquery.c.permission == permission)
-                .group_by(subquery.c.name)
             )
+        await session.flush()
+        return results
 
-            result = await session.exec(query)
-            result_list: list[tuple[str, list[str]]] = list(result.all())
-            return [
-                DocumentRolesByPermission(name=name, roles=roles)
-                for name, roles in result_list
-            ]
+    async def delete(  # type: ignore[override]
+        self, session: AsyncSession, document: Document, username: str
+    ) -> Document:
+        if document.file_handle is not None:
+            await crud_document_blob.release(session, document.file_handle)
+        document.file_handle = None
+        document.deleter_username = username
+        return await self._add_to_db(session, document)
+
+    async def get_roles_by_permission(
+        self,
+        session: AsyncSession,
+        organization_name: str,
+        permission: DocumentPermission,
+    ) -> list[DocumentRolesByPermission]:
+        result = await session.exec(
+            select(Document.name, func.array_agg(DocumentACL.role))
+            .join(
+                DocumentACL,
+                DocumentACL.document_handle == Document.document_handle,
+            )
+            .where(Document.organization_name == organization_name)
+            .where(DocumentACL.permission == permission)
+            .group_by(Document.name)
+        )
+        result_list: list[tuple[str, list[str]]] = list(result.all())
+        return [
+            DocumentRolesByPermission(name=name, roles=roles)
+            for name, roles in result_list
+        ]
 
 
 crud_document = CRUDDocument()
@@ -0,0 +1,49 @@
+from sqlalchemy import case, func, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import col
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from repository.crud.base import CRUDBase
+from repository.models.document import DocumentBlob
+
+
+class CRUDDocumentBlob(CRUDBase[DocumentBlob, DocumentBlob, str]):
+    def __init__(self) -> None:
+        super().__init__(DocumentBlob)
+
+    async def retain(self, session: AsyncSession, file_handle: str) -> None:
+        """
+        Counts a new document referencing a blob.
+        """
+        statement = insert(DocumentBlob).values(file_handle=file_handle, ref_count=1)
+        await session.exec(
+            statement.on_conflict_do_update(
+                index_elements=["file_handle"],
+                set_={
+                    "ref_count": DocumentBlob.ref_count + 1,
+                    "release_date": None,
+                },
+            )
+        )
+
+    async def release(self, session: AsyncSession, file_handle: str) -> None:
+        """
+        Stops counting a deleted document referencing a blob. The blob is kept, it
+        is up to the garbage collector to remove it.
+        """
+        ref_count = col(DocumentBlob.ref_count)
+        await session.exec(
+            update(DocumentBlob)
+            .where(col(DocumentBlob.file_handle) == file_handle)
+            .where(ref_count > 0)
+            .values(
+                ref_count=ref_count - 1,
+                release_date=case(
+                    (ref_count == 1, func.now()),
+                    else_=DocumentBlob.release_date,
+                ),
+            )
+        )
+
+
+crud_document_blob = CRUDDocumentBlob()
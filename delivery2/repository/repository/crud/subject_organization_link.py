@@ -1,15 +1,14 @@
 import base64
-from typing import cast
 
-from cryptography.hazmat.primitives._serialization import Encoding, PublicFormat
-from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey
+from sqlalchemy import func, update
 from sqlalchemy.orm.attributes import flag_modified
-from sqlmodel import select
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel.sql._expression_select_cls import SelectOfScalar
 
-from repository.config.database import get_session
 from repository.crud.base import CRUDBase
 from repository.crud.organization_role import crud_organization_role
+from repository.models.bulk import BulkResult
 from repository.models.relations import (
     SubjectOrganizationLink,
     SubjectOrganizationLinkCreate,
@@ -17,7 +16,12 @@ from repository.models.relations import (
 from repository.models.session import Session, SessionWithSubjectInfo, SessionCreate
 from repository.models.subject import SubjectActiveListing
 from repository.utils.auth.generate_token import create_token
-from repository.utils.encryption.loaders import load_private_key
+from repository.utils.auth.link_cache import (
+    forget_authenticated_link,
+    forget_authenticated_sessions,
+)
+from repository.utils.encryption.executor import crypto_executor
+from repository.utils.encryption.loaders import load_public_key_of_private_key
 
 
 class CRUDSubjectOrganizationLink(
@@ -26,33 +30,30 @@ class CRUDSubjectOrganizationLink(
     def __init__(self) -> None:
         super().__init__(SubjectOrganizationLink)
 
-    async def create_session(self, info: SessionCreate) -> tuple[str, RSAPublicKey]:
+    async def create_session(
+        self, session: AsyncSession, info: SessionCreate
+    ) -> tuple[str, str]:
         credentials_bytes = base64.decodebytes(info.credentials.encode())
-        async with get_session() as session:
-            rel = await self.get((info.username, info.organization), session)
-            if rel is None:
-                raise ValueError("Subject not found")
+        rel = await self.get(session, (info.username, info.organization))
+        if rel is None:
+            raise ValueError("Subject not found")
 
-            (private_key, public_key) = load_private_key(
-                credentials_bytes, info.password
-            )
+        # Decrypting the private key runs its password KDF, which is CPU bound
+        public_key = await crypto_executor.run(
+            load_public_key_of_private_key, credentials_bytes, info.password
+        )
 
-            if public_key.public_bytes(
-                Encoding.PEM, PublicFormat.PKCS1
-            ).decode() not in [pk.key for pk in rel.subject.public_keys]:
-                raise ValueError("Public key not found in user keys")
+        if public_key not in [pk.key for pk in rel.subject.public_keys]:
+            raise ValueError("Public key not found in user keys")
 
+        await forget_authenticated_link(session, rel)
         rel.session = Session(keys=[])
         rel.session.keys = ["".join(str(rel.session.id).split("-"))]
 
-        rel = await self.update(
-            (info.username, info.organization),
-            rel,  # type: ignore
-        )
+        rel = await self._add_to_db(session, rel)
 
-        # Not null checks, however, this will never be None
+        # Not null check, however, this will never be None
         # I'm doing this because otherwise PyCharm yells at me
-        rel = cast(SubjectOrganizationLink, rel)
         if rel.session is None:
             raise ValueError("Session not created")
 
@@ -67,37 +68,35 @@ class CRUDSubjectOrganizationLink(
         return token, public_key
 
     async def get_subjects_by_organization(
-        self, organization: str, username: str | None
+        self, session: AsyncSession, organization: str, username: str | None
     ) -> list[SubjectActiveListing]:
-        async with get_session() as session:
-            query: SelectOfScalar[SubjectOrganizationLink] = select(
-                SubjectOrganizationLink
-            ).where(SubjectOrganizationLink.organization_name == organization)
-
-            if username is not None:
-                query = query.where(
-                    SubjectOrganizationLink.subject_username == username
-                )
+        query: SelectOfScalar[SubjectOrganizationLink] = select(
+            SubjectOrganizationLink
+        ).where(SubjectOrganizationLink.organization_name == organization)
 
-            result = await session.exec(query)
-            links: list[SubjectOrganizationLink] = list(result.all())
-            return [
-                SubjectActiveListing(**a.subject.model_dump(), active=a.active)
-                for a in links
-            ]
+        if username is not None:
+            query = query.where(SubjectOrganizationLink.subject_username == username)
+
+        result = await session.exec(query)
+        links: list[SubjectOrganizationLink] = list(result.all())
+        return [
+            SubjectActiveListing(**a.subject.model_dump(), active=a.active)
+            for a in links
+        ]
 
     async def set_active(
-        self, username: str, organization: str, active: bool
+        self, session: AsyncSession, username: str, organization: str, active: bool
     ) -> SubjectOrganizationLink | None:
-        link = await self.get((username, organization))
+        link = await self.get(session, (username, organization))
         if link is None:
             return None
 
+        await forget_authenticated_link(session, link)
         link.active = active
-        return await self._add_to_db(link)
+        return await self._add_to_db(session, link)
 
     async def manage_role_in_session(
-        self, obj: SubjectOrganizationLink, role: str, add: bool
+        self, session: AsyncSession, obj: SubjectOrganizationLink, role: str, add: bool
     ) -> str:
         if obj.session is None:
             raise ValueError("Session not found")
@@ -111,9 +110,10 @@ class CRUDSubjectOrganizationLink(
         else:
             roles.discard(role)
 
+        await forget_authenticated_link(session, obj)
         obj.session.roles = roles
         flag_modified(obj, "session")
-        obj = await self._add_to_db(obj)
+        obj = await self._add_to_db(session, obj)
 
         token = create_token(
             SessionWithSubjectInfo(
@@ -124,22 +124,29 @@ class CRUDSubjectOrganizationLink(
         )
         return token
 
-    async def add_role_to_session(self, obj: SubjectOrganizationLink, role: str) -> str:
-        return await self.manage_role_in_session(obj, role, True)
+    async def add_role_to_session(
+        self, session: AsyncSession, obj: SubjectOrganizationLink, role: str
+    ) -> str:
+        return await self.manage_role_in_session(session, obj, role, True)
 
     async def drop_role_from_session(
-        self, obj: SubjectOrganizationLink, role: str
+        self, session: AsyncSession, obj: SubjectOrganizationLink, role: str
     ) -> str:
-        return await self.manage_role_in_session(obj, role, False)
+        return await self.manage_role_in_session(session, obj, role, False)
 
     async def manage_subject_role(
-        self, organization: str, username: str, role: str, action: str
+        self,
+        session: AsyncSession,
+        organization: str,
+        username: str,
+        role: str,
+        action: str,
     ) -> SubjectOrganizationLink:
-        role_link = await crud_organization_role.get((organization, role))
+        role_link = await crud_organization_role.get(session, (organization, role))
         if role_link is None:
             raise ValueError("Role not found")
 
-        link = await self.get((username, organization))
+        link = await self.get(session, (username, organization))
         if link is None:
             raise ValueError("Subject not found")
 
@@ -151,37 +158,90 @@ class CRUDSubjectOrganizationLink(
             case "remove":
                 if (
                     role == "Managers"
-                    and len(await self.get_subjects_by_role(organization, role)) == 1
+                    and len(
+                        await self.get_subjects_by_role(session, organization, role)
+                    )
+                    == 1
                 ):
                     raise ValueError(
                         "Managers role must have at least one active subject"
                     )
                 r_set.discard(role)
 
+        await forget_authenticated_link(session, link)
         link.role_ids = r_set
-        return await self._add_to_db(link)
+        return await self._add_to_db(session, link)
+
+    async def add_role_to_subjects(
+        self,
+        session: AsyncSession,
+        organization: str,
+        role: str,
+        usernames: list[str],
+    ) -> list[BulkResult]:
+        """
+        Adds a role to many subjects of an organization in a single statement.
+
+        :return: The result of each subject, in the given order
+        """
+        if await crud_organization_role.get(session, (organization, role)) is None:
+            raise ValueError("Role not found")
+
+        updated: set[str] = set()
+        if usernames:
+            # Removing the role first keeps role_ids free of duplicates
+            result = await session.exec(
+                update(SubjectOrganizationLink)
+                .where(col(SubjectOrganizationLink.organization_name) == organization)
+                .where(col(SubjectOrganizationLink.subject_username).in_(usernames))
+                .values(
+                    role_ids=func.array_append(
+                        func.array_remove(SubjectOrganizationLink.role_ids, role),
+                        role,
+                    )
+                )
+                .returning(
+                    col(SubjectOrganizationLink.subject_username),
+                    col(SubjectOrganizationLink.session),
+                )
+            )
+            rows = result.all()
+            await forget_authenticated_sessions(
+                session, (link_session for _, link_session in rows)
+            )
+            updated.update(username for username, _ in rows)
+
+        return [
+            (
+                BulkResult(key=username, ok=True)
+                if username in updated
+                else BulkResult(key=username, ok=False, detail="Subject not found")
+            )
+            for username in usernames
+        ]
 
     async def get_subjects_by_role(
-        self, organization: str, role: str
+        self, session: AsyncSession, organization: str, role: str
     ) -> list[SubjectActiveListing]:
-        role_obj = await crud_organization_role.get((organization, role))
+        role_obj = await crud_organization_role.get(session, (organization, role))
         if role_obj is None:
             raise ValueError("Role not found")
 
-        async with get_session() as session:
-            result = await session.exec(
-                select(SubjectOrganizationLink)
-                .where(SubjectOrganizationLink.organization_name == organization)
-                .where(SubjectOrganizationLink.role_ids.contains({role}))
-            )
-            links: list[SubjectOrganizationLink] = list(result.all())
-            return [
-                SubjectActiveListing(**a.subject.model_dump(), active=a.active)
-                for a in links
-            ]
-
-    async def get_subject_roles(self, organization: str, subject: str) -> list[str]:
-        link = await self.get((subject, organization))
+        result = await session.exec(
+            select(SubjectOrganizationLink)
+            .where(SubjectOrganizationLink.organization_name == organization)
+            .where(SubjectOrganizationLink.role_ids.contains({role}))
+        )
+        links: list[SubjectOrganizationLink] = list(result.all())
+        return [
+            SubjectActiveListing(**a.subject.model_dump(), active=a.active)
+            for a in links
+        ]
+
+    async def get_subject_roles(
+        self, session: AsyncSession, organization: str, subject: str
+    ) -> list[str]:
+        link = await self.get(session, (subject, organization))
         if link is None:
             raise ValueError("Subject not found")
         return list(link.role_ids)
@@ -1,28 +1,37 @@
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator, Callable, Awaitable, Any
+from typing import AsyncGenerator, Any
 
-from fastapi import FastAPI, Request, Response
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 
-from repository.config.database import init_db
+from repository.config.database import init_db, warm_up_pool, close_db
 from repository.config.settings import settings
+from repository.crud.document import move_legacy_uploads
 from repository.routers import router
-from repository.utils.middleware import (
-    decrypt_request_body,
-    decrypt_request_key,
-    encrypt_response,
-    decrypt_request_url,
-    obfuscate_response,
-)
+from repository.utils.blob_gc import start_blob_gc, stop_blob_gc
+from repository.utils.blob_store import blob_store
+from repository.utils.encryption.executor import crypto_executor
+from repository.utils.middleware import EncryptionMiddleware
+from repository.utils.notifications import start_listener, stop_listener
 from repository.utils.serializers import CustomORJSONResponse
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI) -> AsyncGenerator[None, None]:
     await init_db()
+    await warm_up_pool()
+    await start_listener()
+    await run_in_threadpool(blob_store.setup)
+    await run_in_threadpool(move_legacy_uploads)
+    start_blob_gc()
     yield
+    await stop_blob_gc()
+    await stop_listener()
+    await close_db()
+    crypto_executor.shutdown()
 
 
 app = FastAPI(
@@ -45,28 +54,7 @@ app.add_middleware(
 )
 
 
-@app.middleware("http")
-async def encryption_middleware(
-    request: Request,
-    call_next: Callable[[Request], Awaitable[Response]],
-) -> Response:
-    (request, token) = await decrypt_request_key(request)
-    await decrypt_request_url(request, token)
-    await decrypt_request_body(request, token)
-
-    try:
-        response = await call_next(request)
-    except ValueError as e:
-        response = CustomORJSONResponse(content={"detail": str(e)}, status_code=400)
-
-    if settings.PRODUCTION or not request.url.path.startswith("/docs"):
-        await obfuscate_response(response)
-
-    await encrypt_response(
-        response, request.state, request.headers.get("Encryption") is not None
-    )
-    return response
-
+app.add_middleware(EncryptionMiddleware)
 
 app.mount(settings.STATIC_PATH, StaticFiles(directory="static"), name="static")
 app.include_router(router)
@@ -1,4 +1,4 @@
-from .document import Document  # noqa
+from .document import Document, DocumentACL, DocumentBlob  # noqa
 from .organization import Organization, OrganizationRole  # noqa
 from .relations import SubjectOrganizationLink  # noqa
 from .subject import PublicKey, Subject  # noqa
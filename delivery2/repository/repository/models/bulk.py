@@ -0,0 +1,12 @@
+from sqlmodel import SQLModel
+
+
+class BulkResult(SQLModel):
+    """
+    Result of one item of a bulk request. Results are in the same order as the
+    items, and failed items don't stop the others.
+    """
+
+    key: str
+    ok: bool
+    detail: str | None = None
@@ -1,11 +1,12 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import Column, func
+from sqlalchemy import Column, Enum, Index, func
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import RelationshipProperty
 from sqlmodel import SQLModel, Field, Relationship
 
+from repository.config.settings import settings
 from repository.models.organization import Organization
 from repository.models.permission import DocumentPermission
 from repository.models.subject import Subject
@@ -32,6 +33,19 @@ class DocumentBaseWithPrivateMeta(DocumentBase):
 
 
 class Document(DocumentBaseWithPrivateMeta, table=True):
+    __table_args__ = (
+        Index(
+            "ix_document_organization_name_create_date",
+            "organization_name",
+            "create_date",
+        ),
+        Index(
+            "ix_document_organization_name_creator_username",
+            "organization_name",
+            "creator_username",
+        ),
+    )
+
     document_handle: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     create_date: datetime = Field(default=func.now())
 
@@ -53,6 +67,47 @@ class Document(DocumentBaseWithPrivateMeta, table=True):
     )
 
 
+class DocumentACL(SQLModel, table=True):
+    """
+    Normalized copy of Document.acl, with one row per role and permission, so
+    documents can be looked up by permission through an index.
+    """
+
+    __table_args__ = (
+        Index(
+            "ix_documentacl_permission_document_handle",
+            "permission",
+            "document_handle",
+        ),
+    )
+
+    document_handle: uuid.UUID = Field(
+        foreign_key="document.document_handle", primary_key=True
+    )
+    role: str = Field(primary_key=True)
+    permission: DocumentPermission = Field(
+        sa_column=Column(Enum(DocumentPermission), primary_key=True)
+    )
+
+
+class DocumentBlob(SQLModel, table=True):
+    """
+    Number of documents whose file handle points to a blob. Identical uploads share
+    their blob, which is only unreferenced once every document is deleted.
+    """
+
+    file_handle: str = Field(primary_key=True)
+    ref_count: int = Field(default=0)
+    create_date: datetime = Field(default=func.now())
+    # When ref_count last dropped to zero
+    release_date: datetime | None = Field(default=None, index=True)
+
+
+class DocumentPage(SQLModel):
+    items: list[DocumentBase]
+    next_cursor: str | None = None
+
+
 class DocumentCreate(DocumentBaseWithPrivateMeta):
     file_handle: str
 
@@ -61,6 +116,23 @@ class DocumentCreateWithFile(DocumentCreate):
     file_content: str
 
 
+class DocumentUploadCreate(DocumentCreate):
+    size: int = Field(ge=0, le=settings.UPLOAD_MAX_SIZE)
+
+
+class DocumentUpload(SQLModel):
+    upload_id: uuid.UUID = Field(default_factory=uuid.uuid4)
+    chunk_size: int
+    size: int
+
+
+class DocumentACLPatch(SQLModel):
+    name: str
+    role: str
+    add: bool
+    permission: DocumentPermission
+
+
 class DocumentRolesByPermission(SQLModel):
     name: str
     roles: list[str]
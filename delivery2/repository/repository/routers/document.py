@@ -1,16 +1,24 @@
-import base64
-import pathlib
+import uuid
 from datetime import datetime
-from typing import Literal
+from typing import BinaryIO, Iterator, Literal, Annotated
 
-from fastapi import APIRouter, HTTPException, Security
+from fastapi import APIRouter, Body, HTTPException, Security, Request, Path, Query
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 
+from repository.config.database import DatabaseSession
+from repository.config.settings import settings
 from repository.crud.document import crud_document
+from repository.models.bulk import BulkResult
 from repository.models.document import (
     Document,
     DocumentCreate,
+    DocumentACLPatch,
     DocumentBase,
     DocumentCreateWithFile,
+    DocumentPage,
+    DocumentUpload,
+    DocumentUploadCreate,
 )
 from repository.models.permission import DocumentPermission, Permission
 from repository.models.relations import SubjectOrganizationLink
@@ -19,13 +27,39 @@ from repository.utils.auth.authorization_handler import (
     check_permission,
     check_doc_permission,
 )
+from repository.utils.blob_store import FILE_HANDLE_PATTERN, blob_store
+from repository.utils.encoding import B64EncodeStream
+from repository.utils.etag import document_etag, etag_matches
+from repository.utils.framing import DOCUMENT_MEDIA_TYPE, pack_frame_header
+from repository.utils.metrics import metrics
 
 router = APIRouter(prefix="/document", tags=["Document"])
 
 
+def _iter_blob(blob: BinaryIO, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    with blob:
+        while chunk := blob.read(chunk_size):
+            yield chunk
+
+
+def _iter_json_base64(blob: BinaryIO) -> Iterator[bytes]:
+    # Same as the JSON string of base64.encodebytes() of the whole file
+    encoder = B64EncodeStream()
+    yield b'"'
+    for chunk in _iter_blob(blob):
+        yield encoder.update(chunk)
+    yield encoder.finalize() + b'"'
+
+
+def _iter_frame(header: bytes, blob: BinaryIO) -> Iterator[bytes]:
+    yield header
+    yield from _iter_blob(blob)
+
+
 @router.post("", description="rep_add_doc")
 async def create_document(
     doc: DocumentCreateWithFile,
+    session: DatabaseSession,
     link: SubjectOrganizationLink = Security(
         check_permission, scopes=[Permission.DOC_NEW]
     ),
@@ -35,16 +69,60 @@ async def create_document(
     doc.acl = {role: {DocumentPermission.DOC_ACL} for role in link.session.roles}
 
     return await crud_document.add_new(
-        DocumentCreate.model_validate(doc), doc.file_content
+        session, DocumentCreate.model_validate(doc), doc.file_content
     )
 
 
-@router.get("/{name}", description="rep_get_doc_metadata")
-async def get_document_metadata(
-    name: str,
+@router.post("/upload", description="rep_add_doc (chunked upload)")
+async def create_document_upload(
+    upload: DocumentUploadCreate,
+    session: DatabaseSession,
+    link: SubjectOrganizationLink = Security(
+        check_permission, scopes=[Permission.DOC_NEW]
+    ),
+) -> DocumentUpload:
+    upload.creator_username = link.subject_username
+    upload.organization_name = link.organization_name
+    upload.acl = {role: {DocumentPermission.DOC_ACL} for role in link.session.roles}
+
+    return await crud_document.start_upload(session, upload)
+
+
+@router.put("/upload/{upload_id}", description="rep_add_doc (chunked upload)")
+async def upload_document_chunk(
+    upload_id: uuid.UUID,
+    offset: int,
+    request: Request,
     link: SubjectOrganizationLink = Security(get_current_user),
+) -> int:
+    return await crud_document.write_upload_chunk(
+        upload_id,
+        offset,
+        await request.body(),
+        link.subject_username,
+        link.organization_name,
+    )
+
+
+@router.post("/upload/{upload_id}/complete", description="rep_add_doc (chunked upload)")
+async def complete_document_upload(
+    upload_id: uuid.UUID,
+    session: DatabaseSession,
+    link: SubjectOrganizationLink = Security(
+        check_permission, scopes=[Permission.DOC_NEW]
+    ),
+) -> Document:
+    return await crud_document.complete_upload(
+        session, upload_id, link.subject_username, link.organization_name
+    )
+
+
+async def _get_readable_document(
+    session: DatabaseSession, name: str, link: SubjectOrganizationLink
 ) -> Document:
-    doc = await crud_document.get_by_name_and_organization(name, link.organization_name)
+    doc = await crud_document.get_by_name_and_organization(
+        session, name, link.organization_name
+    )
     if doc is None:
         raise HTTPException(status_code=404, detail="Document not found")
 
@@ -52,29 +130,120 @@ async def get_document_metadata(
     return doc
 
 
+@router.get("/{name}", description="rep_get_doc_metadata", response_model=Document)
+async def get_document_metadata(
+    name: str,
+    request: Request,
+    response: Response,
+    session: DatabaseSession,
+    link: SubjectOrganizationLink = Security(get_current_user),
+) -> Document | Response:
+    doc = await _get_readable_document(session, name, link)
+
+    # Only checked once the subject is allowed to read the document, so the tag
+    # doesn't tell others whether it changed
+    etag = document_etag(doc)
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        metrics.increment("document_metadata_not_modified")
+        return Response(status_code=304, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+    return doc
+
+
 @router.get("/handle/{handle}", description="rep_get_file")
 async def get_document_by_handle(
-    handle: str,
-) -> str:
-    path = pathlib.Path(f"static/docs/{handle}")
-    if not path.exists():
+    handle: Annotated[str, Path(pattern=FILE_HANDLE_PATTERN.pattern)],
+) -> Response:
+    try:
+        blob = await run_in_threadpool(blob_store.open, handle)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    return StreamingResponse(
+        iterate_in_threadpool(_iter_json_base64(blob)),
+        media_type="application/json",
+    )
+
+
+@router.get("/handle/{handle}/content", description="rep_get_file")
+async def stream_document_by_handle(
+    handle: Annotated[str, Path(pattern=FILE_HANDLE_PATTERN.pattern)],
+) -> Response:
+    path = await run_in_threadpool(blob_store.local_path, handle)
+    if path is not None:
+        # Supports Range requests, so downloads can be resumed
+        return FileResponse(path, media_type="application/octet-stream")
+
+    try:
+        blob = await run_in_threadpool(blob_store.open, handle)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Document not found")
+    return StreamingResponse(
+        iterate_in_threadpool(_iter_blob(blob)),
+        media_type="application/octet-stream",
+    )
+
+
+@router.get("/{name}/content", description="rep_get_doc_file")
+async def get_document_with_content(
+    name: str,
+    request: Request,
+    session: DatabaseSession,
+    link: SubjectOrganizationLink = Security(get_current_user),
+) -> Response:
+    """
+    Sends the metadata and the file of a document in one response, as a binary
+    frame whose header is the metadata and whose payload is the file.
+    """
+    doc = await _get_readable_document(session, name, link)
 
-    with open(f"static/docs/{handle}", "rb") as f:
-        file_content = f.read()
+    # The file handle is part of the metadata, so the tag covers the file as well
+    etag = document_etag(doc)
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        metrics.increment("document_metadata_not_modified")
+        return Response(status_code=304, headers={"ETag": etag})
 
-    return base64.encodebytes(file_content).decode()
+    try:
+        blob = await run_in_threadpool(blob_store.open, doc.file_handle or "")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Document not found")
 
+    header = pack_frame_header(doc.model_dump(mode="json"))
+    return StreamingResponse(
+        iterate_in_threadpool(_iter_frame(header, blob)),
+        media_type=DOCUMENT_MEDIA_TYPE,
+        headers={"ETag": etag},
+    )
 
-@router.get("", response_model=list[DocumentBase], description="rep_list_docs")
+
+@router.get("", description="rep_list_docs")
 async def list_documents(
+    session: DatabaseSession,
     username: str | None = None,
     date: datetime | None = None,
     date_order: Literal["nt", "ot", "et"] = "nt",
+    cursor: str | None = None,
+    limit: Annotated[
+        int, Query(ge=1, le=settings.DOCUMENT_PAGE_SIZE_MAX)
+    ] = settings.DOCUMENT_PAGE_SIZE,
     link: SubjectOrganizationLink = Security(get_current_user),
-) -> list[Document]:
+) -> DocumentPage:
     return await crud_document.get_all(
-        username, date, date_order, link.organization_name
+        session, username, date, date_order, link.organization_name, cursor, limit
+    )
+
+
+@router.patch("/acl/bulk", description="rep_acl_doc (bulk)")
+async def update_document_acls(
+    patches: Annotated[
+        list[DocumentACLPatch], Body(max_length=settings.BULK_MAX_ITEMS)
+    ],
+    session: DatabaseSession,
+    link: SubjectOrganizationLink = Security(get_current_user),
+) -> list[BulkResult]:
+    return await crud_document.patch_acls(
+        session, link.organization_name, link.session.roles, patches
     )
 
 
@@ -84,9 +253,12 @@ async def update_document_acl(
     role: str,
     add: bool,
     permission: DocumentPermission,
+    session: DatabaseSession,
     link: SubjectOrganizationLink = Security(get_current_user),
 ) -> Document:
-    doc = await crud_document.get_by_name_and_organization(name, link.organization_name)
+    doc = await crud_document.get_by_name_and_organization(
+        session, name, link.organization_name
+    )
     if doc is None:
         raise HTTPException(status_code=404, detail="Document not found")
 
@@ -94,21 +266,29 @@ async def update_document_acl(
 
     if add:
         return await crud_document.add_acl(
-            doc, role, permission, link.organization_name
+            session, doc, role, permission, link.organization_name
         )
-    return await crud_document.remove_acl(doc, role, permission, link.organization_name)
+    return await crud_document.remove_acl(
+        session, doc, role, permission, link.organization_name
+    )
 
 
 @router.delete("/{name}", description="rep_delete_doc")
 async def delete_document(
     name: str,
+    session: DatabaseSession,
     link: SubjectOrganizationLink = Security(get_current_user),
 ) -> Document:
-    doc = await crud_document.get_by_name_and_organization(name, link.organization_name)
+    doc = await crud_document.get_by_name_and_organization(
+        session, name, link.organization_name
+    )
     if doc is None:
         raise HTTPException(status_code=404, detail="Document not found")
 
     check_doc_permission(DocumentPermission.DOC_DELETE, doc.acl, link.session.roles)
-    if not await crud_document.delete(doc.document_handle, link.subject.username):
-        raise HTTPException(status_code=400, detail="Failed to delete document")
-    return doc
+
+    # The response keeps the file handle, so the file can still be fetched. Only
+    # the columns are copied, reading the relationships would lazy load them
+    deleted = Document.model_validate(doc.model_dump())
+    await crud_document.delete(session, doc, link.subject.username)
+    return deleted
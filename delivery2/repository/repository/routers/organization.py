@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 from starlette.requests import Request
 
+from repository.config.database import DatabaseSession
 from repository.crud.organization import crud_organization
 from repository.crud.subject import crud_subject
 from repository.crud.subject_organization_link import crud_subject_organization_link
@@ -19,21 +20,27 @@ router = APIRouter(prefix="/organization", tags=["Organization"])
 async def create_organization(
     organization_and_subject: OrganizationCreate,
     request: Request,
+    session: DatabaseSession,
 ) -> Organization:
-    subject = await crud_subject.create(organization_and_subject.subject)
-    organization = await crud_organization.create(organization_and_subject.organization)
+    subject = await crud_subject.create(session, organization_and_subject.subject)
+    organization = await crud_organization.create(
+        session, organization_and_subject.organization
+    )
     await crud_subject_organization_link.create(
+        session,
         SubjectOrganizationLinkCreate(
             organization_name=organization.name,
             subject_username=subject.subject.username,
             role_ids=["Managers"],
             public_key_id=subject.public_key.id,
-        )
+        ),
     )
-    request.state.public_key = load_public_key(subject.public_key.key)
+    # Checked here, as the response is only encrypted after the endpoint returns
+    load_public_key(subject.public_key.key)
+    request.state.public_key = subject.public_key.key
     return organization
 
 
 @router.get("", description="rep_list_orgs")
-async def list_organizations() -> list[Organization]:
-    return await crud_organization.get_all()
+async def list_organizations(session: DatabaseSession) -> list[Organization]:
+    return await crud_organization.get_all(session)
@@ -1,7 +1,9 @@
 from cryptography.hazmat.primitives._serialization import Encoding, PublicFormat
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 
 from repository.config.settings import settings
+from repository.utils.exceptions import metrics_disabled_exception
+from repository.utils.metrics import metrics
 
 router = APIRouter(prefix="/repository", tags=["Repository"])
 
@@ -14,3 +16,13 @@ async def get_public_key() -> str:
 @router.get("/ping")
 async def ping() -> str:
     return "pong"
+
+
+def metrics_enabled() -> None:
+    if not settings.METRICS_ENABLED:
+        raise metrics_disabled_exception
+
+
+@router.get("/metrics", dependencies=[Depends(metrics_enabled)])
+async def get_metrics() -> dict[str, float]:
+    return metrics.collect()
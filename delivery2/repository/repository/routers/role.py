@@ -2,6 +2,7 @@ from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException, Security
 
+from repository.config.database import DatabaseSession
 from repository.crud.document import crud_document
 from repository.crud.organization_role import crud_organization_role
 from repository.crud.subject_organization_link import crud_subject_organization_link
@@ -21,16 +22,18 @@ router = APIRouter(prefix="/role", tags=["Role"])
 @router.post("", description="rep_add_role")
 async def add_role(
     role: str,
+    session: DatabaseSession,
     link: Annotated[
         SubjectOrganizationLink,
         Security(check_permission, scopes=[Permission.ROLE_NEW]),
     ],
 ) -> OrganizationRole:
     return await crud_organization_role.create(
+        session,
         OrganizationRoleBase(
             organization_name=link.organization_name,
             role=role,
-        )
+        ),
     )
 
 
@@ -38,36 +41,40 @@ async def add_role(
 async def add_permission_to_role(
     role: str,
     permission: Permission,
+    session: DatabaseSession,
     link: Annotated[
         SubjectOrganizationLink,
         Security(check_permission, scopes=[Permission.ROLE_MOD]),
     ],
 ) -> OrganizationRole:
     return await crud_organization_role.set_permission(
-        link.organization_name, role, permission, "add"
+        session, link.organization_name, role, permission, "add"
     )
 
 
 @router.get("", description="rep_list_permission_roles")
 async def list_roles_by_permission(
     permission: Permission | DocumentPermission,
+    session: DatabaseSession,
     link: Annotated[SubjectOrganizationLink, Depends(get_current_user)],
 ) -> list[str] | list[DocumentRolesByPermission]:
     if isinstance(permission, DocumentPermission):
         return await crud_document.get_roles_by_permission(
-            link.organization_name, permission
+            session, link.organization_name, permission
         )
 
     return await crud_organization_role.get_roles_by_permission(
-        link.organization_name, permission
+        session, link.organization_name, permission
     )
 
 
 @router.get("/permission", description="rep_list_role_permissions")
 async def list_role_permissions(
-    role: str, link: Annotated[SubjectOrganizationLink, Depends(get_current_user)]
+    role: str,
+    session: DatabaseSession,
+    link: Annotated[SubjectOrganizationLink, Depends(get_current_user)],
 ) -> set[Permission]:
-    role_obj = await crud_organization_role.get((link.organization_name, role))
+    role_obj = await crud_organization_role.get(session, (link.organization_name, role))
     if role_obj is None:
         raise HTTPException(status_code=404, detail="Role not found")
     return role_obj.permissions
@@ -75,28 +82,32 @@ async def list_role_permissions(
 
 @router.get("/subject", description="rep_list_role_subjects")
 async def list_subjects_by_role(
-    role: str, link: Annotated[SubjectOrganizationLink, Depends(get_current_user)]
+    role: str,
+    session: DatabaseSession,
+    link: Annotated[SubjectOrganizationLink, Depends(get_current_user)],
 ) -> list[SubjectActiveListing]:
     return await crud_subject_organization_link.get_subjects_by_role(
-        link.organization_name, role
+        session, link.organization_name, role
     )
 
 
 @router.patch("/activation/activate", description="rep_reactivate_role")
 async def activate_role(
     role: str,
+    session: DatabaseSession,
     link: Annotated[
         SubjectOrganizationLink, Security(check_permission, scopes=[Permission.ROLE_UP])
     ],
 ) -> OrganizationRole:
     return await crud_organization_role.set_activation(
-        link.organization_name, role, True
+        session, link.organization_name, role, True
     )
 
 
 @router.patch("/activation/suspend", description="rep_suspend_role")
 async def suspend_role(
     role: str,
+    session: DatabaseSession,
     link: Annotated[
         SubjectOrganizationLink,
         Security(check_permission, scopes=[Permission.ROLE_DOWN]),
@@ -105,7 +116,7 @@ async def suspend_role(
     if role == "Managers":
         raise ValueError("Cannot suspend Managers role")
     return await crud_organization_role.set_activation(
-        link.organization_name, role, False
+        session, link.organization_name, role, False
     )
 
 
@@ -113,11 +124,12 @@ async def suspend_role(
 async def remove_permission_from_role(
     role: str,
     permission: Permission,
+    session: DatabaseSession,
     link: Annotated[
         SubjectOrganizationLink,
         Security(check_permission, scopes=[Permission.ROLE_MOD]),
     ],
 ) -> OrganizationRole:
     return await crud_organization_role.set_permission(
-        link.organization_name, role, permission, "remove"
+        session, link.organization_name, role, permission, "remove"
     )
@@ -1,10 +1,13 @@
 from typing import Annotated
 
-from fastapi import APIRouter, HTTPException, Depends, Security
+from fastapi import APIRouter, Body, HTTPException, Depends, Security
 from starlette.requests import Request
 
+from repository.config.database import DatabaseSession
+from repository.config.settings import settings
 from repository.crud.subject import crud_subject
 from repository.crud.subject_organization_link import crud_subject_organization_link
+from repository.models.bulk import BulkResult
 from repository.models.permission import Permission
 from repository.models.relations import (
     SubjectOrganizationLink,
@@ -23,48 +26,83 @@ router = APIRouter(prefix="/subject", tags=["Subject"])
 @router.post("", description="rep_add_subject")
 async def create_subject(
     subject: SubjectCreate,
+    session: DatabaseSession,
     link: SubjectOrganizationLink = Security(
         check_permission, scopes=[Permission.SUBJECT_NEW]
     ),
 ) -> Subject:
-    obj = await crud_subject.create(subject)
+    obj = await crud_subject.create(session, subject)
     await crud_subject_organization_link.create(
+        session,
         SubjectOrganizationLinkCreate(
             organization_name=link.organization_name,
             subject_username=obj.subject.username,
             public_key_id=obj.public_key.id,
-        )
+        ),
     )
     return obj.subject
 
 
+@router.post("/bulk", description="rep_add_subject (bulk)")
+async def create_subjects(
+    subjects: Annotated[list[SubjectCreate], Body(max_length=settings.BULK_MAX_ITEMS)],
+    session: DatabaseSession,
+    link: SubjectOrganizationLink = Security(
+        check_permission, scopes=[Permission.SUBJECT_NEW]
+    ),
+) -> list[BulkResult]:
+    return await crud_subject.create_many(session, link.organization_name, subjects)
+
+
 @router.post("/role", description="rep_add_permission")
 async def add_role_to_subject(
     role: str,
     username: str,
+    session: DatabaseSession,
     link: Annotated[
         SubjectOrganizationLink,
         Security(check_permission, scopes=[Permission.ROLE_MOD]),
     ],
 ) -> set[str]:
     new_link = await crud_subject_organization_link.manage_subject_role(
-        link.organization_name, username, role, "add"
+        session, link.organization_name, username, role, "add"
     )
     return new_link.role_ids
 
 
+@router.post("/role/bulk", description="rep_add_permission (bulk)")
+async def add_role_to_subjects(
+    role: str,
+    usernames: Annotated[list[str], Body(max_length=settings.BULK_MAX_ITEMS)],
+    session: DatabaseSession,
+    link: Annotated[
+        SubjectOrganizationLink,
+        Security(check_permission, scopes=[Permission.ROLE_MOD]),
+    ],
+) -> list[BulkResult]:
+    return await crud_subject_organization_link.add_role_to_subjects(
+        session, link.organization_name, role, usernames
+    )
+
+
 @router.post("/session", description="rep_create_session")
-async def create_session(info: SessionCreate, request: Request) -> str:
-    token, public_key = await crud_subject_organization_link.create_session(info)
+async def create_session(
+    info: SessionCreate, request: Request, session: DatabaseSession
+) -> str:
+    token, public_key = await crud_subject_organization_link.create_session(
+        session, info
+    )
     request.state.public_key = public_key
     return token
 
 
 @router.post("/session/role", description="rep_assume_role")
 async def add_role(
-    role: str, link: Annotated[SubjectOrganizationLink, Depends(get_current_user)]
+    role: str,
+    session: DatabaseSession,
+    link: Annotated[SubjectOrganizationLink, Depends(get_current_user)],
 ) -> str:
-    return await crud_subject_organization_link.add_role_to_session(link, role)
+    return await crud_subject_organization_link.add_role_to_session(session, link, role)
 
 
 @router.get("/session/role", description="rep_list_roles")
@@ -78,41 +116,49 @@ async def list_session_roles(
 
 @router.get("", description="rep_list_subjects")
 async def get_subjects_by_organization(
+    session: DatabaseSession,
     link: Annotated[SubjectOrganizationLink, Depends(get_current_user)],
     username: str | None = None,
 ) -> list[SubjectActiveListing]:
     return await crud_subject_organization_link.get_subjects_by_organization(
-        link.organization_name, username
+        session, link.organization_name, username
     )
 
 
 @router.get("/role", description="rep_list_subject_roles")
 async def list_subject_roles(
-    subject: str, link: Annotated[SubjectOrganizationLink, Depends(get_current_user)]
+    subject: str,
+    session: DatabaseSession,
+    link: Annotated[SubjectOrganizationLink, Depends(get_current_user)],
 ) -> list[str]:
     return await crud_subject_organization_link.get_subject_roles(
-        link.organization_name, subject
+        session, link.organization_name, subject
     )
 
 
 @router.delete("/session/role", description="rep_drop_role")
 async def drop_role(
-    role: str, link: Annotated[SubjectOrganizationLink, Depends(get_current_user)]
+    role: str,
+    session: DatabaseSession,
+    link: Annotated[SubjectOrganizationLink, Depends(get_current_user)],
 ) -> str:
-    return await crud_subject_organization_link.drop_role_from_session(link, role)
+    return await crud_subject_organization_link.drop_role_from_session(
+        session, link, role
+    )
 
 
 @router.delete("/role", description="rep_remove_permission")
 async def remove_role_from_subject(
     role: str,
     username: str,
+    session: DatabaseSession,
     link: Annotated[
         SubjectOrganizationLink,
         Security(check_permission, scopes=[Permission.ROLE_MOD]),
     ],
 ) -> set[str]:
     new_link = await crud_subject_organization_link.manage_subject_role(
-        link.organization_name, username, role, "remove"
+        session, link.organization_name, username, role, "remove"
     )
     return new_link.role_ids
 
@@ -120,13 +166,14 @@ async def remove_role_from_subject(
 @router.patch("/activation/activate", description="rep_activate_subject")
 async def activate_subject(
     username: str,
+    session: DatabaseSession,
     link: Annotated[
         SubjectOrganizationLink,
         Security(check_permission, scopes=[Permission.SUBJECT_UP]),
     ],
 ) -> SubjectActiveListing:
     result = await crud_subject_organization_link.set_active(
-        username, link.organization_name, True
+        session, username, link.organization_name, True
     )
     if result is None:
         raise HTTPException(
@@ -143,13 +190,14 @@ async def activate_subject(
 @router.patch("/activation/suspend", description="rep_suspend_subject")
 async def suspend_subject(
     username: str,
+    session: DatabaseSession,
     link: Annotated[
         SubjectOrganizationLink,
         Security(check_permission, scopes=[Permission.SUBJECT_DOWN]),
     ],
 ) -> SubjectActiveListing:
     result = await crud_subject_organization_link.set_active(
-        username, link.organization_name, False
+        session, username, link.organization_name, False
     )
     if result is None:
         raise HTTPException(
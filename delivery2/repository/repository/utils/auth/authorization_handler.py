@@ -5,17 +5,20 @@ import jwt
 from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer, SecurityScopes
 from jwt import InvalidTokenError
-from sqlalchemy import func
-from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from repository.config.database import get_session
+from repository.config.database import DatabaseSession
 from repository.config.settings import settings
-from repository.crud.subject import crud_subject
 from repository.crud.subject_organization_link import crud_subject_organization_link
-from repository.models import OrganizationRole
 from repository.models.permission import DocumentPermission
 from repository.models.relations import SubjectOrganizationLink
 from repository.models.session import Session
+from repository.utils.auth.link_cache import (
+    authenticated_link_cache,
+    authenticated_link_generation,
+    cache_authenticated_link,
+)
+from repository.utils.auth.permission_index import role_permission_index, to_bitmask
 from repository.utils.exceptions import (
     credentials_exception,
     inactive_user_exception,
@@ -28,7 +31,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/subject/session")
 
 
 async def get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)]
+    token: Annotated[str, Depends(oauth2_scheme)], session: DatabaseSession
 ) -> SubjectOrganizationLink:
     try:
         payload = jwt.decode(
@@ -41,11 +44,28 @@ async def get_current_user(
     except InvalidTokenError:
         raise credentials_exception
 
-    subject = await crud_subject.get(username)
-    if subject is None:
-        raise credentials_exception
+    session_id: str = payload.get("sub")
+    if (link := authenticated_link_cache.get(session_id)) is None:
+        generation = authenticated_link_generation()
+        link = await _get_authenticated_link(
+            session, username, organization, session_id
+        )
+        # Detached, so the cached instance is never changed by this request
+        session.expunge(link)
+        cache_authenticated_link(session_id, link, generation)
+    elif cast(Session, link.session).expires < datetime.now():
+        authenticated_link_cache.pop(session_id)
+        raise session_expired_exception
+
+    # The cached instance is shared, so every request gets its own copy
+    return await session.merge(link, load=False)
 
-    link = await crud_subject_organization_link.get((username, organization))
+
+async def _get_authenticated_link(
+    session: AsyncSession, username: str, organization: str, session_id: str
+) -> SubjectOrganizationLink:
+    # The subject is loaded along with the link
+    link = await crud_subject_organization_link.get(session, (username, organization))
     if link is None:
         raise credentials_exception
     if not link.active:
@@ -54,7 +74,7 @@ async def get_current_user(
         raise no_session_exception
     if link.session.expires < datetime.now():
         raise session_expired_exception
-    if str(link.session.id) != payload.get("sub"):
+    if str(link.session.id) != session_id:
         raise credentials_exception
     return link
 
@@ -62,21 +82,16 @@ async def get_current_user(
 async def check_permission(
     security_scopes: SecurityScopes,
     link: Annotated[SubjectOrganizationLink, Depends(get_current_user)],
+    db: DatabaseSession,
 ) -> SubjectOrganizationLink:
     session = cast(Session, link.session)  # Session is never None in this context
 
-    async with get_session() as db_session:
-        permissions = await db_session.exec(
-            select(func.unnest(OrganizationRole.permissions))
-            .where(OrganizationRole.organization_name == link.organization_name)
-            .where(OrganizationRole.role.in_(session.roles))
-        )
-        permissions_in_session = set(permissions.all())
+    permissions_in_session = await role_permission_index.get_bitmask(
+        db, link.organization_name, session.roles
+    )
+    required_permissions = to_bitmask(security_scopes.scopes)
 
-    if any(
-        permission not in permissions_in_session
-        for permission in security_scopes.scopes
-    ):
+    if permissions_in_session & required_permissions != required_permissions:
         raise not_enough_permissions_exception
 
     return link
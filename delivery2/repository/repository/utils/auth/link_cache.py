@@ -0,0 +1,105 @@
+from typing import Iterable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as SyncSession
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from repository.config.settings import settings
+from repository.models.relations import SubjectOrganizationLink
+from repository.models.session import Session
+from repository.utils.cache import TTLCache
+from repository.utils.notifications import publish, subscribe, subscribe_reset
+
+AUTHENTICATED_SESSIONS_TOPIC = "authenticated_sessions"
+
+# Session IDs per notification, well below the 8000 bytes of a NOTIFY payload
+_NOTIFY_BATCH_SIZE = 100
+
+# Session ID -> validated link of the session's subject
+authenticated_link_cache: TTLCache[str, SubjectOrganizationLink] = TTLCache(
+    settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL
+)
+
+# Key of the session IDs to evict, in the info of the database session changing them
+_PENDING_KEY = "forget_authenticated_sessions"
+
+# Incremented on every eviction, so links read before it are not cached after it
+_generation = 0
+
+
+def authenticated_link_generation() -> int:
+    return _generation
+
+
+def cache_authenticated_link(
+    session_id: str, link: SubjectOrganizationLink, generation: int
+) -> None:
+    """
+    Caches a link, unless a link was evicted since it was read from the database,
+    as the link read may be the one that was changed.
+
+    :param generation: authenticated_link_generation() before the link was read
+    :type generation: int
+    """
+    if generation == _generation:
+        authenticated_link_cache.set(session_id, link)
+
+
+async def forget_authenticated_link(
+    db: AsyncSession, link: SubjectOrganizationLink
+) -> None:
+    """
+    Removes a link from the authentication cache of every worker once the
+    transaction changing it commits. Must be called whenever the link's active
+    status, roles or session change.
+
+    Evicting it before the commit would let a concurrent request cache the old row
+    again.
+    """
+    await forget_authenticated_sessions(db, [link.session])
+
+
+async def forget_authenticated_sessions(
+    db: AsyncSession, sessions: Iterable[Session | None]
+) -> None:
+    """
+    Same as forget_authenticated_link(), for links changed with a bulk statement.
+    """
+    session_ids = [str(session.id) for session in sessions if session is not None]
+    if not session_ids:
+        return
+
+    # This worker evicts them right after the commit, the others when notified
+    pending: set[str] = db.sync_session.info.setdefault(_PENDING_KEY, set())
+    if not pending:
+        event.listen(db.sync_session, "after_commit", _evict_pending, once=True)
+    pending.update(session_ids)
+
+    for i in range(0, len(session_ids), _NOTIFY_BATCH_SIZE):
+        batch = session_ids[i : i + _NOTIFY_BATCH_SIZE]
+        await publish(db, AUTHENTICATED_SESSIONS_TOPIC, ",".join(batch))
+
+
+def _evict(session_ids: Iterable[str]) -> None:
+    global _generation
+    _generation += 1
+    for session_id in session_ids:
+        authenticated_link_cache.pop(session_id)
+
+
+def _evict_pending(sync_session: SyncSession) -> None:
+    _evict(sync_session.info.pop(_PENDING_KEY, ()))
+
+
+def _evict_notified(payload: str) -> None:
+    _evict(payload.split(","))
+
+
+def _evict_all() -> None:
+    global _generation
+    _generation += 1
+    authenticated_link_cache.clear()
+
+
+subscribe(AUTHENTICATED_SESSIONS_TOPIC, _evict_notified)
+subscribe_reset(_evict_all)
@@ -0,0 +1,83 @@
+from typing import Iterable
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from repository.config.settings import settings
+from repository.models import OrganizationRole
+from repository.models.permission import Permission
+from repository.utils.cache import TTLCache
+from repository.utils.notifications import publish, subscribe, subscribe_reset
+
+ROLE_PERMISSIONS_TOPIC = "role_permissions"
+
+PERMISSION_BITS = {permission: 1 << i for i, permission in enumerate(Permission)}
+
+
+def to_bitmask(permissions: Iterable[Permission | str]) -> int:
+    mask = 0
+    for permission in permissions:
+        mask |= PERMISSION_BITS[Permission(permission)]
+    return mask
+
+
+class RolePermissionIndex:
+    def __init__(self) -> None:
+        """
+        In-memory index of the permissions of every active role, as a bitmask, per
+        organization. Organizations are loaded on first use and dropped whenever
+        one of their roles changes in any worker.
+        """
+        # Organization -> role -> permission bitmask
+        self._organizations: TTLCache[str, dict[str, int]] = TTLCache(
+            settings.ROLE_INDEX_SIZE, settings.ROLE_INDEX_TTL
+        )
+        # Incremented on every invalidation, so roles read before it are not cached
+        # after it
+        self._generation = 0
+
+    async def get_bitmask(
+        self, session: AsyncSession, organization_name: str, roles: Iterable[str]
+    ) -> int:
+        if (index := self._organizations.get(organization_name)) is None:
+            generation = self._generation
+            index = await self._load(session, organization_name)
+            if generation == self._generation:
+                self._organizations.set(organization_name, index)
+
+        mask = 0
+        for role in roles:
+            mask |= index.get(role, 0)
+        return mask
+
+    async def _load(
+        self, session: AsyncSession, organization_name: str
+    ) -> dict[str, int]:
+        result = await session.exec(
+            select(OrganizationRole)
+            .where(OrganizationRole.organization_name == organization_name)
+            .where(OrganizationRole.active == True)
+        )
+        return {
+            role.role: to_bitmask(role.permissions or set()) for role in result.all()
+        }
+
+    def invalidate(self, organization_name: str) -> None:
+        self._generation += 1
+        self._organizations.pop(organization_name)
+
+    def invalidate_all(self) -> None:
+        self._generation += 1
+        self._organizations.clear()
+
+    async def invalidate_everywhere(
+        self, session: AsyncSession, organization_name: str
+    ) -> None:
+        # Every worker, this one included, invalidates it again after the commit
+        self.invalidate(organization_name)
+        await publish(session, ROLE_PERMISSIONS_TOPIC, organization_name)
+
+
+role_permission_index = RolePermissionIndex()
+subscribe(ROLE_PERMISSIONS_TOPIC, role_permission_index.invalidate)
+subscribe_reset(role_permission_index.invalidate_all)
@@ -0,0 +1,311 @@
+"""
+Garbage collection of the blobs no document references anymore.
+
+A blob becomes collectable once its reference count has been zero for the grace
+period, so deleted documents stay fetchable by handle for a while. Blobs missing
+from the documentblob table (e.g. left behind by failed requests or stored before
+the table existed) are adopted into it as soon as their file is older than the grace
+period. Abandoned chunked uploads are removed as well.
+
+Runs periodically from the app's lifespan, or once from the command line:
+
+    poetry run python -m repository.utils.blob_gc --dry-run
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, fields
+from datetime import timedelta
+
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from repository.config.database import async_session
+from repository.config.settings import settings
+from repository.crud.document import UPLOADS_PATH
+from repository.models.document import DocumentBlob
+from repository.utils.blob_store import blob_store
+from repository.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Key of the advisory lock that keeps workers from collecting at the same time
+GC_LOCK_ID = 0x626C6F62
+
+# Handles looked up in the database per query when adopting blobs
+ADOPT_BATCH_SIZE = 1000
+
+
+@dataclass
+class BlobGCReport:
+    deleted_blobs: int = 0
+    deleted_bytes: int = 0
+    adopted_blobs: int = 0
+    stale_uploads: int = 0
+    elapsed: float = 0
+
+
+async def _try_lock(session: AsyncSession) -> bool:
+    # Released when the transaction ends
+    result = await session.exec(select(func.pg_try_advisory_xact_lock(GC_LOCK_ID)))
+    return bool(result.one())
+
+
+def _old_blob_handles(max_mtime: float) -> list[str]:
+    return [handle for handle, mtime in blob_store.handles() if mtime < max_mtime]
+
+
+async def _adopt_blobs(grace_period: float, dry_run: bool) -> int:
+    """
+    Adds the blobs that have no reference count to the documentblob table, as
+    already released, so they are collected like any other unreferenced blob.
+    """
+    handles = await run_in_threadpool(_old_blob_handles, time.time() - grace_period)
+    adopted = 0
+
+    for i in range(0, len(handles), ADOPT_BATCH_SIZE):
+        batch = handles[i : i + ADOPT_BATCH_SIZE]
+        async with async_session() as session:
+            result = await session.exec(
+                select(DocumentBlob.file_handle).where(
+                    col(DocumentBlob.file_handle).in_(batch)
+                )
+            )
+            missing = set(batch) - set(result.all())
+            if missing and not dry_run:
+                # Waits for, and then skips, blobs a request is retaining right now
+                await session.exec(
+                    insert(DocumentBlob)
+                    .values(
+                        [
+                            {
+                                "file_handle": handle,
+                                "ref_count": 0,
+                                "release_date": func.now()
+                                - timedelta(seconds=grace_period),
+                            }
+                            for handle in missing
+                        ]
+                    )
+                    .on_conflict_do_nothing()
+                )
+                await session.commit()
+            adopted += len(missing)
+
+    return adopted
+
+
+async def _count_collectable(grace_period: float) -> int:
+    async with async_session() as session:
+        result = await session.exec(
+            select(func.count())
+            .select_from(DocumentBlob)
+            .where(DocumentBlob.ref_count == 0)
+            .where(
+                col(DocumentBlob.release_date)
+                < func.now() - timedelta(seconds=grace_period)
+            )
+        )
+        return result.one()
+
+
+async def _delete_batch(grace_period: float, batch_size: int) -> tuple[int, int]:
+    """
+    Deletes a batch of collectable blobs, and their rows, in one transaction.
+
+    The rows stay locked until the files are gone, so a request uploading the same
+    content waits, then creates a new row and writes the blob again.
+
+    :return: The number of blobs and bytes deleted, or (0, 0) if there was nothing
+        to delete or another worker is collecting
+    """
+    async with async_session() as session:
+        if not await _try_lock(session):
+            return 0, 0
+
+        result = await session.exec(
+            select(DocumentBlob.file_handle)
+            .where(DocumentBlob.ref_count == 0)
+            .where(
+                col(DocumentBlob.release_date)
+                < func.now() - timedelta(seconds=grace_period)
+            )
+            .order_by(col(DocumentBlob.release_date))
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        handles = list(result.all())
+        if not handles:
+            return 0, 0
+
+        freed = 0
+        for handle in handles:
+            freed += await run_in_threadpool(blob_store.delete, handle)
+
+        await session.exec(
+            delete(DocumentBlob).where(col(DocumentBlob.file_handle).in_(handles))
+        )
+        await session.commit()
+        return len(handles), freed
+
+
+def _remove_stale_uploads(max_age: float, dry_run: bool) -> int:
+    try:
+        entries = list(os.scandir(UPLOADS_PATH))
+    except FileNotFoundError:
+        return 0
+
+    # Each chunk written touches the .part file, so it tells when an upload was used
+    cutoff = time.time() - max_age
+    removed = 0
+    for entry in entries:
+        upload_id, extension = os.path.splitext(entry.name)
+        try:
+            if extension != ".part" or entry.stat().st_mtime >= cutoff:
+                continue
+        except FileNotFoundError:
+            # Completed, or removed by another worker
+            continue
+        if not dry_run:
+            for path in (entry.path, os.path.join(UPLOADS_PATH, f"{upload_id}.json")):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        removed += 1
+    return removed
+
+
+async def collect_blobs(
+    grace_period: float = settings.BLOB_GC_GRACE_PERIOD,
+    batch_size: int = settings.BLOB_GC_BATCH_SIZE,
+    max_deletes_per_second: float = settings.BLOB_GC_MAX_DELETES_PER_SECOND,
+    dry_run: bool = False,
+) -> BlobGCReport:
+    """
+    Runs a garbage collection.
+
+    :param grace_period: Seconds a blob stays unreferenced before it is deleted
+    :type grace_period: float
+    :param batch_size: Blobs deleted per transaction
+    :type batch_size: int
+    :param max_deletes_per_second: Deletion rate limit, to spare the disk I/O of
+        the requests being served
+    :type max_deletes_per_second: float
+    :param dry_run: Only count what would be deleted
+    :type dry_run: bool
+
+    :return: What was (or would be) deleted
+    :rtype: BlobGCReport
+    """
+    start = time.perf_counter()
+    report = BlobGCReport()
+
+    report.stale_uploads = await run_in_threadpool(
+        _remove_stale_uploads, settings.UPLOAD_MAX_AGE, dry_run
+    )
+    report.adopted_blobs = await _adopt_blobs(grace_period, dry_run)
+
+    if dry_run:
+        # Adopted blobs were not added to the table, so they are counted apart
+        report.deleted_blobs = (
+            await _count_collectable(grace_period) + report.adopted_blobs
+        )
+    else:
+        while True:
+            batch_start = time.perf_counter()
+            deleted, freed = await _delete_batch(grace_period, batch_size)
+            report.deleted_blobs += deleted
+            report.deleted_bytes += freed
+            if deleted < batch_size:
+                break
+
+            min_elapsed = deleted / max_deletes_per_second
+            await asyncio.sleep(
+                max(min_elapsed - (time.perf_counter() - batch_start), 0)
+            )
+
+    report.elapsed = time.perf_counter() - start
+    if not dry_run:
+        metrics.increment("blob_gc_runs")
+        metrics.increment("blob_gc_deleted_blobs", report.deleted_blobs)
+        metrics.increment("blob_gc_deleted_bytes", report.deleted_bytes)
+        metrics.increment("blob_gc_adopted_blobs", report.adopted_blobs)
+        metrics.increment("blob_gc_stale_uploads", report.stale_uploads)
+        metrics.gauge("blob_gc_last_run_seconds", lambda: report.elapsed)
+    return report
+
+
+async def _run_periodically() -> None:
+    while True:
+        await asyncio.sleep(settings.BLOB_GC_INTERVAL)
+        try:
+            report = await collect_blobs(dry_run=settings.BLOB_GC_DRY_RUN)
+        except Exception:
+            metrics.increment("blob_gc_errors")
+            logger.exception("Blob garbage collection failed")
+            continue
+        logger.info("Blob garbage collection: %s", report)
+
+
+_task: asyncio.Task[None] | None = None
+
+
+def start_blob_gc() -> None:
+    global _task
+    if settings.BLOB_GC_INTERVAL > 0:
+        _task = asyncio.create_task(_run_periodically())
+
+
+async def stop_blob_gc() -> None:
+    global _task
+    if _task is None:
+        return
+
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Deletes the blobs no document references anymore."
+    )
+    parser.add_argument(
+        "--grace-period",
+        type=float,
+        default=settings.BLOB_GC_GRACE_PERIOD,
+        help="seconds a blob stays unreferenced before it is deleted",
+    )
+    parser.add_argument("--batch-size", type=int, default=settings.BLOB_GC_BATCH_SIZE)
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=settings.BLOB_GC_MAX_DELETES_PER_SECOND,
+        help="maximum blobs deleted per second",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only report what would be deleted"
+    )
+    args = parser.parse_args()
+
+    report = asyncio.run(
+        collect_blobs(args.grace_period, args.batch_size, args.rate, args.dry_run)
+    )
+    if args.dry_run:
+        print("Dry run, nothing was deleted")
+    for field in fields(report):
+        print(f"{field.name}: {getattr(report, field.name)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import errno
+import importlib
+import os
+import re
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Callable, Iterator
+
+from repository.config.settings import settings
+
+FILE_HANDLE_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# Prefix of the files being written, which are not blobs yet
+TMP_PREFIX = ".tmp-"
+
+
+def check_file_handle(file_handle: str) -> None:
+    # Handles end up in paths and object keys, so anything else is rejected
+    if not FILE_HANDLE_PATTERN.match(file_handle):
+        raise ValueError("Invalid file handle")
+
+
+class BlobBackend(ABC):
+    """
+    Storage of document files, addressed by their file handle (the SHA-256 of the
+    encrypted content), so identical uploads are stored once.
+
+    Backends only store bytes. Which blobs are still referenced by documents is
+    tracked in the database, see crud_document_blob.
+    """
+
+    def __init__(self, location: str) -> None:
+        """
+        :param location: Where the blobs are kept, e.g. a directory or a bucket
+        :type location: str
+        """
+        self.location = location
+
+    @abstractmethod
+    def exists(self, file_handle: str) -> bool: ...
+
+    @abstractmethod
+    def open(self, file_handle: str) -> BinaryIO:
+        """
+        Opens a blob for reading.
+
+        :raises FileNotFoundError: If the blob does not exist
+        """
+
+    def setup(self) -> None:
+        """
+        Prepares the backend, when the app starts.
+        """
+
+    def local_path(self, file_handle: str) -> str | None:
+        """
+        :return: The path of the blob in the local filesystem, or None if the blob
+            does not exist or the backend is not local
+        """
+        return None
+
+    @abstractmethod
+    def write(self, file_handle: str, data: bytes) -> None:
+        """
+        Stores a blob atomically, readers either see the whole blob or no blob.
+        Does nothing if the blob already exists.
+        """
+
+    @abstractmethod
+    def write_file(self, file_handle: str, path: str) -> None:
+        """
+        Same as write(), taking the content from a local file, which is consumed.
+        """
+
+    @abstractmethod
+    def delete(self, file_handle: str) -> int:
+        """
+        Removes a blob, if it exists.
+
+        :return: The number of bytes freed
+        """
+
+    @abstractmethod
+    def handles(self) -> Iterator[tuple[str, float]]:
+        """
+        Lists the stored blobs.
+
+        :return: The file handle and the modification time of each blob
+        """
+
+
+def _fsync_dir(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class LocalBlobBackend(BlobBackend):
+    def __init__(self, location: str) -> None:
+        """
+        Stores blobs in a local directory, sharded by the first two pairs of hex
+        digits of the file handle (``ab/cd/abcd...``), so no directory holds more
+        than a fraction of the files.
+
+        :param location: Root directory of the blobs
+        :type location: str
+        """
+        super().__init__(location)
+
+    def _shard(self, file_handle: str) -> str:
+        check_file_handle(file_handle)
+        return os.path.join(self.location, file_handle[:2], file_handle[2:4])
+
+    def _path(self, file_handle: str) -> str:
+        return os.path.join(self._shard(file_handle), file_handle)
+
+    def exists(self, file_handle: str) -> bool:
+        return os.path.isfile(self._path(file_handle))
+
+    def open(self, file_handle: str) -> BinaryIO:
+        return open(self._path(file_handle), "rb")
+
+    def local_path(self, file_handle: str) -> str | None:
+        path = self._path(file_handle)
+        return path if os.path.isfile(path) else None
+
+    def _publish(self, file_handle: str, tmp_path: str) -> None:
+        shard = self._shard(file_handle)
+        # Shards are only created when missing, instead of on every write
+        try:
+            os.replace(tmp_path, self._path(file_handle))
+        except FileNotFoundError:
+            os.makedirs(shard, exist_ok=True)
+            os.replace(tmp_path, self._path(file_handle))
+        # Makes the rename itself durable
+        _fsync_dir(shard)
+
+    def _write(self, file_handle: str, write: Callable[[BinaryIO], object]) -> None:
+        # Written next to the shards, so the rename stays in the same filesystem
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.location, prefix=TMP_PREFIX)
+        except FileNotFoundError:
+            os.makedirs(self.location, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.location, prefix=TMP_PREFIX)
+
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            self._publish(file_handle, tmp_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def write(self, file_handle: str, data: bytes) -> None:
+        if self.exists(file_handle):
+            return
+        self._write(file_handle, lambda f: f.write(data))
+
+    def write_file(self, file_handle: str, path: str) -> None:
+        if self.exists(file_handle):
+            os.remove(path)
+            return
+
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        try:
+            self._publish(file_handle, path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # In another filesystem, so it is copied instead of renamed
+            with open(path, "rb") as src:
+                self._write(file_handle, lambda f: shutil.copyfileobj(src, f))
+            os.remove(path)
+
+    def delete(self, file_handle: str) -> int:
+        path = self._path(file_handle)
+        try:
+            size = os.stat(path).st_size
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+        return size
+
+    def handles(self) -> Iterator[tuple[str, float]]:
+        for root, _, files in os.walk(self.location):
+            for name in files:
+                if FILE_HANDLE_PATTERN.match(name):
+                    yield name, os.stat(os.path.join(root, name)).st_mtime
+
+    def setup(self) -> None:
+        # Older versions stored every blob directly in the root directory
+        try:
+            entries = list(os.scandir(self.location))
+        except FileNotFoundError:
+            return
+
+        for entry in entries:
+            if entry.is_file() and FILE_HANDLE_PATTERN.match(entry.name):
+                try:
+                    self.write_file(entry.name, entry.path)
+                except FileNotFoundError:
+                    # Every worker runs this, another one moved it first
+                    pass
+
+
+# Backends selectable with the BLOB_BACKEND setting. Other backends can be given as
+# "module:Class", and are created with BLOB_LOCATION as their only argument.
+BLOB_BACKENDS: dict[str, Callable[[str], BlobBackend]] = {
+    "local": LocalBlobBackend,
+}
+
+
+def load_blob_backend(name: str, location: str) -> BlobBackend:
+    if name in BLOB_BACKENDS:
+        return BLOB_BACKENDS[name](location)
+
+    module_name, _, class_name = name.partition(":")
+    try:
+        backend_class = getattr(importlib.import_module(module_name), class_name)
+    except (ImportError, AttributeError):
+        raise ValueError(f"Unknown blob backend: {name}")
+    if not (isinstance(backend_class, type) and issubclass(backend_class, BlobBackend)):
+        raise ValueError(f"{name} is not a blob backend")
+    return backend_class(location)
+
+
+blob_store = load_blob_backend(settings.BLOB_BACKEND, settings.BLOB_LOCATION)
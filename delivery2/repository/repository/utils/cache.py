@@ -0,0 +1,49 @@
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+
+class TTLCache[KeyType: Hashable, ValueType]:
+    def __init__(self, max_size: int, ttl: float) -> None:
+        """
+        In-memory cache with a bounded size (least recently used entries are evicted
+        first) and a time to live for every entry.
+
+        :param max_size: Maximum number of entries.
+        :type max_size: int
+        :param ttl: Default time to live of an entry, in seconds.
+        :type ttl: float
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[KeyType, tuple[float, ValueType]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: KeyType) -> ValueType | None:
+        if (entry := self._entries.get(key)) is None:
+            return None
+
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: KeyType, value: ValueType, ttl: float | None = None) -> None:
+        expires = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: KeyType) -> ValueType | None:
+        entry = self._entries.pop(key, None)
+        return entry[1] if entry is not None else None
+
+    def clear(self) -> None:
+        self._entries.clear()
@@ -0,0 +1,100 @@
+import io
+import zlib
+from typing import Any
+
+try:
+    import zstandard
+except ImportError:  # zlib is always available as a fallback
+    zstandard = None  # type: ignore[assignment]
+
+ZSTD = "zstd"
+DEFLATE = "deflate"
+
+# Supported codecs, in order of preference
+COMPRESSIONS = (ZSTD, DEFLATE) if zstandard is not None else (DEFLATE,)
+
+# Errors raised by the codecs on corrupted data
+DECOMPRESSION_ERRORS: tuple[type[Exception], ...] = (zlib.error,)
+if zstandard is not None:
+    DECOMPRESSION_ERRORS += (zstandard.ZstdError,)
+
+ZSTD_LEVEL = 3
+DEFLATE_LEVEL = 6
+
+
+def negotiate_compression(accept: str | None) -> str | None:
+    """
+    Picks the preferred codec out of an Accept-Compression header.
+
+    :param accept: Comma separated codecs the peer can decompress
+    :type accept: str | None
+
+    :return: The codec, or None if no codec is shared
+    :rtype: str | None
+    """
+    if accept is None:
+        return None
+    accepted = {codec.strip() for codec in accept.split(",")}
+    return next((codec for codec in COMPRESSIONS if codec in accepted), None)
+
+
+def compress(data: bytes, compression: str) -> bytes:
+    if compression == ZSTD and zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if compression == DEFLATE:
+        return zlib.compress(data, DEFLATE_LEVEL)
+    raise ValueError("Unsupported compression")
+
+
+def decompress(data: bytes, compression: str, max_size: int | None = None) -> bytes:
+    """
+    Decompresses data, refusing to inflate it past a maximum size.
+
+    :param data: The compressed data
+    :type data: bytes
+    :param compression: The codec the data was compressed with
+    :type compression: str
+    :param max_size: Maximum size of the decompressed data, or None for no limit
+    :type max_size: int | None
+
+    :return: The decompressed data
+    :rtype: bytes
+    """
+    limit = -1 if max_size is None else max_size + 1
+
+    try:
+        if compression == ZSTD and zstandard is not None:
+            reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data))
+            result = reader.read(limit)
+        elif compression == DEFLATE:
+            decompressor = zlib.decompressobj()
+            result = decompressor.decompress(data, max(limit, 0))
+        else:
+            raise ValueError("Unsupported compression")
+    except DECOMPRESSION_ERRORS as e:
+        raise ValueError("Could not decompress data") from e
+
+    if max_size is not None and len(result) > max_size:
+        raise ValueError("Decompressed data is too large")
+    return result
+
+
+class CompressionStream:
+    """
+    Incremental version of compress(), for bodies that are sent in chunks.
+    """
+
+    def __init__(self, compression: str) -> None:
+        self._compressor: Any
+        if compression == ZSTD and zstandard is not None:
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        elif compression == DEFLATE:
+            self._compressor = zlib.compressobj(DEFLATE_LEVEL)
+        else:
+            raise ValueError("Unsupported compression")
+
+    def update(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finalize(self) -> bytes:
+        return self._compressor.flush()
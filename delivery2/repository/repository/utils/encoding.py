@@ -1,5 +1,8 @@
 import base64
 
+# base64.encodebytes() emits one 76 character line per 57 bytes of input
+B64_LINE_SIZE = 57
+
 
 def b64_encode_and_escape(data: bytes) -> bytes:
     return base64.encodebytes(data).replace(b"\n", b"\\n").replace(b"\r", b"\\r")
@@ -7,3 +10,31 @@ def b64_encode_and_escape(data: bytes) -> bytes:
 
 def b64_decode_and_unescape(data: bytes) -> bytes:
     return base64.decodebytes(data.replace(b"\\n", b"\n").replace(b"\\r", b"\r"))
+
+
+class B64EncodeStream:
+    """
+    Incremental version of base64.encodebytes() (and b64_encode_and_escape()).
+
+    Input is buffered up to a multiple of a base64 line, so the concatenated output
+    is byte for byte the same as encoding the whole data at once.
+    """
+
+    def __init__(self, escape: bool = True) -> None:
+        self.escape = escape
+        self._buffer = b""
+
+    def update(self, data: bytes) -> bytes:
+        data = self._buffer + data
+        cut = len(data) - len(data) % B64_LINE_SIZE
+        self._buffer = data[cut:]
+        return self._encode(data[:cut])
+
+    def finalize(self) -> bytes:
+        data, self._buffer = self._buffer, b""
+        return self._encode(data)
+
+    def _encode(self, data: bytes) -> bytes:
+        if self.escape:
+            return b64_encode_and_escape(data)
+        return base64.encodebytes(data)
@@ -1,6 +1,22 @@
+import hmac
+
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey, RSAPrivateKey
 from cryptography.hazmat.primitives.ciphers import algorithms, modes, Cipher
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from repository.utils.encryption.loaders import load_public_key
+
+# Wire envelopes, chosen by the client through the Envelope header. CTR_HMAC is
+# AES-CTR followed by an HMAC-SHA256 of the ciphertext, AES_GCM encrypts and
+# authenticates in a single pass.
+CTR_HMAC = "ctr-hmac"
+AES_GCM = "aes-gcm"
+ENVELOPES = (CTR_HMAC, AES_GCM)
+
+IV_SIZES = {CTR_HMAC: 16, AES_GCM: 12}
+TAG_SIZES = {CTR_HMAC: 32, AES_GCM: 16}
 
 
 def encrypt_symmetric(data: bytes, key: bytes, iv: bytes) -> bytes:
@@ -15,6 +31,10 @@ def encrypt_asymmetric(data: bytes, public_key: RSAPublicKey) -> bytes:
     return public_key.encrypt(data, padding.PKCS1v15())
 
 
+def encrypt_asymmetric_with_pem(data: bytes, public_key: str) -> bytes:
+    return encrypt_asymmetric(data, load_public_key(public_key))
+
+
 def decrypt_symmetric(data: bytes, key: bytes, iv: bytes) -> bytes:
     algorithm = algorithms.AES(key)
     mode = modes.CTR(iv)
@@ -27,6 +47,86 @@ def decrypt_asymmetric(data: bytes, private_key: RSAPrivateKey) -> bytes:
     return private_key.decrypt(data, padding.PKCS1v15())
 
 
+def _nonce(iv: bytes, part: int) -> bytes:
+    # The URL and the body of a request share the key and the IV, so each part gets
+    # its own GCM nonce
+    return iv[:-1] + bytes([iv[-1] ^ part])
+
+
+def seal(data: bytes, key: bytes, iv: bytes, envelope: str, part: int = 0) -> bytes:
+    """
+    Encrypts and authenticates data in the given envelope.
+
+    :param part: The index of the part of the message (0 for the URL, 1 for the
+        body). CTR_HMAC ignores it and uses the IV as is, like older clients.
+    :return: The ciphertext followed by its HMAC or tag
+    """
+    if envelope == AES_GCM:
+        return AESGCM(key).encrypt(_nonce(iv, part), data, None)
+
+    data_enc = encrypt_symmetric(data, key, iv)
+    return data_enc + hmac.digest(key, data_enc, "sha256")
+
+
+def unseal(
+    data: bytes, key: bytes, iv: bytes, envelope: str, part: int = 0
+) -> bytes | None:
+    """
+    Verifies and decrypts data sealed by seal().
+
+    :return: The plaintext, or None if the data was not authenticated
+    """
+    if envelope == AES_GCM:
+        try:
+            return AESGCM(key).decrypt(_nonce(iv, part), data, None)
+        except InvalidTag:
+            return None
+
+    data, hmac_bytes = data[:-32], data[-32:]
+    if not hmac.compare_digest(hmac.digest(key, data, "sha256"), hmac_bytes):
+        return None
+    return decrypt_symmetric(data, key, iv)
+
+
+class StreamEncryptor:
+    """
+    AES-CTR encryptor with a running HMAC-SHA256 over the ciphertext.
+
+    Feeding chunks through update() and appending finalize() produces the same
+    bytes as encrypt_symmetric() followed by the HMAC of the whole ciphertext.
+    """
+
+    def __init__(self, key: bytes, iv: bytes) -> None:
+        self._encryptor = Cipher(algorithms.AES(key), modes.CTR(iv)).encryptor()
+        self._hmac = hmac.new(key, digestmod="sha256")
+
+    def update(self, data: bytes) -> bytes:
+        data_enc = self._encryptor.update(data)
+        self._hmac.update(data_enc)
+        return data_enc
+
+    def finalize(self) -> bytes:
+        data_enc = self._encryptor.finalize()
+        self._hmac.update(data_enc)
+        return data_enc + self._hmac.digest()
+
+
+class GCMStreamEncryptor:
+    """
+    AES-GCM encryptor for data sent in chunks. The tag is appended by finalize(),
+    so the output is the same as seal() with the AES_GCM envelope.
+    """
+
+    def __init__(self, key: bytes, iv: bytes) -> None:
+        self._encryptor = Cipher(algorithms.AES(key), modes.GCM(iv)).encryptor()
+
+    def update(self, data: bytes) -> bytes:
+        return self._encryptor.update(data)
+
+    def finalize(self) -> bytes:
+        return self._encryptor.finalize() + self._encryptor.tag
+
+
 # workaround com um switch case para escolher uma tonelada de algoritmos de encriptação
 def encrypt_based_on_alg(data: bytes, key: bytes, iv: bytes, alg: str) -> bytes:
     match alg:
@@ -0,0 +1,94 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Literal
+
+from repository.config.settings import settings
+from repository.utils.metrics import metrics
+
+
+class CryptoExecutor:
+    def __init__(
+        self,
+        kind: Literal["thread", "process"],
+        workers: int,
+        inline_threshold: int,
+    ) -> None:
+        """
+        Runs CPU-bound cryptography (RSA, key derivation, bulk AES and HMAC) out of
+        the event loop. Jobs smaller than the inline threshold run right away, as
+        handing them over would cost more than running them.
+
+        With a process pool, jobs and their arguments must be picklable. Key objects
+        are not, so these jobs take and return keys as PEM. Jobs that keep state
+        between calls (stream ciphers) always run in a thread.
+
+        :param kind: Whether the pool is made of threads or processes
+        :type kind: Literal["thread", "process"]
+        :param workers: The number of workers of the pool
+        :type workers: int
+        :param inline_threshold: The size, in bytes, below which jobs run inline
+        :type inline_threshold: int
+        """
+        self.kind = kind
+        self.workers = workers
+        self.inline_threshold = inline_threshold
+        self.queue_depth = 0
+        self._threads: ThreadPoolExecutor | None = None
+        self._processes: ProcessPoolExecutor | None = None
+
+    def _get_executor(self, stateful: bool) -> Executor:
+        if self.kind == "process" and not stateful:
+            if self._processes is None:
+                self._processes = ProcessPoolExecutor(self.workers)
+            return self._processes
+
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(
+                self.workers, thread_name_prefix="crypto"
+            )
+        return self._threads
+
+    async def run[
+        ReturnType
+    ](
+        self,
+        func: Callable[..., ReturnType],
+        *args: Any,
+        size: int | None = None,
+        stateful: bool = False,
+    ) -> ReturnType:
+        """
+        Runs a job in the pool, or inline if it is small enough.
+
+        :param func: The job
+        :param args: The job's arguments
+        :param size: The number of bytes the job processes, or None if its cost
+            doesn't depend on it (RSA, key derivation), which is never run inline
+        :param stateful: Whether the job keeps state and must run in a thread
+        :return: The job's result
+        """
+        if size is not None and size < self.inline_threshold:
+            metrics.increment("crypto_jobs_inline")
+            return func(*args)
+
+        metrics.increment("crypto_jobs_offloaded")
+        self.queue_depth += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(stateful), partial(func, *args)
+            )
+        finally:
+            self.queue_depth -= 1
+
+    def shutdown(self) -> None:
+        for executor in (self._threads, self._processes):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._threads = self._processes = None
+
+
+crypto_executor = CryptoExecutor(
+    settings.CRYPTO_EXECUTOR, settings.CRYPTO_WORKERS, settings.CRYPTO_INLINE_THRESHOLD
+)
+metrics.gauge("crypto_queue_depth", lambda: crypto_executor.queue_depth)
@@ -1,4 +1,5 @@
 from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
 from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey, RSAPublicKey
 
 
@@ -13,6 +14,17 @@ def load_private_key(
     return pk, pk.public_key()
 
 
+def load_public_key_of_private_key(
+    private_key: bytes, password: str | None = None
+) -> str:
+    """
+    Loads a private key and returns its public key as a PKCS1 PEM. Unlike key
+    objects, the result can be sent back from the crypto executor's processes.
+    """
+    _, public_key = load_private_key(private_key, password)
+    return public_key.public_bytes(Encoding.PEM, PublicFormat.PKCS1).decode()
+
+
 def load_public_key(public_key: str) -> RSAPublicKey:
     key = serialization.load_pem_public_key(public_key.encode())
     if not isinstance(key, RSAPublicKey):
@@ -0,0 +1,48 @@
+import hashlib
+import hmac
+
+import orjson
+
+from repository.config.settings import settings
+from repository.models.document import Document
+
+
+def document_etag(doc: Document) -> str:
+    """
+    Computes the entity tag of a document's metadata, which changes whenever the
+    row or its ACL does.
+
+    The tag is sent in the clear, so it is keyed with the repository's secret and
+    can't be used to guess the metadata it stands for.
+
+    :param doc: The document
+    :type doc: Document
+
+    :return: The quoted entity tag
+    :rtype: str
+    """
+    content = doc.model_dump(mode="json")
+    # Permissions are sets, loaded in no particular order
+    content["acl"] = {
+        role: sorted(permissions) for role, permissions in doc.acl.items()
+    }
+    digest = hmac.new(
+        settings.AUTH_SECRET_KEY.encode(),
+        orjson.dumps(content, option=orjson.OPT_SORT_KEYS),
+        hashlib.sha256,
+    ).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Checks an If-None-Match header against an entity tag, with the weak comparison
+    of RFC 9110.
+    """
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(",")
+    )
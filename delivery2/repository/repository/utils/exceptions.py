@@ -6,6 +6,37 @@ hmac_exception = HTTPException(
     detail="HMAC does not match",
 )
 
+unknown_key_id_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Unknown key ID, the key must be sent again",
+    headers={"Key-Id": "invalid"},
+)
+
+unsupported_envelope_exception = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Unsupported envelope",
+)
+
+unsupported_framing_exception = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Unsupported framing",
+)
+
+malformed_frame_exception = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Malformed frame",
+)
+
+unsupported_compression_exception = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Unsupported compression",
+)
+
+decompression_exception = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="Could not decompress the body",
+)
+
 credentials_exception = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,
     detail="Could not validate credentials",
@@ -31,3 +62,8 @@ not_enough_permissions_exception = HTTPException(
     status_code=status.HTTP_403_FORBIDDEN,
     detail="Not enough permissions",
 )
+
+metrics_disabled_exception = HTTPException(
+    status_code=status.HTTP_404_NOT_FOUND,
+    detail="Not Found",
+)
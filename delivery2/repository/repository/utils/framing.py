@@ -0,0 +1,76 @@
+import json
+from typing import Any
+
+TEXT_FRAMING = "text"
+BINARY_FRAMING = "binary"
+FRAMINGS = (TEXT_FRAMING, BINARY_FRAMING)
+
+FRAME_MEDIA_TYPE = "application/octet-stream"
+
+# A document's metadata followed by its file, sent as a frame without a status code
+DOCUMENT_MEDIA_TYPE = "application/vnd.rep.document"
+
+# Size of the big endian length that precedes the frame header
+HEADER_LENGTH_SIZE = 4
+
+
+def pack_frame_header(header: dict[str, Any]) -> bytes:
+    """
+    Encodes the header of a binary frame, preceded by its length.
+
+    A frame is sent sealed, so on the wire it is the ciphertext of
+    ``length | header | payload`` followed by the envelope tag. The header is a JSON
+    object with the metadata that the text framing sends next to the payload, e.g.
+    the status code of a response.
+
+    :param header: Frame metadata
+    :type header: dict[str, Any]
+
+    :return: The length prefixed header
+    :rtype: bytes
+    """
+    data = json.dumps(header, separators=(",", ":")).encode()
+    return len(data).to_bytes(HEADER_LENGTH_SIZE, "big") + data
+
+
+def unpack_frame(data: bytes) -> tuple[dict[str, Any], bytes]:
+    """
+    Splits an unsealed binary frame into its header and payload.
+
+    :param data: The unsealed frame
+    :type data: bytes
+
+    :return: The header and the payload
+    :rtype: tuple[dict[str, Any], bytes]
+    """
+    length = int.from_bytes(data[:HEADER_LENGTH_SIZE], "big")
+    end = HEADER_LENGTH_SIZE + length
+    if len(data) < end:
+        raise ValueError("Malformed frame")
+
+    try:
+        header = json.loads(data[HEADER_LENGTH_SIZE:end])
+    except ValueError:
+        raise ValueError("Malformed frame")
+    if not isinstance(header, dict):
+        raise ValueError("Malformed frame")
+
+    return header, data[end:]
+
+
+class FrameStream:
+    """
+    Incremental version of framing a response body, the binary counterpart of the
+    {"code": ..., "data": "<body>"} obfuscation. The body is passed through as is.
+    """
+
+    def __init__(self, status_code: int) -> None:
+        self._prefix = pack_frame_header({"code": status_code})
+
+    def update(self, data: bytes) -> bytes:
+        prefix, self._prefix = self._prefix, b""
+        return prefix + data
+
+    def finalize(self) -> bytes:
+        # Only non empty if the body had no chunks
+        return self.update(b"")
@@ -0,0 +1,38 @@
+from hashlib import sha256
+from typing import Iterable
+
+from repository.utils.encoding import B64_LINE_SIZE, B64EncodeStream
+
+# Multiple of a base64 line, so full reads are encoded without being buffered
+HASH_CHUNK_SIZE = B64_LINE_SIZE * 16 * 1024
+
+
+class FileHandleHasher:
+    """
+    Incremental version of sha256(base64.encodebytes(content)), the file handle of
+    a document. Chunks may have any size, the handle is the same as hashing the
+    base64 of the whole content at once.
+    """
+
+    def __init__(self) -> None:
+        self._encoder = B64EncodeStream(escape=False)
+        self._hash = sha256()
+
+    def update(self, data: bytes) -> None:
+        self._hash.update(self._encoder.update(data))
+
+    def finalize(self) -> str:
+        self._hash.update(self._encoder.finalize())
+        return self._hash.hexdigest()
+
+
+def hash_chunks(chunks: Iterable[bytes]) -> str:
+    hasher = FileHandleHasher()
+    for chunk in chunks:
+        hasher.update(chunk)
+    return hasher.finalize()
+
+
+def hash_file(path: str, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    with open(path, "rb") as f:
+        return hash_chunks(iter(lambda: f.read(chunk_size), b""))
@@ -0,0 +1,27 @@
+from typing import Callable
+
+
+class Metrics:
+    """
+    In-process registry of counters and gauges, exposed by /repository/metrics.
+    Gauges are callables, evaluated when the metrics are collected.
+    """
+
+    def __init__(self) -> None:
+        self._counters: dict[str, float] = {}
+        self._gauges: dict[str, Callable[[], float]] = {}
+
+    def increment(self, name: str, value: float = 1) -> None:
+        self._counters[name] = self._counters.get(name, 0) + value
+
+    def gauge(self, name: str, callback: Callable[[], float]) -> None:
+        self._gauges[name] = callback
+
+    def collect(self) -> dict[str, float]:
+        return {
+            **self._counters,
+            **{name: callback() for name, callback in self._gauges.items()},
+        }
+
+
+metrics = Metrics()
@@ -1,24 +1,75 @@
-import base64
-import hmac
+import codecs
 import json
 import os
-from typing import Any, AsyncIterable
+import secrets
+from typing import Any
 
 import jwt
 from fastapi import Request, HTTPException
-from starlette.datastructures import State
-from starlette.middleware.base import _StreamingResponse
-from starlette.responses import Response
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from repository.config.settings import settings
-from repository.utils.encoding import b64_encode_and_escape, b64_decode_and_unescape
+from repository.utils.compression import (
+    COMPRESSIONS,
+    CompressionStream,
+    decompress,
+    negotiate_compression,
+)
+from repository.utils.encoding import (
+    B64EncodeStream,
+    b64_encode_and_escape,
+    b64_decode_and_unescape,
+)
 from repository.utils.encryption.encryptors import (
+    AES_GCM,
+    CTR_HMAC,
+    ENVELOPES,
+    IV_SIZES,
+    TAG_SIZES,
+    GCMStreamEncryptor,
+    StreamEncryptor,
     decrypt_asymmetric,
-    decrypt_symmetric,
-    encrypt_symmetric,
-    encrypt_asymmetric,
+    encrypt_asymmetric_with_pem,
+    unseal,
+)
+from repository.utils.encryption.executor import crypto_executor
+from repository.utils.framing import (
+    BINARY_FRAMING,
+    DOCUMENT_MEDIA_TYPE,
+    FRAME_MEDIA_TYPE,
+    FRAMINGS,
+    TEXT_FRAMING,
+    FrameStream,
+    unpack_frame,
+)
+from repository.utils.cache import TTLCache
+from repository.utils.exceptions import (
+    hmac_exception,
+    malformed_frame_exception,
+    unknown_key_id_exception,
+    unsupported_envelope_exception,
+    unsupported_framing_exception,
+    credentials_exception,
+    decompression_exception,
+    unsupported_compression_exception,
+)
+from repository.utils.serializers import CustomORJSONResponse
+
+# Key ID -> (encryption mode, decrypted Authorization header). Kept in the memory of
+# each worker, so with several workers the IDs are only resumed reliably if clients
+# stick to one worker (otherwise they are told the ID is invalid and send the key
+# again), or if the cache is replaced by a store the workers share.
+session_key_cache: TTLCache[str, tuple[str, bytes]] = TTLCache(
+    settings.SESSION_KEY_CACHE_SIZE, settings.SESSION_KEY_CACHE_TTL
+)
+
+# Raw file downloads are encrypted but can't be wrapped in a JSON string
+BINARY_MEDIA_TYPES = (
+    "application/octet-stream",
+    "multipart/byteranges",
+    DOCUMENT_MEDIA_TYPE,
 )
-from repository.utils.exceptions import hmac_exception
 
 
 async def decrypt_request_key(request: Request) -> tuple[Request, bytes | None]:
@@ -29,11 +80,37 @@ async def decrypt_request_key(request: Request) -> tuple[Request, bytes | None]:
             )
         return request, None
 
-    if (auth_header := request.headers.get("Authorization")) is None:
-        return request, None
+    request.state.envelope = request.headers.get("Envelope", CTR_HMAC)
+    if request.state.envelope not in ENVELOPES:
+        raise unsupported_envelope_exception
+
+    request.state.framing = request.headers.get("Framing", TEXT_FRAMING)
+    if request.state.framing not in FRAMINGS:
+        raise unsupported_framing_exception
+
+    # Compression of the request body, and the codec to compress the response with
+    request.state.request_compression = request.headers.get("Compression")
+    if request.state.request_compression not in (None, *COMPRESSIONS):
+        raise unsupported_compression_exception
+    request.state.response_compression = negotiate_compression(
+        request.headers.get("Accept-Compression")
+    )
 
-    auth_header_bytes = b64_decode_and_unescape(auth_header.encode())
-    token = decrypt_asymmetric(auth_header_bytes, settings.KEYS[0])
+    if (key_id := request.headers.get("Key-Id")) is not None:
+        token = _resume_key(key_id, encryption, request)
+    elif (auth_header := request.headers.get("Authorization")) is None:
+        return request, None
+    else:
+        token = await crypto_executor.run(
+            _decrypt_with_repository_key, auth_header.encode()
+        )
+
+        # Later requests of the session can send this ID instead of the RSA
+        # encrypted header. Other requests use a random key once, so caching it
+        # would only evict the keys of live sessions.
+        if encryption == "session":
+            request.state.key_id = secrets.token_urlsafe(16)
+            session_key_cache.set(request.state.key_id, (encryption, token))
 
     headers = dict(request.scope["headers"])
     headers[b"authorization"] = b"Bearer " + token if encryption == "session" else token
@@ -54,6 +131,33 @@ async def decrypt_request_key(request: Request) -> tuple[Request, bytes | None]:
     return request, payload.get("keys", [])[0].encode()
 
 
+def _decrypt_with_repository_key(data: bytes) -> bytes:
+    return decrypt_asymmetric(b64_decode_and_unescape(data), settings.KEYS[0])
+
+
+def _decode_and_unseal(
+    data: bytes, key: bytes, iv: bytes, envelope: str, part: int
+) -> bytes | None:
+    """
+    Decodes, verifies and decrypts an escaped base64 sealed message part.
+
+    :return: The plaintext, or None if it was not authenticated
+    """
+    return unseal(b64_decode_and_unescape(data), key, iv, envelope, part)
+
+
+def _resume_key(key_id: str, encryption: str, request: Request) -> bytes:
+    # Without the IV, the URL HMAC wouldn't be checked and the ID alone would be
+    # enough to impersonate the subject
+    if request.headers.get("IV") is None:
+        raise credentials_exception
+
+    cached = session_key_cache.get(key_id)
+    if cached is None or cached[0] != encryption:
+        raise unknown_key_id_exception
+    return cached[1]
+
+
 async def decrypt_request_url(request: Request, token: bytes | None) -> None:
     if token is None:
         return
@@ -64,15 +168,16 @@ async def decrypt_request_url(request: Request, token: bytes | None) -> None:
     if request.headers.get("Encryption") is None:
         return
 
-    iv = base64.decodebytes(iv_header.encode())
+    iv = b64_decode_and_unescape(iv_header.encode())
 
-    url = b64_decode_and_unescape(request.url.path.encode().lstrip(b"/"))
-    url, hmac_bytes = url[:-32], url[-32:]
-
-    if not hmac.compare_digest(hmac.digest(token, url, "sha256"), hmac_bytes):
+    url = request.url.path.encode().lstrip(b"/")
+    url_dec = await crypto_executor.run(
+        _decode_and_unseal, url, token, iv, request.state.envelope, 0, size=len(url)
+    )
+    if url_dec is None:
         raise hmac_exception
 
-    url_unenc = decrypt_symmetric(url, token, iv).decode()
+    url_unenc = url_dec.decode()
     path, query = url_unenc.split("?", 1) if "?" in url_unenc else (url_unenc, "")
     request._url = request._url.replace(path=path)
     request.scope["path"] = "/" + path
@@ -86,7 +191,7 @@ async def decrypt_request_body(request: Request, token: bytes | None) -> None:
     if (iv_header := request.headers.get("IV")) is None:
         return
 
-    iv = base64.decodebytes(iv_header.encode())
+    iv = b64_decode_and_unescape(iv_header.encode())
     data = await request.body()
     if not data:
         return
@@ -94,77 +199,253 @@ async def decrypt_request_body(request: Request, token: bytes | None) -> None:
     if request.headers.get("Encryption") is None:
         return
 
-    if len(data) < 32:
-        return
-
-    data = b64_decode_and_unescape(data)
-    data, hmac_bytes = data[:-32], data[-32:]
-
-    if not hmac.compare_digest(hmac.digest(token, data, "sha256"), hmac_bytes):
+    # Too short to hold a tag, so it can't have been sealed
+    if len(data) < TAG_SIZES[request.state.envelope]:
         raise hmac_exception
 
-    data = decrypt_symmetric(data, token, iv)
-
-    request._body = data
-
-
-async def _get_response_body(response: Response) -> bytes:
-    if isinstance(response, _StreamingResponse):
-        return b"".join([x async for x in response.body_iterator])  # type: ignore
-    return response.body
-
-
-async def _set_response_body(response: Response, body: bytes) -> None:
-    async def new_body_iterator() -> AsyncIterable[bytes]:
-        yield body
-
-    if isinstance(response, _StreamingResponse):
-        response.body_iterator = new_body_iterator()
-        return
-    response.body = body
-
-
-async def obfuscate_response(response: Response) -> None:
-    body = await _get_response_body(response)
-
-    new_body = {
-        "code": response.status_code,
-        "data": body.decode(),
-    }
-    body_enc = json.dumps(new_body).encode()
-    await _set_response_body(response, body_enc)
-    response.status_code = 200
-    response.headers["Content-Length"] = str(len(body_enc))
-
-
-async def encrypt_response(
-    response: Response,
-    state: State,
-    encrypt: bool,
-) -> None:
-    if not encrypt:
-        return
+    # Binary frames are sent as is, instead of escaped base64
+    binary = request.state.framing == BINARY_FRAMING
+    data_dec = await crypto_executor.run(
+        unseal if binary else _decode_and_unseal,
+        data,
+        token,
+        iv,
+        request.state.envelope,
+        1,
+        size=len(data),
+    )
+    if data_dec is None:
+        raise hmac_exception
 
-    iv = os.urandom(16)
-    try:
-        public_key = state.public_key
-    except AttributeError:
-        public_key = None
-
-    try:
-        key = state.session_key
-    except AttributeError:
-        key = os.urandom(16)
-
-    body = await _get_response_body(response)
-    body_enc = encrypt_symmetric(body, key, iv)
-    body_enc = body_enc + hmac.digest(key, body_enc, "sha256")
-    body_enc = b64_encode_and_escape(body_enc)
-    await _set_response_body(response, body_enc)
-
-    if public_key is not None:
-        key_enc = encrypt_asymmetric(key, public_key)
-        response.headers["Authorization"] = b64_encode_and_escape(key_enc).decode()
-
-    response.headers["Content-Length"] = str(len(body_enc))
-    response.headers["IV"] = b64_encode_and_escape(iv).decode()
+    if (compression := request.state.request_compression) is not None:
+        try:
+            data_dec = await crypto_executor.run(
+                decompress,
+                data_dec,
+                compression,
+                settings.COMPRESSION_MAX_SIZE,
+                size=len(data_dec),
+            )
+        except ValueError:
+            raise decompression_exception
+
+    if binary:
+        try:
+            header, data_dec = unpack_frame(data_dec)
+        except ValueError:
+            raise malformed_frame_exception
+
+        # The wire content type is the frame's, the endpoint expects the payload's
+        if (content_type := header.get("content_type")) is not None:
+            headers = MutableHeaders(scope=request.scope)
+            headers["Content-Type"] = content_type
+
+    request._body = data_dec
+
+
+class ObfuscationStream:
+    """
+    Incremental version of wrapping a body as {"code": ..., "data": "<body>"}.
+
+    The JSON string is escaped chunk by chunk, so the output is the same as calling
+    json.dumps() over the whole decoded body.
+    """
+
+    def __init__(self, status_code: int) -> None:
+        self._prefix = f'{{"code": {status_code}, "data": "'.encode()
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def update(self, data: bytes) -> bytes:
+        return self._escape(self._decoder.decode(data))
+
+    def finalize(self) -> bytes:
+        return self._escape(self._decoder.decode(b"", final=True)) + b'"}'
+
+    def _escape(self, text: str) -> bytes:
+        prefix, self._prefix = self._prefix, b""
+        return prefix + json.dumps(text)[1:-1].encode()
+
+
+class ResponseEncryptor:
+    """
+    Wraps the ASGI send callable, obfuscating and encrypting every body chunk as it
+    is sent. The HMAC is appended to the last chunk.
+    """
+
+    def __init__(
+        self, send: Send, state: dict[str, Any], obfuscate: bool, encrypt: bool
+    ) -> None:
+        self.send = send
+        self.state = state
+        self.obfuscate = obfuscate
+        self.encrypt = encrypt
+        self.started = False
+        self._streams: list[
+            ObfuscationStream
+            | FrameStream
+            | CompressionStream
+            | StreamEncryptor
+            | GCMStreamEncryptor
+            | B64EncodeStream
+        ] = []
+
+    async def __call__(self, message: Message) -> None:
+        match message["type"]:
+            case "http.response.start":
+                self.started = True
+                await self.send(await self._start(message))
+            case "http.response.body":
+                more_body = message.get("more_body", False)
+                body = message.get("body", b"")
+                if self._streams:
+                    body = await crypto_executor.run(
+                        self._process,
+                        body,
+                        not more_body,
+                        size=len(body),
+                        stateful=True,
+                    )
+                await self.send(
+                    {"type": "http.response.body", "body": body, "more_body": more_body}
+                )
+            case _:
+                await self.send(message)
+
+    async def _start(self, message: Message) -> Message:
+        status = message["status"]
+        headers = MutableHeaders(raw=list(message["headers"]))
+        # Clients keep to CTR+HMAC, text framing and no compression until they see
+        # the repository supports more
+        headers["Accept-Envelope"] = ", ".join(ENVELOPES)
+        headers["Accept-Framing"] = ", ".join(FRAMINGS)
+        headers["Accept-Compression"] = ", ".join(COMPRESSIONS)
+
+        # Binary frames are only sent encrypted, otherwise there would be no tag
+        binary = self.encrypt and self.state.get("framing") == BINARY_FRAMING
+        raw = headers.get("Content-Type", "").startswith(BINARY_MEDIA_TYPES)
+
+        if self.obfuscate and not raw:
+            if binary:
+                self._streams.append(FrameStream(status))
+                headers["Content-Type"] = FRAME_MEDIA_TYPE
+            else:
+                self._streams.append(ObfuscationStream(status))
+            status = 200
+
+        # Raw files are already encrypted by their owners, so they don't compress
+        compression = self.state.get("response_compression")
+        if (
+            self.encrypt
+            and compression is not None
+            and not raw
+            and int(headers.get("Content-Length", settings.COMPRESSION_THRESHOLD))
+            >= settings.COMPRESSION_THRESHOLD
+        ):
+            self._streams.append(CompressionStream(compression))
+            headers["Compression"] = compression
+
+        if self.encrypt:
+            envelope = self.state.get("envelope", CTR_HMAC)
+            iv = os.urandom(IV_SIZES[envelope])
+            key = self.state.get("session_key") or os.urandom(32)
+            if envelope == AES_GCM:
+                self._streams.append(GCMStreamEncryptor(key, iv))
+            else:
+                self._streams.append(StreamEncryptor(key, iv))
+            if binary:
+                headers["Framing"] = BINARY_FRAMING
+            else:
+                self._streams.append(B64EncodeStream())
+            headers["Envelope"] = envelope
+
+            if (public_key := self.state.get("public_key")) is not None:
+                key_enc = await crypto_executor.run(
+                    encrypt_asymmetric_with_pem, key, public_key
+                )
+                headers["Authorization"] = b64_encode_and_escape(key_enc).decode()
+            headers["IV"] = b64_encode_and_escape(iv).decode()
+
+            if (key_id := self.state.get("key_id")) is not None:
+                headers["Key-Id"] = key_id
+
+        if self._streams:
+            # The final length is unknown until the last chunk is sent
+            del headers["Content-Length"]
+
+        return {**message, "status": status, "headers": headers.raw}
+
+    def _process(self, data: bytes, final: bool) -> bytes:
+        for stream in self._streams:
+            data = stream.update(data)
+            if final:
+                data += stream.finalize()
+        return data
+
+
+def _replay_body(body: bytes, receive: Receive) -> Receive:
+    sent = False
+
+    async def replay() -> Message:
+        nonlocal sent
+        if sent:
+            return await receive()
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return replay
+
+
+class EncryptionMiddleware:
+    """
+    Pure ASGI middleware that decrypts requests and streams encrypted responses,
+    so memory per request does not depend on the response size.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        scope.setdefault("state", {})
+        request = Request(scope, receive)
+        encrypt = request.headers.get("Encryption") is not None
+
+        try:
+            (request, token) = await decrypt_request_key(request)
+            await decrypt_request_url(request, token)
+            await decrypt_request_body(request, token)
+            error = None
+        except HTTPException as e:
+            error = CustomORJSONResponse(
+                content={"detail": e.detail},
+                status_code=e.status_code,
+                headers=e.headers,
+            )
+            # The response can't be encrypted if the key is not known
+            encrypt = encrypt and "session_key" in scope["state"]
+
+        sender = ResponseEncryptor(
+            send,
+            scope["state"],
+            settings.PRODUCTION or not request.url.path.startswith("/docs"),
+            encrypt,
+        )
+
+        if error is not None:
+            await error(scope, receive, sender)
+            return
+
+        if hasattr(request, "_body"):
+            # The body was consumed while decrypting it
+            receive = _replay_body(request._body, receive)
+
+        try:
+            await self.app(scope, receive, sender)
+        except ValueError as e:
+            if sender.started:
+                raise
+            response = CustomORJSONResponse(content={"detail": str(e)}, status_code=400)
+            await response(scope, receive, sender)
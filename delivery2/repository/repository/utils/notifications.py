@@ -0,0 +1,153 @@
+import asyncio
+import logging
+from typing import Any, Callable
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from repository.config.database import engine
+from repository.config.settings import settings
+from repository.utils.metrics import metrics
+
+# Cache invalidations are broadcast to every worker through PostgreSQL's NOTIFY
+CHANNEL = "repository_invalidation"
+
+logger = logging.getLogger(__name__)
+
+_subscribers: dict[str, list[Callable[[str], None]]] = {}
+_reset_subscribers: list[Callable[[], None]] = []
+_task: asyncio.Task[None] | None = None
+
+
+def subscribe(topic: str, callback: Callable[[str], None]) -> None:
+    _subscribers.setdefault(topic, []).append(callback)
+
+
+def subscribe_reset(callback: Callable[[], None]) -> None:
+    """
+    Registers a callback for when messages may have been missed, i.e. after the
+    listener lost its connection. Caches should drop everything they hold.
+    """
+    _reset_subscribers.append(callback)
+
+
+async def publish(session: AsyncSession, topic: str, payload: str) -> None:
+    """
+    Sends a message through the given session's transaction. PostgreSQL only
+    delivers it when that transaction commits, and drops it on rollback.
+    """
+    await session.exec(select(func.pg_notify(CHANNEL, f"{topic}:{payload}")))
+
+
+def _dispatch(_connection: object, _pid: int, _channel: str, message: str) -> None:
+    topic, _, payload = message.partition(":")
+    for callback in _subscribers.get(topic, []):
+        callback(payload)
+
+
+async def _driver_connection(connection: AsyncConnection) -> Any:
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = raw_connection.driver_connection
+    assert driver_connection is not None
+    return driver_connection
+
+
+async def _connect() -> tuple[AsyncConnection, asyncio.Event]:
+    connection = await engine.connect()
+    lost = asyncio.Event()
+    try:
+        driver_connection = await _driver_connection(connection)
+        driver_connection.add_termination_listener(lambda _: lost.set())
+        await driver_connection.add_listener(CHANNEL, _dispatch)
+    except BaseException:
+        await connection.close()
+        raise
+    return connection, lost
+
+
+async def _reconnect() -> tuple[AsyncConnection, asyncio.Event]:
+    while True:
+        try:
+            return await _connect()
+        except Exception:
+            logger.exception("Could not reconnect the invalidation listener")
+        await asyncio.sleep(settings.INVALIDATION_RECONNECT_DELAY)
+
+
+async def _wait_until_lost(connection: AsyncConnection, lost: asyncio.Event) -> None:
+    # A connection closed by the server is reported, one cut off by the network is
+    # only noticed when it is used
+    driver_connection = await _driver_connection(connection)
+    while True:
+        try:
+            await asyncio.wait_for(
+                lost.wait(), settings.INVALIDATION_HEALTH_CHECK_INTERVAL
+            )
+            return
+        except TimeoutError:
+            pass
+
+        try:
+            await asyncio.wait_for(
+                driver_connection.execute("SELECT 1"),
+                settings.INVALIDATION_HEALTH_CHECK_TIMEOUT,
+            )
+        except Exception:
+            return
+
+
+async def _close(connection: AsyncConnection) -> None:
+    try:
+        driver_connection = await _driver_connection(connection)
+        await driver_connection.remove_listener(CHANNEL, _dispatch)
+    except Exception:
+        await _discard(connection)
+        return
+    await connection.close()
+
+
+async def _discard(connection: AsyncConnection) -> None:
+    # Broken, so it is not given back to the pool
+    await connection.invalidate()
+    await connection.close()
+
+
+async def _listen(connection: AsyncConnection, lost: asyncio.Event) -> None:
+    current: AsyncConnection | None = connection
+    try:
+        while True:
+            await _wait_until_lost(connection, lost)
+            logger.warning("The invalidation listener lost its connection")
+            metrics.increment("invalidation_listener_reconnects")
+            current = None
+            await _discard(connection)
+
+            connection, lost = await _reconnect()
+            current = connection
+            # Anything sent while it was disconnected is lost
+            for callback in _reset_subscribers:
+                callback()
+    finally:
+        if current is not None:
+            await _close(current)
+
+
+async def start_listener() -> None:
+    global _task
+    connection, lost = await _connect()
+    _task = asyncio.create_task(_listen(connection, lost))
+
+
+async def stop_listener() -> None:
+    global _task
+    if _task is None:
+        return
+
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+from repository.utils.compression import (
+    COMPRESSIONS,
+    DEFLATE,
+    ZSTD,
+    compress,
+    decompress,
+)
+
+DATA = os.urandom(1000) * 50
+
+# zstd is reported as skipped, not dropped, without the zstd extra
+CODECS = [
+    pytest.param(
+        ZSTD,
+        marks=pytest.mark.skipif(
+            ZSTD not in COMPRESSIONS, reason="zstandard is not installed"
+        ),
+    ),
+    DEFLATE,
+]
+
+
+@pytest.mark.parametrize("compression", CODECS)
+def test_round_trip(compression: str) -> None:
+    assert decompress(compress(DATA, compression), compression) == DATA
+
+
+@pytest.mark.parametrize("compression", CODECS)
+def test_max_size(compression: str) -> None:
+    data = compress(DATA, compression)
+
+    assert decompress(data, compression, max_size=len(DATA)) == DATA
+    with pytest.raises(ValueError):
+        decompress(data, compression, max_size=len(DATA) - 1)
+
+
+@pytest.mark.parametrize("compression", CODECS)
+def test_corrupt_data(compression: str) -> None:
+    with pytest.raises(ValueError):
+        decompress(b"not compressed", compression)
+
+
+def test_unsupported_compression() -> None:
+    with pytest.raises(ValueError):
+        compress(DATA, "br")
+    with pytest.raises(ValueError):
+        decompress(DATA, "br")
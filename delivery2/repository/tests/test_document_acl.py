@@ -0,0 +1,56 @@
+import pytest
+
+from repository.crud.document import _apply_acl_patch
+from repository.models.document import DocumentACLPatch
+from repository.models.permission import DocumentPermission
+
+ACL = DocumentPermission.DOC_ACL
+READ = DocumentPermission.DOC_READ
+
+
+def patch(role: str, permission: DocumentPermission, add: bool) -> DocumentACLPatch:
+    return DocumentACLPatch(name="doc", role=role, add=add, permission=permission)
+
+
+def test_add_to_new_role() -> None:
+    acl = {"owner": {ACL}}
+    _apply_acl_patch(acl, patch("reader", READ, True))
+    assert acl == {"owner": {ACL}, "reader": {READ}}
+
+
+def test_add_existing_permission() -> None:
+    acl = {"owner": {ACL, READ}}
+    _apply_acl_patch(acl, patch("owner", READ, True))
+    assert acl == {"owner": {ACL, READ}}
+
+
+def test_remove_permission() -> None:
+    acl = {"owner": {ACL, READ}}
+    _apply_acl_patch(acl, patch("owner", READ, False))
+    assert acl == {"owner": {ACL}}
+
+
+def test_remove_from_unknown_role() -> None:
+    acl = {"owner": {ACL}}
+    _apply_acl_patch(acl, patch("reader", READ, False))
+    assert acl == {"owner": {ACL}}
+
+
+def test_remove_last_acl_permission() -> None:
+    acl = {"owner": {ACL, READ}}
+    with pytest.raises(ValueError):
+        _apply_acl_patch(acl, patch("owner", ACL, False))
+    assert acl == {"owner": {ACL, READ}}
+
+
+def test_remove_shared_acl_permission() -> None:
+    acl = {"owner": {ACL}, "admin": {ACL}}
+    _apply_acl_patch(acl, patch("owner", ACL, False))
+    assert acl == {"owner": set(), "admin": {ACL}}
+
+
+def test_patches_do_not_share_sets() -> None:
+    permissions = {ACL, READ}
+    acl = {"owner": permissions, "admin": {ACL}}
+    _apply_acl_patch(acl, patch("owner", READ, False))
+    assert permissions == {ACL, READ}
@@ -0,0 +1,56 @@
+import uuid
+from datetime import datetime
+
+import pytest
+
+from repository.models.document import Document
+from repository.models.permission import DocumentPermission
+from repository.utils.etag import document_etag, etag_matches
+
+
+def make_document(**kwargs: object) -> Document:
+    fields: dict[str, object] = {
+        "document_handle": uuid.UUID(int=1),
+        "name": "doc",
+        "file_handle": "a" * 64,
+        "acl": {"role": {DocumentPermission.DOC_ACL, DocumentPermission.DOC_READ}},
+        "organization_name": "org",
+        "creator_username": "user",
+        "alg": "AES",
+        "key": "key",
+        "iv": "iv",
+        "create_date": datetime(2026, 1, 1),
+    }
+    fields.update(kwargs)
+    return Document(**fields)
+
+
+def test_document_etag() -> None:
+    doc = make_document()
+    etag = document_etag(doc)
+
+    assert etag.startswith('"') and etag.endswith('"')
+    assert document_etag(make_document()) == etag
+    assert document_etag(make_document(name="other")) != etag
+    assert (
+        document_etag(make_document(acl={"role": {DocumentPermission.DOC_ACL}})) != etag
+    )
+
+
+@pytest.mark.parametrize(
+    ("if_none_match", "matches"),
+    [
+        (None, False),
+        ("*", True),
+        (" * ", True),
+        ('"tag"', True),
+        ('W/"tag"', True),
+        ('"other", "tag"', True),
+        ('"other",W/"tag"', True),
+        ('"other"', False),
+        ("tag", False),
+        ("", False),
+    ],
+)
+def test_etag_matches(if_none_match: str | None, matches: bool) -> None:
+    assert etag_matches(if_none_match, '"tag"') is matches
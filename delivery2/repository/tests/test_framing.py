@@ -0,0 +1,38 @@
+import pytest
+
+from repository.utils.framing import (
+    HEADER_LENGTH_SIZE,
+    FrameStream,
+    pack_frame_header,
+    unpack_frame,
+)
+
+
+@pytest.mark.parametrize("payload", [b"", b"payload", bytes(range(256)) * 10])
+def test_frame_round_trip(payload: bytes) -> None:
+    header = {"code": 200, "content_type": "application/json"}
+    assert unpack_frame(pack_frame_header(header) + payload) == (header, payload)
+
+
+def test_frame_stream() -> None:
+    stream = FrameStream(201)
+    data = stream.update(b"first ") + stream.update(b"second") + stream.finalize()
+    assert unpack_frame(data) == ({"code": 201}, b"first second")
+
+
+def test_frame_stream_empty_body() -> None:
+    assert unpack_frame(FrameStream(204).finalize()) == ({"code": 204}, b"")
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"",
+        (10).to_bytes(HEADER_LENGTH_SIZE, "big") + b"{}",
+        (3).to_bytes(HEADER_LENGTH_SIZE, "big") + b"{x}",
+        (2).to_bytes(HEADER_LENGTH_SIZE, "big") + b"[]",
+    ],
+)
+def test_malformed_frame(data: bytes) -> None:
+    with pytest.raises(ValueError):
+        unpack_frame(data)
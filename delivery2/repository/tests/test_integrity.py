@@ -0,0 +1,47 @@
+import base64
+import os
+import random
+from hashlib import sha256
+
+import pytest
+
+from repository.utils.integrity import FileHandleHasher, hash_chunks, hash_file
+
+
+def file_handle(data: bytes) -> str:
+    return sha256(base64.encodebytes(data)).hexdigest()
+
+
+def split(data: bytes, rng: random.Random) -> list[bytes]:
+    chunks = []
+    while data:
+        size = rng.randint(0, 200)
+        chunks.append(data[:size])
+        data = data[size:]
+    return chunks
+
+
+@pytest.mark.parametrize("size", [0, 1, 56, 57, 58, 57 * 3, 1000, 10_007])
+def test_hasher_matches_whole_content(size: int) -> None:
+    data = os.urandom(size)
+    rng = random.Random(size)
+
+    for _ in range(20):
+        hasher = FileHandleHasher()
+        for chunk in split(data, rng):
+            hasher.update(chunk)
+        assert hasher.finalize() == file_handle(data)
+
+
+def test_hash_chunks_single_byte_chunks() -> None:
+    data = os.urandom(500)
+    assert hash_chunks(data[i : i + 1] for i in range(len(data))) == file_handle(data)
+
+
+def test_hash_file(tmp_path) -> None:
+    data = os.urandom(100_000)
+    path = tmp_path / "file"
+    path.write_bytes(data)
+
+    assert hash_file(str(path)) == file_handle(data)
+    assert hash_file(str(path), chunk_size=1000) == file_handle(data)